@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+本地 MCHost 模拟站点（基准测试用）
+模拟续期脚本依赖的页面行为，不访问真实网站：
+
+- /auth                   登录页（POST 提交后签发会话并跳转控制台）
+- /                       控制台：会话有效时显示 #renewSessionBtn 和会话倒计时 #sessionExpiry，
+                          会话无效时跳转 /auth
+- POST /api/session/renew 续期接口：按配置的延迟返回 {"ok": true, "expires_at": ..., "remaining": ...}，
+                          会话已过期时跳转 /auth（续期脚本判定为 session_expired）
+- 可选的模拟 Cloudflare 验证：按比例在点击后插入 src 含 challenges.cloudflare.com 的 iframe，
+                          数秒后移除再发出续期请求
+- POST /_bench/session    签发一个新会话，返回 Playwright 格式的 cookie（基准测试写入 cookies.json）
+- GET /_bench/stats       统计：续期次数、已过期的会话数（错过续期截止时间）等
+
+单独运行（手动调试续期脚本）：
+    python bench/fake_mchost.py --port 8765 --session-ttl 120 --renew-latency-ms 300 --cf-rate 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import secrets
+import time
+
+from aiohttp import web
+
+SESSION_COOKIE = 'mchost_session'
+
+# 模拟验证框的地址（只需包含 challenges.cloudflare.com，由本站点提供）
+CF_FRAME_PATH = '/cdn-cgi/challenges.cloudflare.com/turnstile'
+
+DASHBOARD_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>MCHost Dashboard (fake)</title></head>
+<body>
+<h1>Server Dashboard</h1>
+<p>Session expires in <span id="sessionExpiry"></span></p>
+<button id="renewSessionBtn">Renew Session</button>
+<script>
+let expiresAt = __EXPIRES_AT__ * 1000;
+const cfRate = __CF_RATE__, cfMs = __CF_MS__;
+const expiry = document.getElementById('sessionExpiry');
+function tick() {
+    const left = Math.max(0, Math.round((expiresAt - Date.now()) / 1000));
+    expiry.innerText = Math.floor(left / 60) + ':' + String(left % 60).padStart(2, '0');
+}
+tick();
+setInterval(tick, 1000);
+
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+document.getElementById('renewSessionBtn').addEventListener('click', async () => {
+    if (Math.random() < cfRate) {
+        const frame = document.createElement('iframe');
+        frame.src = '__CF_FRAME__';
+        document.body.appendChild(frame);
+        await sleep(cfMs);
+        frame.remove();
+    }
+    const response = await fetch('/api/session/renew', {method: 'POST', credentials: 'same-origin'});
+    if (response.redirected) {
+        location.href = response.url;
+        return;
+    }
+    const data = await response.json();
+    expiresAt = data.expires_at * 1000;
+    tick();
+});
+</script>
+</body>
+</html>
+'''
+
+AUTH_PAGE = '''<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Login (fake)</title></head>
+<body>
+<h1>Login</h1>
+<form method="post" action="/auth">
+<input name="username" placeholder="username"> <input name="password" type="password" placeholder="password">
+<button type="submit">Login</button>
+</form>
+</body>
+</html>
+'''
+
+
+class FakeMCHost:
+    """模拟站点（会话保存在内存中）"""
+
+    def __init__(self, session_ttl: float = 120, renew_latency_ms: float = 200, latency_jitter_ms: float = 0,
+                 cf_rate: float = 0.0, cf_seconds: float = 2.0):
+        """
+        初始化模拟站点
+
+        Args:
+            session_ttl: 会话有效期（秒），每次续期重新计算
+            renew_latency_ms: 续期接口的平均响应延迟（毫秒）
+            latency_jitter_ms: 延迟的标准差（毫秒）
+            cf_rate: 点击 Renew 后出现模拟 Cloudflare 验证的比例（0~1）
+            cf_seconds: 模拟验证持续的秒数
+        """
+        self.session_ttl = session_ttl
+        self.renew_latency_ms = renew_latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.cf_rate = cf_rate
+        self.cf_seconds = cf_seconds
+
+        # {token: {'expires_at', 'created_at', 'renews', 'first_renew_at', 'expired'}}
+        self.sessions = {}
+        self.counters = {'dashboard': 0, 'auth_redirects': 0, 'renew': 0, 'renew_rejected': 0, 'cf_frames': 0}
+        self.runner = None
+
+    # ==================== 会话 ====================
+
+    def issue_session(self) -> dict:
+        """签发新会话，返回 Playwright 格式的 cookie"""
+        token = secrets.token_hex(16)
+        now = time.time()
+        self.sessions[token] = {
+            'expires_at': now + self.session_ttl, 'created_at': now,
+            'renews': 0, 'first_renew_at': None, 'expired': False
+        }
+        # cookie 本身不设过期时间（浏览器会话 cookie），会话有效期只由服务端判断
+        return {'name': SESSION_COOKIE, 'value': token, 'domain': '127.0.0.1', 'path': '/',
+                'expires': -1, 'httpOnly': True, 'secure': False, 'sameSite': 'Lax'}
+
+    def _expire_sessions(self):
+        now = time.time()
+        for session in self.sessions.values():
+            if not session['expired'] and session['expires_at'] <= now:
+                session['expired'] = True
+
+    def _session(self, request):
+        """请求携带的有效会话，没有或已过期时返回 None"""
+        self._expire_sessions()
+        session = self.sessions.get(request.cookies.get(SESSION_COOKIE))
+        if session is None or session['expired']:
+            return None
+        return session
+
+    def stats(self) -> dict:
+        """
+        统计
+
+        Returns:
+            sessions: 会话总数；expired: 已过期的会话数（续期没有赶在到期前完成）；
+            renewed: 至少续期过一次的会话数；
+            last_first_renew_at: 最后一个会话第一次续期的时间（所有任务都完成启动的时间）；
+            counters: 各类请求次数
+        """
+        self._expire_sessions()
+        sessions = list(self.sessions.values())
+        return {
+            'sessions': len(sessions),
+            'expired': sum(1 for session in sessions if session['expired']),
+            'renewed': sum(1 for session in sessions if session['renews']),
+            'last_first_renew_at': max((session['first_renew_at'] or 0 for session in sessions), default=0) or None,
+            'counters': dict(self.counters)
+        }
+
+    # ==================== 页面和接口 ====================
+
+    async def dashboard(self, request):
+        session = self._session(request)
+        if session is None:
+            self.counters['auth_redirects'] += 1
+            raise web.HTTPFound('/auth')
+        self.counters['dashboard'] += 1
+        html = (DASHBOARD_TEMPLATE
+                .replace('__EXPIRES_AT__', str(session['expires_at']))
+                .replace('__CF_RATE__', str(self.cf_rate))
+                .replace('__CF_MS__', str(int(self.cf_seconds * 1000)))
+                .replace('__CF_FRAME__', CF_FRAME_PATH))
+        return web.Response(text=html, content_type='text/html')
+
+    async def auth_page(self, request):
+        return web.Response(text=AUTH_PAGE, content_type='text/html')
+
+    async def auth_submit(self, request):
+        cookie = self.issue_session()
+        response = web.HTTPFound('/')
+        response.set_cookie(SESSION_COOKIE, cookie['value'], path='/', httponly=True, samesite='Lax')
+        raise response
+
+    async def renew(self, request):
+        latency = random.gauss(self.renew_latency_ms, self.latency_jitter_ms) if self.latency_jitter_ms else self.renew_latency_ms
+        await asyncio.sleep(max(0.0, latency) / 1000)
+
+        session = self._session(request)
+        if session is None:
+            self.counters['renew_rejected'] += 1
+            raise web.HTTPFound('/auth')
+
+        now = time.time()
+        self.counters['renew'] += 1
+        session['renews'] += 1
+        session['first_renew_at'] = session['first_renew_at'] or now
+        session['expires_at'] = now + self.session_ttl
+        return web.json_response({'ok': True, 'expires_at': session['expires_at'], 'remaining': self.session_ttl})
+
+    async def cf_frame(self, request):
+        self.counters['cf_frames'] += 1
+        return web.Response(text='<html><body>Checking your browser...</body></html>', content_type='text/html')
+
+    async def bench_session(self, request):
+        return web.json_response(self.issue_session())
+
+    async def bench_stats(self, request):
+        return web.json_response(self.stats())
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/', self.dashboard)
+        app.router.add_get('/auth', self.auth_page)
+        app.router.add_post('/auth', self.auth_submit)
+        app.router.add_post('/api/session/renew', self.renew)
+        app.router.add_get(CF_FRAME_PATH, self.cf_frame)
+        app.router.add_post('/_bench/session', self.bench_session)
+        app.router.add_get('/_bench/stats', self.bench_stats)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        在当前事件循环中启动站点
+
+        Returns:
+            站点地址（port=0 时使用系统分配的端口）
+        """
+        self.runner = web.AppRunner(self.app(), access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        port = self.runner.addresses[0][1]
+        return f'http://{host}:{port}/'
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 MCHost 模拟站点')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--session-ttl', type=float, default=120, help='会话有效期（秒，默认 120）')
+    parser.add_argument('--renew-latency-ms', type=float, default=200, help='续期接口延迟（毫秒，默认 200）')
+    parser.add_argument('--latency-jitter-ms', type=float, default=0, help='延迟标准差（毫秒）')
+    parser.add_argument('--cf-rate', type=float, default=0.0, help='出现模拟 Cloudflare 验证的比例（0~1）')
+    parser.add_argument('--cf-seconds', type=float, default=2.0, help='模拟验证持续秒数')
+    args = parser.parse_args()
+
+    fake = FakeMCHost(args.session_ttl, args.renew_latency_ms, args.latency_jitter_ms, args.cf_rate, args.cf_seconds)
+
+    async def serve():
+        url = await fake.start(args.host, args.port)
+        print(f"模拟站点: {url}（登录: {url}auth，新会话: POST {url}_bench/session）")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await fake.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print(json.dumps(fake.stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
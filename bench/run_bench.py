@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+MCHost 续期基准测试
+启动本地模拟站点（fake_mchost.py），在临时目录中创建 N 个任务，用 MCHostRenewer
+（共享浏览器池 + 中央调度器，与 supervisor 模式相同）持续续期一段时间，统计：
+
+- 续期周期耗时和各阶段耗时（spans.jsonl，p50/p95/p99）
+- 续期结果（metrics.json）和调度延迟（RenewScheduler.metrics）
+- CPU 时间和内存峰值（续期进程 + 浏览器子进程，不含模拟站点）
+- 错过的截止时间：模拟站点上在续期前就已过期的会话
+
+--sweep 依次运行多轮，任务数递增，直到出现错过截止时间，得到单台主机可承载的最大任务数。
+结果写入 JSON（默认 bench/results/），便于比较不同提交。
+
+用法：
+    python bench/run_bench.py --tasks 5 --duration 180
+    python bench/run_bench.py --sweep 5,10,20,40 --session-ttl 90 --cf-rate 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import aiohttp
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+import http_renew
+import spans
+from browser_pool import BrowserPool
+from metrics import load_task_metrics, process_table, process_usage
+from mchost_renew import CONTEXT_OPTIONS, MCHostRenewer
+from scheduler import RenewScheduler
+from task_store import TaskStore, default_db_path, new_task_config
+
+logger = logging.getLogger('bench')
+
+
+# ==================== 模拟站点 ====================
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class FakeSiteProcess:
+    """在子进程中运行模拟站点（它的 CPU 占用不计入续期进程）"""
+
+    def __init__(self, args):
+        self.args = args
+        self.port = _free_port()
+        self.url = f'http://127.0.0.1:{self.port}/'
+        self.process = None
+
+    async def __aenter__(self):
+        args = self.args
+        self.process = subprocess.Popen(
+            [sys.executable, str(BENCH_DIR / 'fake_mchost.py'), '--port', str(self.port),
+             '--session-ttl', str(args.session_ttl), '--renew-latency-ms', str(args.renew_latency_ms),
+             '--latency-jitter-ms', str(args.latency_jitter_ms),
+             '--cf-rate', str(args.cf_rate), '--cf-seconds', str(args.cf_seconds)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        # 等待站点就绪
+        for _ in range(100):
+            try:
+                await self.stats()
+                return self
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.1)
+        raise RuntimeError('模拟站点启动失败')
+
+    async def __aexit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+    async def _request(self, method: str, path: str) -> dict:
+        async with aiohttp.ClientSession() as session:
+            async with session.request(method, self.url + path) as response:
+                return await response.json()
+
+    async def new_session(self) -> dict:
+        return await self._request('POST', '_bench/session')
+
+    async def stats(self) -> dict:
+        return await self._request('GET', '_bench/stats')
+
+
+# ==================== 资源占用 ====================
+
+def own_usage(exclude_pid: int) -> dict:
+    """本进程和浏览器子进程的资源占用（减去模拟站点子进程）"""
+    try:
+        table = process_table()
+    except OSError:
+        return {}
+    usage = process_usage(os.getpid(), table)
+    if usage is None:
+        return {}
+    site = process_usage(exclude_pid, table) or {}
+    browser = dict(usage['browser'])
+    for stats in site.values():
+        browser['rss_bytes'] -= stats['rss_bytes']
+        browser['cpu_seconds'] = round(browser['cpu_seconds'] - stats['cpu_seconds'], 2)
+        browser['processes'] -= stats['processes']
+    return {'renewer': usage['renewer'], 'browser': browser}
+
+
+async def sample_peak_rss(site_pid: int, peak: dict, interval: float = 1.0):
+    """每 interval 秒采样一次内存，记录峰值"""
+    while True:
+        usage = own_usage(site_pid)
+        for process, stats in usage.items():
+            peak[process] = max(peak.get(process, 0), stats['rss_bytes'])
+        if usage:
+            peak['total'] = max(peak.get('total', 0), sum(stats['rss_bytes'] for stats in usage.values()))
+        await asyncio.sleep(interval)
+
+
+# ==================== 一轮测试 ====================
+
+def bench_task_config(args, url: str, index: int) -> dict:
+    """基准测试任务的配置（按会话到期时间续期）"""
+    task_config = new_task_config(f'bench {index}', url, renew_interval_minutes=args.session_ttl / 60)
+    task_config.update({
+        'expiry_safety_margin_seconds': args.margin,
+        'min_renew_delay_seconds': 5,
+        'record_spans': True
+    })
+    return task_config
+
+
+async def run_round(args, task_count: int) -> dict:
+    """
+    运行一轮测试
+
+    Args:
+        args: 命令行参数
+        task_count: 任务数量
+
+    Returns:
+        本轮统计
+    """
+    base_dir = Path(tempfile.mkdtemp(prefix='mchost-bench-'))
+    logger.info(f"▶️ {task_count} 个任务，{args.duration} 秒（数据目录: {base_dir}）")
+
+    async with FakeSiteProcess(args) as site:
+        # 任务存储和 cookies
+        store = TaskStore(default_db_path(base_dir / 'tasks_config.json'))
+        store.set_setting('startup', {'max_concurrent_launches': args.launches})
+        task_ids = [f'bench{i:03d}' for i in range(task_count)]
+        for index, task_id in enumerate(task_ids):
+            store.add_task(task_id, bench_task_config(args, site.url, index))
+            task_dir = base_dir / 'tasks' / task_id
+            task_dir.mkdir(parents=True)
+            with open(task_dir / 'cookies.json', 'w', encoding='utf-8') as f:
+                json.dump([await site.new_session()], f)
+        store.close()
+
+        scheduler = RenewScheduler(workers=args.workers)
+        pool = None
+        if args.mode == 'pooled':
+            pool = BrowserPool(size=args.pool_size, standby_size=args.standby, standby_options=CONTEXT_OPTIONS,
+                               channel_cache=base_dir / '.chrome_channel.json')
+            await pool.start()
+
+        renewers = []
+        for task_id in task_ids:
+            renewer = MCHostRenewer(task_id=task_id, browser_pool=pool, scheduler=scheduler, base_dir=base_dir)
+            # 只写任务日志，不输出到控制台
+            renewer.logger.handlers = [h for h in renewer.logger.handlers if isinstance(h, logging.FileHandler)]
+            renewers.append(renewer)
+
+        usage_before = own_usage(site.process.pid)
+        peak_rss = {}
+        sampler = asyncio.ensure_future(sample_peak_rss(site.process.pid, peak_rss))
+        started = time.time()
+        runs = [asyncio.ensure_future(renewer.run()) for renewer in renewers]
+        try:
+            await asyncio.sleep(args.duration)
+            scheduler_metrics = scheduler.metrics()
+            usage_after = own_usage(site.process.pid)
+            site_stats = await site.stats()
+        finally:
+            sampler.cancel()
+            for run in runs:
+                run.cancel()
+            await asyncio.wait(runs, timeout=30)
+            scheduler.close()
+            if pool:
+                await pool.close()
+            await http_renew.close_session()
+            for renewer in renewers:
+                for handler in renewer.logger.handlers:
+                    handler.close()
+
+    # 续期结果和周期耗时
+    outcomes = {}
+    for task_id in task_ids:
+        for outcome, count in load_task_metrics(base_dir / 'tasks' / task_id / 'metrics.json')['renew'].items():
+            outcomes[outcome] = outcomes.get(outcome, 0) + count
+    samples, failed = spans.collect_samples(
+        [base_dir / 'tasks' / task_id / 'spans.jsonl' for task_id in task_ids], last=100000
+    )
+    phases = spans.summarize(samples, failed)
+    cycles = sum(outcomes.values())
+
+    cpu = {
+        process: round(usage_after[process]['cpu_seconds'] - usage_before[process]['cpu_seconds'], 2)
+        for process in usage_after if process in usage_before
+    }
+    cpu['total'] = round(sum(cpu.values()), 2)
+
+    # 错过截止时间：会话在续期前已过期，或在测试期间一次都没有续期成功
+    missed = site_stats['expired'] + (site_stats['sessions'] - site_stats['renewed'])
+    failures = cycles - outcomes.get('ok', 0)
+    startup = None
+    if site_stats['renewed'] == task_count and site_stats['last_first_renew_at']:
+        startup = round(site_stats['last_first_renew_at'] - started, 1)
+
+    result = {
+        'tasks': task_count,
+        'duration_seconds': args.duration,
+        'startup_seconds': startup,
+        'cycles': cycles,
+        'renew_outcomes': outcomes,
+        'cycle_latency_ms': phases.pop('renew.total', None),
+        'phases_ms': phases,
+        'scheduler': scheduler_metrics,
+        'cpu_seconds': cpu,
+        'cpu_seconds_per_cycle': round(cpu['total'] / cycles, 3) if cycles else None,
+        'rss_peak_bytes': peak_rss,
+        'rss_per_task_bytes': int(peak_rss['total'] / task_count) if peak_rss.get('total') else None,
+        'site': site_stats,
+        'missed_deadlines': missed,
+        'failed_renews': failures,
+        'ok': missed == 0 and failures == 0
+    }
+
+    if args.keep:
+        logger.info(f"   数据目录已保留: {base_dir}")
+    else:
+        shutil.rmtree(base_dir, ignore_errors=True)
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _print_round(result: dict):
+    latency = result['cycle_latency_ms'] or {}
+    rss = result['rss_per_task_bytes']
+    logger.info(
+        f"{'✓' if result['ok'] else '✗'} {result['tasks']} 个任务: {result['cycles']} 次续期，"
+        f"周期耗时 p50 {latency.get('p50', '-')} / p95 {latency.get('p95', '-')} / p99 {latency.get('p99', '-')} ms，"
+        f"CPU {result['cpu_seconds'].get('total')} 秒，内存 {f'{rss / 1024 / 1024:.0f} MB' if rss else '-'}/任务"
+    )
+    logger.info(
+        f"   错过截止时间 {result['missed_deadlines']}，失败续期 {result['failed_renews']}，"
+        f"调度延迟 p95 {result['scheduler']['lateness'].get('p95', '-')} 秒，启动用时 {result['startup_seconds']} 秒"
+    )
+
+
+async def run(args) -> dict:
+    counts = [int(n) for n in args.sweep.split(',')] if args.sweep else [args.tasks]
+    rounds = []
+    max_ok = None
+    for count in counts:
+        result = await run_round(args, count)
+        rounds.append(result)
+        _print_round(result)
+        if not result['ok']:
+            if args.sweep:
+                logger.info(f"⏹️ {count} 个任务时错过截止时间，停止递增")
+            break
+        max_ok = count
+
+    return {
+        'commit': _git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'params': vars(args),
+        'rounds': rounds,
+        'max_tasks_without_miss': max_ok
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='MCHost 续期基准测试（本地模拟站点）')
+    parser.add_argument('--tasks', type=int, default=5, help='任务数量（默认 5）')
+    parser.add_argument('--sweep', help='逗号分隔的任务数量，依次运行直到错过截止时间（如 5,10,20,40）')
+    parser.add_argument('--duration', type=float, default=180, help='每轮持续秒数（默认 180，应大于会话有效期）')
+    parser.add_argument('--mode', choices=('pooled', 'isolated'), default='pooled',
+                        help='pooled：共享浏览器池（supervisor 模式）；isolated：每个任务独立浏览器')
+    parser.add_argument('--pool-size', type=int, default=1, help='共享浏览器数量（默认 1）')
+    parser.add_argument('--standby', type=int, default=1, help='热备 context 数量（默认 1）')
+    parser.add_argument('--workers', type=int, default=2, help='调度器执行槽位（默认 2）')
+    parser.add_argument('--launches', type=int, default=2, help='同时启动浏览器/登录检查的数量（默认 2）')
+    parser.add_argument('--session-ttl', type=float, default=120, help='模拟会话有效期（秒，默认 120）')
+    parser.add_argument('--margin', type=float, default=30, help='会话到期前多少秒续期（默认 30）')
+    parser.add_argument('--renew-latency-ms', type=float, default=200, help='续期接口延迟（毫秒，默认 200）')
+    parser.add_argument('--latency-jitter-ms', type=float, default=50, help='延迟标准差（毫秒，默认 50）')
+    parser.add_argument('--cf-rate', type=float, default=0.0, help='出现模拟 Cloudflare 验证的比例（0~1）')
+    parser.add_argument('--cf-seconds', type=float, default=2.0, help='模拟验证持续秒数（默认 2）')
+    parser.add_argument('--output', help='结果 JSON 路径（默认 bench/results/<时间>-<提交>.json）')
+    parser.add_argument('--keep', action='store_true', help='保留每轮的临时数据目录（任务日志、spans.jsonl）')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%H:%M:%S')
+    # 浏览器池等模块的日志只保留警告
+    for name in ('browser_pool', 'scheduler', 'http_renew'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    report = asyncio.run(run(args))
+
+    output = Path(args.output) if args.output else (
+        BENCH_DIR / 'results' / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}-{report['commit']}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    logger.info(f"📄 结果已写入: {output}")
+    logger.info(f"单台主机最大任务数（未错过截止时间）: {report['max_tasks_without_miss']}")
+    return 0 if report['max_tasks_without_miss'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
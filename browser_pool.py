@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+MCHost 共享浏览器池
+一个（或少量）常驻 Chromium 进程，每个任务使用独立的 BrowserContext；
+可以预先创建少量空闲 context（热备），新启动或崩溃重启的任务直接领取
+"""
+
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+
+from playwright.async_api import async_playwright
+
+logger = logging.getLogger(__name__)
+
+# 启动参数（与 MCHostRenewer.init_browser 保持一致）
+LAUNCH_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-blink-features=AutomationControlled'
+]
+
+# Chrome 不可用的结果缓存多久（秒）：未安装 Chrome 时避免每次启动都先失败一次再回退
+CHROME_UNAVAILABLE_TTL = 24 * 3600
+# 表示未安装 Chrome 的错误信息（只有这类错误才缓存；超时等其他错误只回退本次启动）
+CHROME_MISSING_MARKERS = ("is not found at", "Executable doesn't exist")
+
+# 本进程内记录的 Chrome 不可用时间
+_chrome_unavailable_at = None
+
+# 领取热备 context 后恢复 localStorage：每个标签页第一次打开对应源时写入一次
+RESTORE_LOCAL_STORAGE = """(() => {
+    const items = (__ORIGINS__)[location.origin];
+    if (!items || sessionStorage.getItem('__storage_state_restored')) return;
+    for (const [name, value] of Object.entries(items)) localStorage.setItem(name, value);
+    sessionStorage.setItem('__storage_state_restored', '1');
+})();"""
+
+
+def _chrome_known_unavailable(cache_file: Path = None) -> bool:
+    global _chrome_unavailable_at
+    if _chrome_unavailable_at is None and cache_file:
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                _chrome_unavailable_at = json.load(f).get('chrome_unavailable_at')
+        except (OSError, ValueError):
+            pass
+    return _chrome_unavailable_at is not None and time.time() - _chrome_unavailable_at < CHROME_UNAVAILABLE_TTL
+
+
+def _remember_chrome_unavailable(cache_file: Path = None, error: Exception = None):
+    global _chrome_unavailable_at
+    _chrome_unavailable_at = time.time()
+    if cache_file:
+        try:
+            with open(cache_file, 'w', encoding='utf-8') as f:
+                json.dump({'chrome_unavailable_at': _chrome_unavailable_at, 'error': str(error)[:200]}, f)
+        except OSError:
+            pass
+
+
+async def launch_chromium(playwright, cache_file: Path = None, log=None, user_data_dir: Path = None,
+                          **launch_options):
+    """
+    启动浏览器：优先使用已安装的 Chrome，不可用时回退到 Chromium
+
+    Chrome 不可用的结果记录在进程内和 cache_file 中，CHROME_UNAVAILABLE_TTL 内直接启动 Chromium
+
+    Args:
+        playwright: Playwright 实例
+        cache_file: 缓存文件（所有任务进程共用）
+        log: 日志对象（默认使用模块logger）
+        user_data_dir: 指定时启动持久化 context（launch_persistent_context），返回 BrowserContext
+        launch_options: 传给 chromium.launch / launch_persistent_context 的参数
+
+    Returns:
+        Browser；指定 user_data_dir 时为 BrowserContext
+    """
+    log = log or logger
+    if user_data_dir:
+        async def launch(**options):
+            return await playwright.chromium.launch_persistent_context(str(user_data_dir), **options)
+    else:
+        launch = playwright.chromium.launch
+
+    if not _chrome_known_unavailable(cache_file):
+        try:
+            return await launch(channel='chrome', **launch_options)
+        except Exception as e:
+            if any(marker in str(e) for marker in CHROME_MISSING_MARKERS):
+                log.warning(f"Chrome不可用，回退到Chromium（{CHROME_UNAVAILABLE_TTL // 3600} 小时内不再尝试）: {e}")
+                _remember_chrome_unavailable(cache_file, e)
+            else:
+                log.warning(f"Chrome启动失败，本次回退到Chromium: {e}")
+    return await launch(**launch_options)
+
+
+async def apply_storage_state(context, storage_state):
+    """
+    把 storage_state 加载到已创建的 context（领取热备 context 时使用）
+
+    cookies 通过 add_cookies 加载；localStorage 通过初始化脚本在首次打开对应源时写入
+
+    Args:
+        context: BrowserContext
+        storage_state: storage_state 文件路径或 dict（context.storage_state() 的格式）
+    """
+    if not isinstance(storage_state, dict):
+        with open(storage_state, 'r', encoding='utf-8') as f:
+            storage_state = json.load(f)
+    cookies = storage_state.get('cookies') or []
+    if cookies:
+        await context.add_cookies(cookies)
+    origins = {
+        origin['origin']: {item['name']: item['value'] for item in origin['localStorage']}
+        for origin in storage_state.get('origins') or [] if origin.get('localStorage')
+    }
+    if origins:
+        await context.add_init_script(RESTORE_LOCAL_STORAGE.replace('__ORIGINS__', json.dumps(origins)))
+
+
+class BrowserPool:
+    """
+    共享浏览器池
+
+    - 固定数量的 Chromium 进程，任务按最少占用原则分配到某个浏览器
+    - 每个任务一个 BrowserContext，cookies 互相隔离
+    - 某个浏览器崩溃（disconnected）时只回收并重启该浏览器，
+      其余浏览器上的任务不受影响
+    - 热备：保持 standby_size 个用 standby_options 预先创建的空闲 context，
+      被领取后在后台补齐
+    """
+
+    def __init__(self, size: int = 1, headless: bool = True,
+                 max_contexts_per_browser: int = 0, env: dict = None,
+                 standby_size: int = 0, standby_options: dict = None, channel_cache: Path = None):
+        """
+        初始化浏览器池
+
+        Args:
+            size: 浏览器进程数量
+            headless: 是否无头模式
+            max_contexts_per_browser: 单个浏览器最多承载的 context 数（0 表示不限）
+            env: 浏览器进程环境变量
+            standby_size: 热备 context 数量（0 表示不预热）
+            standby_options: 热备 context 的创建参数（除 storage_state 外参数相同的请求才会领取热备 context）
+            channel_cache: Chrome 可用性缓存文件（见 launch_chromium）
+        """
+        self.size = max(1, int(size))
+        self.headless = headless
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.env = env
+        self.channel_cache = channel_cache
+
+        # 热备 context [(slot, browser, context)] 和补齐任务
+        self.standby_size = max(0, int(standby_size))
+        self.standby_options = standby_options or {}
+        self.standby = []
+        self._refill_task = None
+        # 领取热备成功/没有可用热备的次数
+        self.standby_claimed = 0
+        self.standby_missed = 0
+
+        self.playwright = None
+        # 浏览器槽位 [Browser or None]
+        self.browsers = [None] * self.size
+        # 每个槽位上的 context 数量
+        self.context_counts = [0] * self.size
+        # 每个槽位的回收次数
+        self.recycle_counts = [0] * self.size
+
+        self._lock = asyncio.Lock()
+        self._closing = False
+
+    async def start(self):
+        """启动 Playwright 驱动和所有浏览器"""
+        if self.playwright is None:
+            self.playwright = await async_playwright().start()
+        for slot in range(self.size):
+            if self.browsers[slot] is None:
+                await self._launch(slot)
+        logger.info(f"✓ 浏览器池已启动，共 {self.size} 个浏览器")
+        self._schedule_refill()
+
+    async def _launch(self, slot: int):
+        """在指定槽位启动浏览器"""
+        browser = await launch_chromium(
+            self.playwright,
+            self.channel_cache,
+            headless=self.headless,
+            env=self.env,
+            args=LAUNCH_ARGS
+        )
+
+        browser.on('disconnected', lambda _: self._on_disconnected(slot, browser))
+        self.browsers[slot] = browser
+        self.context_counts[slot] = 0
+        logger.info(f"✓ 浏览器 #{slot} 已启动")
+        return browser
+
+    def _on_disconnected(self, slot: int, browser):
+        """浏览器断开（崩溃或被关闭）回调"""
+        if self._closing or self.browsers[slot] is not browser:
+            return
+        logger.warning(f"⚠️ 浏览器 #{slot} 已断开，正在回收重启...")
+        self.browsers[slot] = None
+        self.context_counts[slot] = 0
+        self.standby = [entry for entry in self.standby if entry[0] != slot]
+        asyncio.ensure_future(self._relaunch(slot))
+
+    async def _relaunch(self, slot: int):
+        """重启崩溃的浏览器"""
+        async with self._lock:
+            if self._closing or self.browsers[slot] is not None:
+                return
+            try:
+                await self._launch(slot)
+                self.recycle_counts[slot] += 1
+            except Exception as e:
+                logger.error(f"重启浏览器 #{slot} 失败: {e}")
+        self._schedule_refill()
+
+    async def recycle(self, slot: int):
+        """主动回收某个浏览器（其上的所有 context 将失效）"""
+        browser = self.browsers[slot]
+        self.browsers[slot] = None
+        self.context_counts[slot] = 0
+        self.standby = [entry for entry in self.standby if entry[0] != slot]
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.warning(f"关闭浏览器 #{slot} 时出错: {e}")
+        await self._relaunch(slot)
+
+    def _pick_slot(self) -> int:
+        """选择承载 context 最少的可用浏览器"""
+        candidates = [
+            slot for slot in range(self.size)
+            if self.browsers[slot] is not None and self.browsers[slot].is_connected()
+        ]
+        if not candidates:
+            return -1
+        return min(candidates, key=lambda slot: self.context_counts[slot])
+
+    async def new_context(self, **context_options):
+        """
+        为任务创建独立的 BrowserContext（参数与热备相同时优先领取热备 context）
+
+        storage_state 不参与比较：领取热备 context 后再加载（见 apply_storage_state）
+
+        Returns:
+            (slot, context)
+        """
+        storage_state = context_options.get('storage_state')
+        options = {key: value for key, value in context_options.items() if key != 'storage_state'}
+        if self.standby_size and options == self.standby_options:
+            while self.standby:
+                slot, browser, context = self.standby.pop(0)
+                if self.browsers[slot] is browser and browser.is_connected():
+                    self.standby_claimed += 1
+                    self._schedule_refill()
+                    if storage_state:
+                        try:
+                            await apply_storage_state(context, storage_state)
+                        except Exception:
+                            await context.close()
+                            raise
+                    return slot, context
+            self.standby_missed += 1
+            self._schedule_refill()
+
+        async with self._lock:
+            slot, _, context = await self._create_context(context_options)
+        return slot, context
+
+    async def _create_context(self, context_options: dict):
+        """在承载最少的浏览器上创建 context（调用方持有 _lock）"""
+        slot = self._pick_slot()
+        if slot < 0:
+            # 所有浏览器都不可用，先启动第一个空槽位
+            slot = self.browsers.index(None) if None in self.browsers else 0
+            await self._launch(slot)
+
+        if (self.max_contexts_per_browser
+                and self.context_counts[slot] >= self.max_contexts_per_browser):
+            logger.warning(
+                f"浏览器 #{slot} 已承载 {self.context_counts[slot]} 个 context，"
+                f"超过建议上限 {self.max_contexts_per_browser}"
+            )
+
+        browser = self.browsers[slot]
+        context = await browser.new_context(**context_options)
+        self.context_counts[slot] += 1
+
+        def on_close(_):
+            # 浏览器已被回收时计数已清零，不再扣减
+            if self.browsers[slot] is browser and self.context_counts[slot] > 0:
+                self.context_counts[slot] -= 1
+
+        context.on('close', on_close)
+        return slot, browser, context
+
+    def _schedule_refill(self):
+        """在后台补齐热备 context"""
+        if not self.standby_size or self._closing:
+            return
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.ensure_future(self._refill())
+
+    async def _refill(self):
+        while not self._closing and len(self.standby) < self.standby_size:
+            try:
+                async with self._lock:
+                    entry = await self._create_context(self.standby_options)
+            except Exception as e:
+                logger.warning(f"预热 context 失败: {e}")
+                return
+            self.standby.append(entry)
+
+    def stats(self) -> dict:
+        """浏览器池状态"""
+        return {
+            'size': self.size,
+            'standby': len(self.standby),
+            'standby_claimed': self.standby_claimed,
+            'standby_missed': self.standby_missed,
+            'browsers': [
+                {
+                    'slot': slot,
+                    'connected': bool(self.browsers[slot] and self.browsers[slot].is_connected()),
+                    'contexts': self.context_counts[slot],
+                    'recycled': self.recycle_counts[slot]
+                }
+                for slot in range(self.size)
+            ]
+        }
+
+    async def close(self):
+        """关闭所有浏览器和 Playwright 驱动"""
+        self._closing = True
+        if self._refill_task:
+            self._refill_task.cancel()
+        self.standby.clear()
+        for slot, browser in enumerate(self.browsers):
+            if browser is None:
+                continue
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.warning(f"关闭浏览器 #{slot} 时出错: {e}")
+            self.browsers[slot] = None
+        if self.playwright:
+            await self.playwright.stop()
+            self.playwright = None
+        logger.info("浏览器池已关闭")
+
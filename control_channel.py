@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+MCHost 任务控制通道
+基于每任务 Unix domain socket 的推送式触发（替代 trigger.json 轮询）
+
+协议：客户端连接后发送一行 JSON（如 {"action": "renew_now"}），
+服务端入队后回复一行 {"ok": true} 并关闭连接。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class ControlServer:
+    """任务端控制通道服务（运行在续期循环的事件循环中）"""
+
+    def __init__(self, socket_path: Path, log=None):
+        """
+        初始化控制通道
+
+        Args:
+            socket_path: Unix socket 路径
+            log: 日志对象（默认使用模块logger）
+        """
+        self.socket_path = Path(socket_path)
+        self.logger = log or logger
+        # 收到的命令队列，续期循环在其上等待
+        self.commands = asyncio.Queue()
+        self.server = None
+
+    async def start(self):
+        """开始监听"""
+        # 清理上次异常退出遗留的 socket 文件
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        self.server = await asyncio.start_unix_server(self._handle, path=str(self.socket_path))
+        os.chmod(self.socket_path, 0o600)
+        self.logger.info(f"✓ 控制通道已就绪: {self.socket_path}")
+
+    async def _handle(self, reader, writer):
+        """处理一个客户端连接"""
+        try:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            command = json.loads(line.decode('utf-8'))
+            if not isinstance(command, dict) or 'action' not in command:
+                raise ValueError('缺少 action 字段')
+            self.commands.put_nowait(command)
+            writer.write(b'{"ok": true}\n')
+        except Exception as e:
+            self.logger.error(f"控制通道收到无效命令: {e}")
+            writer.write(json.dumps({'ok': False, 'error': str(e)}).encode('utf-8') + b'\n')
+        try:
+            await writer.drain()
+            writer.close()
+        except Exception:
+            pass
+
+    async def close(self):
+        """停止监听并删除 socket 文件"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def send_command(socket_path: Path, command: dict, timeout: float = 2.0) -> bool:
+    """
+    向任务发送控制命令（同步客户端，供 TaskManager / Web 界面使用）
+
+    Args:
+        socket_path: 任务的 Unix socket 路径
+        command: 命令内容，必须包含 action
+        timeout: 连接和读写超时（秒）
+
+    Returns:
+        任务是否已确认收到
+    """
+    socket_path = Path(socket_path)
+    if not socket_path.exists():
+        return False
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(socket_path))
+            sock.sendall(json.dumps(command).encode('utf-8') + b'\n')
+            reply = sock.makefile('r', encoding='utf-8').readline()
+        return bool(reply) and json.loads(reply).get('ok', False)
+    except (OSError, ValueError) as e:
+        logger.debug(f"控制通道不可用: {socket_path} - {e}")
+        return False
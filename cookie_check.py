@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+MCHost Cookie 离线预检
+启动浏览器之前只解析 cookies.json（或更新的 storage_state.json），检查会话 cookie 的 expires：
+会话 cookie 已过期时直接标记任务"需要更新凭据"，不再启动浏览器、打开页面、等待 Renew 按钮超时。
+
+只能发现"已经过期"的 cookie；没有过期时间（浏览器会话 cookie）或尚未过期的 cookie 仍需在线检查。
+"""
+
+import json
+import re
+import time
+from pathlib import Path
+from typing import Optional
+
+# 默认视为会话 cookie 的名称（整个名称匹配，如 laravel_session、PHPSESSID、connect.sid、auth_token；
+# 不匹配 _hjSession_*、csrftoken 等统计/CSRF cookie）。可用任务配置 session_cookie_names 指定
+SESSION_COOKIE_PATTERN = re.compile(
+    r'(?:[a-z0-9]+[_.-])?session(?:_?id)?|phpsessid|jsessionid|connect\.sid|sid|sess'
+    r'|(?:[a-z0-9]+[_.-])?auth(?:_token)?|access_token|remember_token',
+    re.IGNORECASE
+)
+
+
+def _load_cookies(cookies_file: Path, storage_state_file: Path = None):
+    """读取 cookies 列表：storage_state.json 比 cookies.json 新时以它为准"""
+    source = cookies_file
+    if storage_state_file and storage_state_file.exists():
+        if not cookies_file.exists() or storage_state_file.stat().st_mtime > cookies_file.stat().st_mtime:
+            source = storage_state_file
+
+    with open(source, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    cookies = data.get('cookies', []) if isinstance(data, dict) else data
+    if not isinstance(cookies, list):
+        raise ValueError('cookies 格式错误（应为数组）')
+    return cookies, source
+
+
+def credentials_mtime(cookies_file: Path, storage_state_file: Path = None) -> Optional[float]:
+    """凭据文件的最新修改时间（任务管理器据此判断用户是否更新了 cookies）"""
+    mtimes = []
+    for path in (cookies_file, storage_state_file):
+        try:
+            if path:
+                mtimes.append(path.stat().st_mtime)
+        except FileNotFoundError:
+            pass
+    return max(mtimes) if mtimes else None
+
+
+def check_cookies(cookies_file: Path, storage_state_file: Path = None,
+                  session_cookie_names=None, now: float = None) -> dict:
+    """
+    离线检查 cookies 是否可能仍然有效
+
+    Args:
+        cookies_file: cookies.json 路径
+        storage_state_file: storage_state.json 路径（可选）
+        session_cookie_names: 会话 cookie 名称列表（其中任一已过期即判定失效）；为空时按名称规则识别，
+                              识别不到时检查所有 cookie（推断出的 cookie 全部过期才判定失效）
+        now: 当前时间戳（默认 time.time()）
+
+    Returns:
+        ok: 是否可以继续启动浏览器
+        reason: ok / missing（没有 cookies 文件）/ invalid（无法解析）/ expired（会话 cookie 已过期）
+        expired: 已过期的会话 cookie 名称
+        expires_at: 会话 cookie 中最早的过期时间戳（没有过期时间时为 None）
+    """
+    cookies_file = Path(cookies_file)
+    storage_state_file = Path(storage_state_file) if storage_state_file else None
+    now = now if now is not None else time.time()
+    result = {'ok': True, 'reason': 'ok', 'expired': [], 'expires_at': None}
+
+    if not cookies_file.exists() and not (storage_state_file and storage_state_file.exists()):
+        return {**result, 'ok': False, 'reason': 'missing'}
+    try:
+        cookies, _ = _load_cookies(cookies_file, storage_state_file)
+    except (OSError, ValueError) as e:
+        return {**result, 'ok': False, 'reason': 'invalid', 'error': str(e)}
+    if not cookies:
+        return {**result, 'ok': False, 'reason': 'missing'}
+
+    if session_cookie_names:
+        session = [c for c in cookies if c.get('name') in session_cookie_names]
+        # 指定的会话 cookie 全部不存在
+        if not session:
+            return {**result, 'ok': False, 'reason': 'missing'}
+        any_expired_fails = True
+    else:
+        # 按名称推断可能误把统计/CSRF cookie 当作会话 cookie，只有全部过期才判定失效
+        # （误判会让任务停止自动重启，直到用户更新 cookies）
+        session = [c for c in cookies if SESSION_COOKIE_PATTERN.fullmatch(c.get('name', ''))] or cookies
+        any_expired_fails = False
+
+    # expires 为 -1 或缺失表示浏览器会话 cookie，没有过期时间
+    dated = [c for c in session if isinstance(c.get('expires'), (int, float)) and c['expires'] > 0]
+    expired = [c.get('name') for c in dated if c['expires'] <= now]
+    result['expired'] = expired
+    alive = [c['expires'] for c in dated if c['expires'] > now]
+    result['expires_at'] = min(alive) if alive else None
+
+    if expired and (any_expired_fails or len(expired) == len(session)):
+        result.update(ok=False, reason='expired')
+    return result
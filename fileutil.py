@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+MCHost 文件读取工具
+从文件末尾向前读取最后 N 行（开销只与读取的行数有关，与文件大小无关），
+按字节偏移增量读取新增行，以及原子地写入/合并更新 JSON 文件
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+# 每次向前读取的块大小
+BLOCK_SIZE = 8192
+
+
+def read_lines_before(path: Path, end: int, limit: int):
+    """
+    读取 end 字节偏移之前的最后 limit 行
+
+    Args:
+        path: 文件路径
+        end: 结束字节偏移（不含），通常为文件大小或上一页的起始偏移
+        limit: 最多读取的行数
+
+    Returns:
+        (lines, start)：按文件顺序排列的行（已去掉换行符），以及第一行的起始字节偏移
+    """
+    if limit <= 0 or end <= 0:
+        return [], max(end, 0)
+
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = min(end, f.tell())
+        pos = end
+        buffer = b''
+
+        # 向前读取，直到凑够 limit 个完整行或到达文件开头
+        while pos > 0 and buffer.count(b'\n') <= limit:
+            read_size = min(BLOCK_SIZE, pos)
+            pos -= read_size
+            f.seek(pos)
+            buffer = f.read(read_size) + buffer
+
+    # end 处若正好是换行符，不算作一个空行
+    if buffer.endswith(b'\n'):
+        buffer = buffer[:-1]
+        trailing = 1
+    else:
+        trailing = 0
+
+    parts = buffer.split(b'\n')
+    if pos > 0 or len(parts) > limit:
+        # 第一段可能是不完整的行，或者超出 limit
+        parts = parts[-limit:]
+    start = end - trailing - len(b'\n'.join(parts))
+
+    lines = [part.decode('utf-8', errors='replace').rstrip('\r') for part in parts]
+    if lines == ['']:
+        return [], start
+    return lines, start
+
+
+def tail_lines(path: Path, limit: int):
+    """读取文件最后 limit 行"""
+    path = Path(path)
+    if not path.exists():
+        return []
+    lines, _ = read_lines_before(path, path.stat().st_size, limit)
+    return lines
+
+
+def read_lines_after(path: Path, offset: int, max_bytes: int = 256 * 1024):
+    """
+    读取 offset 字节偏移之后新增的完整行（用于增量追加日志）
+
+    Args:
+        path: 文件路径
+        offset: 起始字节偏移（上次读取返回的偏移）
+        max_bytes: 单次最多读取的字节数
+
+    Returns:
+        (lines, new_offset)：新增的完整行，以及下次读取的起始偏移；
+        最后一行尚未写完（没有换行符）时不返回，等下次再读；
+        单行超过 max_bytes 时把读到的部分作为一行返回并前进偏移（否则偏移永远停在该行）
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(max_bytes)
+
+    last_newline = data.rfind(b'\n')
+    if last_newline < 0:
+        if len(data) >= max_bytes:
+            return [data.decode('utf-8', errors='replace')], offset + len(data)
+        return [], offset
+
+    data = data[:last_newline]
+    lines = [line.decode('utf-8', errors='replace').rstrip('\r') for line in data.split(b'\n')]
+    return lines, offset + last_newline + 1
+
+
+def write_json_file(path: Path, data, indent: int = 2):
+    """
+    原子地写入 JSON 文件（如 cookies.json）：先写临时文件再替换，
+    崩溃或其他进程同时读取时不会看到写了一半的文件
+
+    临时文件名带进程ID，多个进程（续期脚本、Web 界面）同时写同一文件时互不干扰
+    """
+    path = Path(path)
+    tmp_file = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+    os.replace(tmp_file, path)
+
+
+def merge_json_file(path: Path, fields: dict) -> dict:
+    """
+    合并更新 JSON 文件（如 status.json）：读取后更新字段和 updated_at，先写临时文件再替换
+
+    Returns:
+        更新后的内容
+    """
+    path = Path(path)
+    data = {}
+    if path.exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    data.update(fields)
+    data['updated_at'] = datetime.now().isoformat()
+
+    write_json_file(path, data)
+    return data
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+MCHost HTTP 快速续期通道
+从浏览器学习一次 Renew 接口（URL、方法、请求头、请求体），之后直接用任务的 cookies
+重放该请求，无需常驻 Chromium；遇到验证页、跳转登录页或非 2xx 响应时由调用方回退到浏览器
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+try:
+    import aiohttp
+except ImportError:  # 可选依赖：未安装时快速通道不可用
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+# 重放时保留的请求头（cookie 由 cookies.json 生成，其余头部与浏览器无关）
+REPLAY_HEADERS = (
+    'accept', 'content-type', 'x-requested-with', 'x-csrf-token', 'x-xsrf-token',
+    'origin', 'referer', 'user-agent', 'accept-language'
+)
+
+# 响应体中出现即视为 Cloudflare 验证页
+CHALLENGE_MARKERS = ('challenges.cloudflare.com', 'cf-chl', 'cf_chl_opt', 'Just a moment...')
+
+# 进程内共享的 HTTP 连接池（supervisor 模式下所有任务共用）
+_session = None
+
+
+def is_available() -> bool:
+    """aiohttp 是否已安装"""
+    return aiohttp is not None
+
+
+async def get_session():
+    """获取共享的 aiohttp 会话（cookie 按请求单独传入，不使用会话级 cookie jar）"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=50, ttl_dns_cache=300),
+            cookie_jar=aiohttp.DummyCookieJar(),
+            timeout=aiohttp.ClientTimeout(total=30)
+        )
+    return _session
+
+
+async def close_session():
+    """关闭共享的 aiohttp 会话"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def save_endpoint(path: Path, request):
+    """
+    保存浏览器中捕获的 Renew 请求
+
+    Args:
+        path: renew_endpoint.json 路径
+        request: Playwright Request
+    """
+    headers = await request.all_headers()
+    endpoint = {
+        'method': request.method,
+        'url': request.url,
+        'headers': {k: v for k, v in headers.items() if k.lower() in REPLAY_HEADERS},
+        'post_data': request.post_data,
+        'learned_at': datetime.now().isoformat()
+    }
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(endpoint, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_endpoint(path: Path):
+    """读取已学习的 Renew 请求，不存在或损坏时返回 None"""
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            endpoint = json.load(f)
+        return endpoint if endpoint.get('url') and endpoint.get('method') else None
+    except Exception:
+        return None
+
+
+def _domain_matches(host: str, domain: str) -> bool:
+    domain = domain.lstrip('.').lower()
+    return host == domain or host.endswith('.' + domain)
+
+
+def cookie_header(cookies: list, url: str, now: float = None) -> str:
+    """
+    按 URL 的域名和路径从 cookies.json 生成 Cookie 请求头
+
+    Args:
+        cookies: Playwright 格式的 cookie 列表
+        url: 请求 URL
+        now: 当前时间戳（用于过滤过期 cookie）
+    """
+    now = now if now is not None else time.time()
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    path = parts.path or '/'
+
+    pairs = []
+    for cookie in cookies:
+        if cookie.get('domain') and not _domain_matches(host, cookie['domain']):
+            continue
+        if not path.startswith(cookie.get('path', '/') or '/'):
+            continue
+        if cookie.get('secure') and parts.scheme != 'https':
+            continue
+        expires = cookie.get('expires', -1)
+        if expires and expires > 0 and expires < now:
+            continue
+        pairs.append(f"{cookie['name']}={cookie['value']}")
+    return '; '.join(pairs)
+
+
+def _cookie_expires(morsel, now: float) -> float:
+    """Set-Cookie 的过期时间戳（max-age 优先于 expires），会话 cookie 返回 -1"""
+    max_age = morsel['max-age']
+    if max_age:
+        try:
+            return now + int(max_age)
+        except ValueError:
+            pass
+    if morsel['expires']:
+        try:
+            return parsedate_to_datetime(morsel['expires']).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return -1
+
+
+def merge_set_cookies(cookies: list, response, now: float = None) -> bool:
+    """
+    将响应（含重定向）中的 Set-Cookie 合并到 cookie 列表（服务端轮换会话 cookie 时保持有效）
+
+    按名称、域名和路径匹配：已有的 cookie 更新值和过期时间，新的 cookie 追加，
+    已过期（max-age<=0 或 expires 在过去）的 cookie 删除
+
+    Args:
+        cookies: Playwright 格式的 cookie 列表（原地修改）
+        response: aiohttp 响应（使用其 history、cookies 和 url）
+        now: 当前时间戳
+
+    Returns:
+        是否有 cookie 被更新
+    """
+    now = now if now is not None else time.time()
+    changed = False
+    for resp in list(getattr(response, 'history', ())) + [response]:
+        parts = urlsplit(str(resp.url))
+        host = (parts.hostname or '').lower()
+        # 未指定 path 时使用请求路径所在的目录（RFC 6265 default-path）
+        default_path = parts.path[:parts.path.rfind('/')] if parts.path.count('/') > 1 else '/'
+
+        for name, morsel in resp.cookies.items():
+            domain = morsel['domain'] or host
+            path = morsel['path'] or default_path
+            expires = _cookie_expires(morsel, now)
+            existing = next((cookie for cookie in cookies
+                             if cookie['name'] == name
+                             and (cookie.get('domain') or host).lstrip('.').lower() == domain.lstrip('.').lower()
+                             and (cookie.get('path') or '/') == path), None)
+
+            if expires != -1 and expires <= now:
+                if existing is not None:
+                    cookies.remove(existing)
+                    changed = True
+                continue
+
+            if existing is None:
+                existing = {'name': name, 'value': None, 'domain': domain, 'path': path,
+                            'expires': -1, 'httpOnly': bool(morsel['httponly']), 'secure': bool(morsel['secure']),
+                            'sameSite': (morsel['samesite'] or 'Lax').capitalize()}
+                cookies.append(existing)
+            if existing['value'] != morsel.value or existing.get('expires', -1) != expires:
+                existing['value'] = morsel.value
+                existing['expires'] = expires
+                changed = True
+    return changed
+
+
+async def replay_renew(endpoint: dict, cookies: list) -> dict:
+    """
+    重放 Renew 请求
+
+    Args:
+        endpoint: load_endpoint 返回的请求描述
+        cookies: 任务 cookies（可能被 Set-Cookie 原地更新）
+
+    Returns:
+        与浏览器 Renew 结果格式一致的 dict（额外包含 via='http'、cookies_changed）
+    """
+    result = {'ok': False, 'cause': 'error', 'status': None, 'latency_ms': None,
+              'url': endpoint['url'], 'session_expires_at': None, 'via': 'http',
+              'cookies_changed': False}
+
+    headers = dict(endpoint.get('headers', {}))
+    headers['Cookie'] = cookie_header(cookies, endpoint['url'])
+    data = endpoint.get('post_data')
+
+    session = await get_session()
+    started = time.perf_counter()
+    try:
+        async with session.request(endpoint['method'], endpoint['url'], headers=headers,
+                                   data=data.encode('utf-8') if data else None,
+                                   allow_redirects=True) as response:
+            body = await response.text(errors='replace')
+            result['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            result['status'] = response.status
+            result['url'] = str(response.url)
+            result['cookies_changed'] = merge_set_cookies(cookies, response)
+
+            redirected = [str(r.url) for r in response.history] + [str(response.url)]
+            if any('/auth' in urlsplit(u).path for u in redirected):
+                result['cause'] = 'session_expired'
+            elif response.headers.get('cf-mitigated') or any(m in body for m in CHALLENGE_MARKERS):
+                result['cause'] = 'cf_challenge'
+            elif 200 <= response.status < 300:
+                result['ok'] = True
+                result['cause'] = 'ok'
+                try:
+                    result['body'] = json.loads(body)
+                except ValueError:
+                    pass
+            else:
+                result['cause'] = f'http_{response.status}'
+    except asyncio.TimeoutError:
+        result['cause'] = 'timeout'
+    except aiohttp.ClientError as e:
+        result['cause'] = 'error'
+        result['error'] = str(e)
+
+    return result
@@ -40,7 +40,7 @@ echo ""
 echo "📦 步骤 3/5: 安装依赖..."
 source venv/bin/activate
 pip install --upgrade pip > /dev/null
-pip install playwright flask
+pip install playwright flask aiohttp
 echo "✅ Python 依赖安装完成"
 
 echo ""
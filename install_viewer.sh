@@ -41,6 +41,15 @@ if [ -z "$VIEWER_PASSWORD" ]; then
     echo "使用默认密码: mchost123"
 fi
 
+# 安装任务管理器守护进程（Web 界面通过它启动/停止任务）
+echo "安装任务管理器服务..."
+MANAGER_SERVICE_FILE="/tmp/mchost-manager.service"
+cp "$SCRIPT_DIR/mchost-manager.service" "$MANAGER_SERVICE_FILE"
+sed -i "s|%USER%|$USER_NAME|g" "$MANAGER_SERVICE_FILE"
+sed -i "s|%SCRIPT_DIR%|$SCRIPT_DIR|g" "$MANAGER_SERVICE_FILE"
+$SUDO cp "$MANAGER_SERVICE_FILE" /etc/systemd/system/mchost-manager.service
+$SUDO chmod 644 /etc/systemd/system/mchost-manager.service
+
 # 创建服务文件
 echo "创建 systemd 服务文件..."
 SERVICE_FILE="/tmp/mchost-viewer.service"
@@ -62,10 +71,12 @@ $SUDO systemctl daemon-reload
 
 # 启用服务
 echo "启用服务（开机自启）..."
+$SUDO systemctl enable mchost-manager.service
 $SUDO systemctl enable mchost-viewer.service
 
 # 启动服务
 echo "启动服务..."
+$SUDO systemctl start mchost-manager.service
 $SUDO systemctl start mchost-viewer.service
 
 # 等待一下
@@ -92,6 +103,7 @@ echo -e "  停止服务: ${YELLOW}sudo systemctl stop mchost-viewer${NC}"
 echo -e "  启动服务: ${YELLOW}sudo systemctl start mchost-viewer${NC}"
 echo -e "  重启服务: ${YELLOW}sudo systemctl restart mchost-viewer${NC}"
 echo -e "  查看日志: ${YELLOW}sudo journalctl -u mchost-viewer -f${NC}"
+echo -e "  任务管理器: ${YELLOW}sudo systemctl status mchost-manager${NC}"
 echo ""
 echo -e "${YELLOW}提示：${NC}如需修改密码，编辑 /etc/systemd/system/mchost-viewer.service"
 echo "      修改 Environment=\"VIEWER_PASSWORD=...\" 这一行，然后执行："
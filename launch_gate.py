@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+MCHost 浏览器启动并发限制
+所有任务（无论是独立进程还是 supervisor 模式下的同一进程）共用 N 个启动槽位，
+启动浏览器并完成首次打开页面期间占用一个槽位，避免重启后所有任务同时启动 Chromium
+
+槽位是程序目录下 .launch_slots/slot.<i>.lock 上的 flock 锁：进程退出（包括崩溃）时自动释放
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 默认启动限制（tasks_config 顶层 startup 字段逐项覆盖）
+DEFAULT_STARTUP = {
+    # 同时启动浏览器的最大数量（0 表示不限制）
+    'max_concurrent_launches': 2,
+    # 任务管理器批量启动任务的间隔（秒）和随机抖动（秒）
+    'ramp_interval_seconds': 2,
+    'jitter_seconds': 1
+}
+
+
+def startup_options(config: dict = None) -> dict:
+    """合并启动限制配置"""
+    return {**DEFAULT_STARTUP, **(config or {})}
+
+
+class LaunchGate:
+    """跨进程的浏览器启动槽位"""
+
+    def __init__(self, lock_dir: Path, slots: int = 0, log=None):
+        """
+        初始化启动槽位
+
+        Args:
+            lock_dir: 锁文件目录
+            slots: 同时启动浏览器的最大数量（0 表示不限制）
+            log: 日志对象（默认使用模块logger）
+        """
+        self.lock_dir = Path(lock_dir)
+        self.slots = max(0, int(slots or 0))
+        self.logger = log or logger
+        # 当前持有的槽位文件描述符
+        self.fd = None
+
+    def _try_acquire(self) -> bool:
+        for i in range(self.slots):
+            fd = os.open(str(self.lock_dir / f'slot.{i}.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            self.fd = fd
+            return True
+        return False
+
+    async def acquire(self, poll_interval: float = 0.5):
+        """等待一个空闲槽位（已持有或不限制时立即返回）"""
+        if not self.slots or self.fd is not None:
+            return
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+
+        started = time.monotonic()
+        if self._try_acquire():
+            return
+        self.logger.info(f"⏳ 等待浏览器启动槽位（最多同时启动 {self.slots} 个）...")
+        while not self._try_acquire():
+            await asyncio.sleep(poll_interval)
+        self.logger.info(f"✓ 获得启动槽位，等待 {time.monotonic() - started:.1f} 秒")
+
+    def release(self):
+        """释放槽位（未持有时忽略）"""
+        if self.fd is None:
+            return
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+MCHost 实时事件推送
+一个后台线程统一检测任务状态、新日志和新截图的变化，广播给所有 SSE 订阅者。
+检测开销与打开的页面数量无关，推送量只与变化次数有关。
+
+任务列表由另一个线程向守护进程长轮询（status_wait），只在运行状态变化时更新；
+文件检测只针对运行中的任务（日志、截图和 status.json 只有运行中的任务会写入），
+任务停止后再检测一次，之后不再读取它的文件。守护进程未运行时每隔几秒读取一次任务存储。
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+
+from fileutil import read_lines_after
+from screenshots import ScreenshotManifest
+
+logger = logging.getLogger(__name__)
+
+
+class EventHub:
+    """任务变化检测与事件广播"""
+
+    def __init__(self, tasks_dir: Path, list_tasks, wait_status=None,
+                 interval: float = 1.0, offline_interval: float = 5.0):
+        """
+        初始化事件中心
+
+        Args:
+            tasks_dir: 任务数据目录
+            list_tasks: 返回所有任务状态列表的函数（如 ManagerClient.get_all_tasks_status）
+            wait_status: 等待状态变化的函数（如 ManagerClient.wait_status），
+                         返回 {'version', 'tasks'}，守护进程未运行时返回 None
+            interval: 运行中任务的文件检测间隔（秒）
+            offline_interval: 无法长轮询时读取任务列表的间隔（秒）
+        """
+        self.tasks_dir = Path(tasks_dir)
+        self.list_tasks = list_tasks
+        self.wait_status = wait_status
+        self.interval = interval
+        self.offline_interval = offline_interval
+
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.status_thread = None
+
+        # 最新的任务列表 {task_id: 状态条目}（由状态线程更新）
+        self.tasks = {}
+
+        # 上一次检测时的状态条目 {task_id: 状态条目}（已停止且未变化的任务不再检测）
+        self.checked_tasks = {}
+        # 上一次检测到的状态 {task_id: {...}}
+        self.status_snapshot = {}
+        # 日志读取偏移 {task_id: offset}
+        self.log_offsets = {}
+        # 截图索引大小 {task_id: size}
+        self.manifest_sizes = {}
+        # status.json 修改时间 {task_id: mtime}
+        self.status_mtimes = {}
+
+    # ==================== 订阅 ====================
+
+    def subscribe(self, task_id: str = None) -> queue.Queue:
+        """
+        订阅事件
+
+        Args:
+            task_id: 只接收该任务的事件（None 表示所有任务）
+        """
+        q = queue.Queue(maxsize=1000)
+        q.task_filter = task_id
+        with self.lock:
+            self.subscribers.add(q)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._watch, name='event-hub', daemon=True)
+                self.thread.start()
+            if self.status_thread is None or not self.status_thread.is_alive():
+                self.status_thread = threading.Thread(target=self._watch_status, name='event-hub-status', daemon=True)
+                self.status_thread.start()
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self.lock:
+            self.subscribers.discard(q)
+
+    def publish(self, event: str, data: dict):
+        """广播事件给订阅者（订阅者队列满时丢弃，避免慢连接拖住检测线程）"""
+        message = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for q in subscribers:
+            if q.task_filter and q.task_filter != data.get('task_id'):
+                continue
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                pass
+
+    def stream(self, task_id: str = None, heartbeat: float = 15.0):
+        """SSE 响应生成器"""
+        q = self.subscribe(task_id)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    yield q.get(timeout=heartbeat)
+                except queue.Empty:
+                    # 心跳，保持连接并及时发现断开的客户端
+                    yield ': keepalive\n\n'
+        finally:
+            self.unsubscribe(q)
+
+    # ==================== 变化检测 ====================
+
+    def _watch(self):
+        """后台检测线程：没有订阅者时自动退出"""
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    # 下次有订阅者时重新建立基线，避免推送停止期间积累的旧日志
+                    self.thread = None
+                    self.checked_tasks.clear()
+                    self.status_snapshot.clear()
+                    self.log_offsets.clear()
+                    self.manifest_sizes.clear()
+                    self.status_mtimes.clear()
+                    return
+            try:
+                self.check_once()
+            except Exception as e:
+                logger.error(f"检测任务变化失败: {e}")
+            time.sleep(self.interval)
+
+    def _watch_status(self):
+        """任务列表线程：长轮询守护进程的状态变化；守护进程未运行时定期读取任务列表"""
+        version = None
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.status_thread = None
+                    return
+            reply = None
+            try:
+                if self.wait_status:
+                    reply = self.wait_status(version)
+                if reply is not None:
+                    version = reply['version']
+                    self.set_tasks(reply['tasks'])
+                    continue
+                version = None
+                self.set_tasks(self.list_tasks())
+            except Exception as e:
+                logger.error(f"获取任务列表失败: {e}")
+            time.sleep(self.offline_interval)
+
+    def set_tasks(self, tasks: list):
+        """更新任务列表（下一次检测时生效）"""
+        with self.lock:
+            self.tasks = {task['task_id']: task for task in tasks}
+
+    def check_once(self):
+        """检测一次任务变化并发布事件（只读取运行中、状态刚变化或首次检测的任务的文件）"""
+        with self.lock:
+            tasks = self.tasks
+
+        for task_id in list(self.checked_tasks):
+            if task_id not in tasks:
+                self._forget(task_id)
+
+        for task_id, task in tasks.items():
+            if not task.get('running') and self.checked_tasks.get(task_id) == task:
+                continue
+            self.checked_tasks[task_id] = task
+            task_dir = self.tasks_dir / task_id
+            self._check_status(task_id, task, task_dir)
+            self._check_log(task_id, task_dir / 'task.log')
+            self._check_screenshots(task_id, task_dir / 'screenshots')
+
+    def _forget(self, task_id):
+        """删除已移除任务的检测状态"""
+        for state in (self.checked_tasks, self.status_snapshot, self.log_offsets,
+                      self.manifest_sizes, self.status_mtimes):
+            state.pop(task_id, None)
+
+    def _check_status(self, task_id, task, task_dir):
+        status = {
+            'task_id': task_id,
+            'running': task.get('running'),
+            'enabled': task.get('enabled'),
+            'last_run': task.get('last_run')
+        }
+
+        # 续期脚本写入的运行状态
+        status_file = task_dir / 'status.json'
+        try:
+            mtime = status_file.stat().st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self.status_mtimes.get(task_id):
+            self.status_mtimes[task_id] = mtime
+            try:
+                with open(status_file, 'r', encoding='utf-8') as f:
+                    runtime = json.load(f)
+                status['runtime'] = runtime
+            except Exception:
+                pass
+        elif task_id in self.status_snapshot:
+            status['runtime'] = self.status_snapshot[task_id].get('runtime')
+
+        if status != self.status_snapshot.get(task_id):
+            self.status_snapshot[task_id] = status
+            self.publish('status', status)
+
+    def _check_log(self, task_id, log_file):
+        try:
+            size = log_file.stat().st_size
+        except FileNotFoundError:
+            # 文件尚未创建：之后出现的内容都是新增的
+            size = 0
+
+        offset = self.log_offsets.get(task_id)
+        if offset is None or size < offset:
+            # 首次检测或日志被截断：从当前末尾开始
+            self.log_offsets[task_id] = size
+            return
+        if size == offset:
+            return
+
+        lines, new_offset = read_lines_after(log_file, offset)
+        if lines:
+            self.log_offsets[task_id] = new_offset
+            self.publish('log', {'task_id': task_id, 'start': offset, 'offset': new_offset, 'lines': lines})
+
+    def _check_screenshots(self, task_id, screenshots_dir):
+        manifest_file = screenshots_dir / 'manifest.jsonl'
+        try:
+            size = manifest_file.stat().st_size
+        except FileNotFoundError:
+            size = 0
+
+        previous = self.manifest_sizes.get(task_id)
+        self.manifest_sizes[task_id] = size
+        if previous is None or size == previous:
+            return
+
+        screenshots = ScreenshotManifest(screenshots_dir, read_only=True).recent(5)
+        self.publish('screenshot', {
+            'task_id': task_id,
+            'screenshots': [
+                {
+                    'name': record['name'],
+                    'time': record['ts'][:19].replace('T', ' '),
+                    'outcome': record.get('outcome')
+                }
+                for record in screenshots
+            ]
+        })
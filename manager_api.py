@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+MCHost 管理器控制 API
+守护进程（task_manager.py --daemon）在 Unix domain socket 上提供状态查询和任务控制，
+Web 界面和命令行作为客户端调用，不再各自持有一份 TaskManager
+
+协议：客户端连接后发送一行 JSON（如 {"command": "stop", "task_id": "server1"}），
+服务端回复一行 JSON（{"ok": true, ...}）并关闭连接。
+
+命令：
+    status   [task_id]                        任务状态（读取守护进程内存中的缓存）
+    status_wait  [since] [timeout]            等待状态变化后返回所有任务状态和新版本（长轮询，Web 界面事件推送使用）
+    start    task_id                          启动任务
+    stop     task_id                          停止任务（保持停止，不会被自动拉起）
+    restart  task_id                          重启任务
+    trigger  task_id action [delay_minutes]   触发任务操作（screenshot/renew_now/renew_delayed）
+    reload                                    立即检查配置变化并协调任务
+    scheduler                                 续期调度统计（队列深度、延迟、槽位占用率）
+    metrics                                   运行指标（重启次数、进程资源占用，Web 界面 /metrics 使用）
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from pathlib import Path
+from typing import Optional
+
+from task_store import EDITABLE_KEYS, TaskStore, default_db_path, new_task_config
+
+logger = logging.getLogger(__name__)
+
+# 控制 API 的 socket 文件名（位于程序目录）
+MANAGER_SOCKET_NAME = 'manager.sock'
+
+# 需要任务ID的命令
+TASK_COMMANDS = ('start', 'stop', 'restart', 'trigger')
+
+# status_wait 单次最长等待时间（秒）
+STATUS_WAIT_MAX = 60
+
+
+def status_entry(task_id: str, task_config: dict, running: bool = False, pid: int = None) -> dict:
+    """任务状态条目（守护进程和客户端返回同样的字段）"""
+    return {
+        'task_id': task_id,
+        'name': task_config.get('name'),
+        'enabled': task_config.get('enabled', True),
+        'running': running,
+        'pid': pid,
+        'mchost_url': task_config.get('mchost_url'),
+        'renew_interval_minutes': task_config.get('renew_interval_minutes'),
+        'manual_mode': task_config.get('manual_mode', False),
+        'created_at': task_config.get('created_at'),
+        'last_run': task_config.get('last_run')
+    }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            line = self.rfile.readline()
+            request = json.loads(line.decode('utf-8'))
+            if not isinstance(request, dict) or 'command' not in request:
+                raise ValueError('缺少 command 字段')
+            reply = self.server.api.dispatch(request)
+        except Exception as e:
+            logger.error(f"控制 API 请求处理失败: {e}")
+            reply = {'ok': False, 'error': str(e)}
+        try:
+            self.wfile.write(json.dumps(reply, ensure_ascii=False).encode('utf-8') + b'\n')
+        except OSError:
+            pass
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class ManagerAPIServer:
+    """守护进程端控制 API（每个连接一个线程）"""
+
+    def __init__(self, manager, socket_path: Path):
+        """
+        初始化控制 API
+
+        Args:
+            manager: TaskManager 实例
+            socket_path: Unix socket 路径
+        """
+        self.manager = manager
+        self.socket_path = Path(socket_path)
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """开始监听（后台线程）"""
+        # 清理上次异常退出遗留的 socket 文件
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        self.server = _Server(str(self.socket_path), _Handler)
+        self.server.api = self
+        os.chmod(self.socket_path, 0o600)
+        self.thread = threading.Thread(target=self.server.serve_forever, name='manager-api', daemon=True)
+        self.thread.start()
+        logger.info(f"✓ 控制 API 已就绪: {self.socket_path}")
+
+    def close(self):
+        """停止监听并删除 socket 文件"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def dispatch(self, request: dict) -> dict:
+        """执行一条命令"""
+        command = request['command']
+        task_id = request.get('task_id')
+        manager = self.manager
+
+        # 状态查询只读缓存，不等待其他命令
+        if command == 'status':
+            if task_id:
+                return {'ok': True, 'task': manager.cached_status(task_id)}
+            return {'ok': True, 'tasks': manager.cached_status()}
+
+        # 长轮询：状态变化（或超时）时才返回，同样不持有管理器锁
+        if command == 'status_wait':
+            timeout = min(float(request.get('timeout', 25)), STATUS_WAIT_MAX)
+            version = manager.wait_status(request.get('since'), timeout)
+            return {'ok': True, 'version': version, 'tasks': manager.cached_status()}
+
+        # 调度统计由监管器事件循环提供，同样不等待其他命令
+        if command == 'scheduler':
+            metrics = manager.scheduler_metrics()
+            if 'error' in metrics:
+                return {'ok': False, 'error': metrics['error']}
+            return {'ok': True, 'scheduler': metrics}
+
+        if command == 'metrics':
+            return {'ok': True, 'metrics': manager.process_metrics()}
+
+        if command in TASK_COMMANDS and not task_id:
+            raise ValueError(f'{command} 需要 task_id')
+
+        with manager.lock:
+            if command == 'start':
+                ok = manager.start_task(task_id)
+            elif command == 'stop':
+                ok = manager.stop_task(task_id, hold=True)
+            elif command == 'restart':
+                ok = manager.restart_task(task_id)
+            elif command == 'trigger':
+                kwargs = {}
+                if 'delay_minutes' in request:
+                    kwargs['delay_minutes'] = request['delay_minutes']
+                ok = manager.trigger_action(task_id, request.get('action'), **kwargs)
+            elif command == 'reload':
+                return {'ok': True, 'reconciled': manager.check_config_changes()}
+            else:
+                raise ValueError(f'未知命令: {command}')
+
+            manager.refresh_status([task_id])
+        return {'ok': ok}
+
+
+def call(socket_path: Path, request: dict, timeout: float = 15.0) -> Optional[dict]:
+    """
+    调用控制 API（同步客户端）
+
+    Args:
+        socket_path: 守护进程的 Unix socket 路径
+        request: 请求内容，必须包含 command
+        timeout: 连接和读写超时（秒），停止/重启任务最多需要数秒
+
+    Returns:
+        守护进程的回复；守护进程未运行时返回 None
+    """
+    socket_path = Path(socket_path)
+    if not socket_path.exists():
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(socket_path))
+            sock.sendall(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+            reply = sock.makefile('r', encoding='utf-8').readline()
+        return json.loads(reply) if reply else None
+    except (OSError, ValueError) as e:
+        logger.debug(f"控制 API 不可用: {socket_path} - {e}")
+        return None
+
+
+class ManagerClient:
+    """
+    守护进程客户端（供 Web 界面使用，接口与 TaskManager 一致）
+
+    运行状态和启动/停止/触发都交给守护进程；任务增删改直接写入共享的任务存储，
+    然后通知守护进程立即协调
+    """
+
+    def __init__(self, base_dir: Path = None, socket_path: Path = None):
+        self.base_dir = Path(base_dir) if base_dir else Path(__file__).parent
+        self.socket_path = Path(socket_path) if socket_path else self.base_dir / MANAGER_SOCKET_NAME
+        self.tasks_dir = self.base_dir / 'tasks'
+        self.tasks_dir.mkdir(exist_ok=True)
+        config_path = self.base_dir / 'tasks_config.json'
+        self.store = TaskStore(default_db_path(config_path), json_path=config_path)
+        # 最近一次调用时守护进程是否在线
+        self.online = False
+
+    def _call(self, command: str, **fields) -> Optional[dict]:
+        reply = call(self.socket_path, {'command': command, **fields})
+        self.online = reply is not None
+        if reply is None:
+            logger.warning(f"任务管理器守护进程未运行，无法执行: {command}")
+        return reply
+
+    def get_task_dir(self, task_id: str) -> Path:
+        """获取任务目录"""
+        task_dir = self.tasks_dir / task_id
+        task_dir.mkdir(exist_ok=True)
+        return task_dir
+
+    def get_task_config(self, task_id: str) -> Optional[dict]:
+        """获取任务配置"""
+        return self.store.get_task(task_id)
+
+    # ==================== 状态 ====================
+
+    def get_task_status(self, task_id: str) -> dict:
+        """获取任务状态"""
+        reply = call(self.socket_path, {'command': 'status', 'task_id': task_id})
+        self.online = reply is not None
+        if reply and 'error' not in reply.get('task', {}):
+            return reply['task']
+
+        # 守护进程未运行，或任务刚添加尚未协调
+        task_config = self.get_task_config(task_id)
+        if not task_config:
+            return {'error': '任务不存在'}
+        return status_entry(task_id, task_config)
+
+    def get_all_tasks_status(self) -> list:
+        """获取所有任务状态"""
+        reply = call(self.socket_path, {'command': 'status'})
+        self.online = reply is not None
+        if reply:
+            return reply['tasks']
+        # 守护进程未运行：根据配置生成状态，所有任务均视为未运行
+        return [
+            status_entry(task_id, task_config)
+            for task_id, task_config in self.store.list_tasks().items()
+        ]
+
+    def wait_status(self, since: int = None, timeout: float = 25.0) -> Optional[dict]:
+        """
+        等待守护进程的状态变化
+
+        Args:
+            since: 上一次返回的版本（None 表示立即返回当前状态）
+            timeout: 最长等待秒数
+
+        Returns:
+            {'version': 版本, 'tasks': 所有任务状态}；守护进程未运行时返回 None
+        """
+        reply = call(self.socket_path, {'command': 'status_wait', 'since': since, 'timeout': timeout},
+                     timeout=timeout + 5)
+        self.online = reply is not None
+        return reply if reply and reply.get('ok') else None
+
+    def get_metrics(self) -> Optional[dict]:
+        """守护进程的运行指标（重启次数、进程资源占用）；守护进程未运行时返回 None"""
+        reply = call(self.socket_path, {'command': 'metrics'})
+        self.online = reply is not None
+        return reply.get('metrics') if reply and reply.get('ok') else None
+
+    # ==================== 控制 ====================
+
+    def start_task(self, task_id: str) -> bool:
+        reply = self._call('start', task_id=task_id)
+        return bool(reply and reply.get('ok'))
+
+    def stop_task(self, task_id: str) -> bool:
+        reply = self._call('stop', task_id=task_id)
+        return bool(reply and reply.get('ok'))
+
+    def restart_task(self, task_id: str) -> bool:
+        reply = self._call('restart', task_id=task_id)
+        return bool(reply and reply.get('ok'))
+
+    def trigger_action(self, task_id: str, action: str, **kwargs) -> bool:
+        reply = self._call('trigger', task_id=task_id, action=action, **kwargs)
+        return bool(reply and reply.get('ok'))
+
+    def reload(self) -> bool:
+        """通知守护进程立即检查配置变化（守护进程未运行时忽略）"""
+        reply = call(self.socket_path, {'command': 'reload'})
+        self.online = reply is not None
+        return bool(reply and reply.get('ok'))
+
+    # ==================== 任务增删改 ====================
+
+    def add_task(self, task_id: str, name: str, mchost_url: str,
+                 renew_interval_minutes: int = 15) -> bool:
+        """添加任务（守护进程协调后自动启动）"""
+        if not self.store.add_task(task_id, new_task_config(name, mchost_url, renew_interval_minutes)):
+            logger.error(f"任务ID已存在: {task_id}")
+            return False
+        (self.get_task_dir(task_id) / 'screenshots').mkdir(exist_ok=True)
+        self.reload()
+        return True
+
+    def update_task(self, task_id: str, **kwargs) -> bool:
+        """更新任务配置（生效配置变化的任务由守护进程重启）"""
+        fields = {key: value for key, value in kwargs.items() if key in EDITABLE_KEYS}
+        if self.store.update_task(task_id, **fields) is None:
+            logger.error(f"任务不存在: {task_id}")
+            return False
+        self.reload()
+        return True
+
+    def modify_task(self, task_id: str, func) -> Optional[dict]:
+        """原子地读取并修改任务配置（见 TaskStore.modify_task）"""
+        task_config = self.store.modify_task(task_id, func)
+        if task_config is not None:
+            self.reload()
+        return task_config
+
+    def delete_task(self, task_id: str) -> bool:
+        """删除任务（守护进程协调时停止）"""
+        if not self.store.delete_task(task_id):
+            logger.error(f"任务不存在: {task_id}")
+            return False
+        self.reload()
+        return True
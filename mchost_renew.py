@@ -11,22 +11,127 @@ import logging
 import sys
 import os
 import argparse
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 
+import cookie_check
+import http_renew
+import screenshots
+from browser_pool import launch_chromium
+from control_channel import ControlServer
+from fileutil import merge_json_file, write_json_file
+from launch_gate import LaunchGate, startup_options
+from metrics import TaskMetrics
+from spans import SpanRecorder
+from resource_policy import ResourcePolicy
+from scheduler import RenewScheduler
+from session_expiry import parse_countdown_text, parse_session_expiry
+from task_store import TaskStore, default_db_path
+
+
+# 浏览器上下文配置（反检测）
+CONTEXT_OPTIONS = {
+    'viewport': {'width': 1920, 'height': 1080},
+    'user_agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
+    'locale': 'zh-CN',
+    'timezone_id': 'Asia/Shanghai'
+}
+
+# 增强的stealth脚本（反Cloudflare检测）
+STEALTH_SCRIPT = """
+    // 隐藏webdriver标志
+    Object.defineProperty(navigator, 'webdriver', {
+        get: () => undefined
+    });
+
+    // 模拟真实浏览器的plugins
+    Object.defineProperty(navigator, 'plugins', {
+        get: () => {
+            const plugins = [
+                { name: 'Chrome PDF Plugin', filename: 'internal-pdf-viewer' },
+                { name: 'Chrome PDF Viewer', filename: 'mhjfbmdgcfjbbpaeojofohoefgiehjai' },
+                { name: 'Native Client', filename: 'internal-nacl-plugin' }
+            ];
+            return plugins;
+        }
+    });
+
+    // 模拟真实的语言
+    Object.defineProperty(navigator, 'languages', {
+        get: () => ['zh-CN', 'zh', 'en-US', 'en']
+    });
+
+    // 添加chrome对象
+    if (!window.chrome) {
+        window.chrome = {
+            runtime: {},
+            loadTimes: function() {},
+            csi: function() {},
+            app: {}
+        };
+    }
+
+    // 隐藏自动化控制
+    const originalQuery = window.document.querySelector;
+    window.document.querySelector = function(selector) {
+        if (selector === '[id^="credential_picker_"]') {
+            return null;
+        }
+        return originalQuery.apply(this, arguments);
+    };
+
+    // 添加权限API
+    const originalQuery2 = window.navigator.permissions.query;
+    window.navigator.permissions.query = (parameters) => (
+        parameters.name === 'notifications' ?
+            Promise.resolve({ state: Notification.permission }) :
+            originalQuery2(parameters)
+    );
+
+    // 伪造canvas指纹
+    const getImageData = CanvasRenderingContext2D.prototype.getImageData;
+    CanvasRenderingContext2D.prototype.getImageData = function() {
+        const imageData = getImageData.apply(this, arguments);
+        // 添加微小噪声
+        for (let i = 0; i < imageData.data.length; i += 4) {
+            imageData.data[i] += Math.floor(Math.random() * 3) - 1;
+        }
+        return imageData;
+    };
+"""
+
+
+# 会话持久化方式：
+#   cookies             只保存/恢复 cookies.json（默认）
+#   storage_state       每次续期成功后保存 Playwright storage_state（cookies + localStorage），启动时恢复
+#   persistent_context  每个任务独立的浏览器 profile 目录（完整会话和磁盘 HTTP 缓存）
+SESSION_PERSISTENCE_MODES = ('cookies', 'storage_state', 'persistent_context')
+
 
 class MCHostRenewer:
-    def __init__(self, task_id=None, config_path=None):
+    def __init__(self, task_id=None, config_path=None, browser_pool=None, scheduler=None, base_dir=None):
         """
         初始化配置
 
         Args:
             task_id: 任务ID（多任务模式）
             config_path: 配置文件路径（单任务模式，兼容旧版本）
+            browser_pool: 共享浏览器池（共享模式，见 browser_pool.py）
+            scheduler: 共享续期调度器（supervisor 模式，见 scheduler.py）；
+                       默认使用只有一个槽位的独立调度器
+            base_dir: 程序数据目录（任务存储、tasks/ 等），默认为脚本所在目录；
+                      基准测试（bench/run_bench.py）使用临时目录
         """
-        self.base_dir = Path(__file__).parent
+        self.base_dir = Path(base_dir) if base_dir else Path(__file__).parent
         self.task_id = task_id
+        self.browser_pool = browser_pool
+        self.scheduler = scheduler or RenewScheduler(workers=1)
+        # 调度器中的任务标识（单任务模式没有任务ID）
+        self.schedule_key = task_id or 'default'
+        # 等待控制命令的读取任务（续期循环中创建）
+        self.command_reader = None
 
         # 多任务模式
         if task_id:
@@ -36,6 +141,7 @@ class MCHostRenewer:
             self.screenshots_dir.mkdir(exist_ok=True)
             self.cookies_file = self.task_dir / 'cookies.json'
             self.log_file = self.task_dir / 'task.log'
+            self.state_dir = self.task_dir
         # 单任务模式（向后兼容）
         else:
             config_path = config_path or (self.base_dir / 'config.json')
@@ -43,6 +149,7 @@ class MCHostRenewer:
             self.screenshots_dir.mkdir(exist_ok=True)
             self.cookies_file = self.base_dir / 'cookies.json'
             self.log_file = Path('/var/log/mchost_renew.log')
+            self.state_dir = self.base_dir
 
         # 配置日志（必须在加载配置之前）
         self._setup_logging()
@@ -53,20 +160,75 @@ class MCHostRenewer:
         else:
             self.config = self._load_config(config_path)
 
+        # 续期结果记录（每次一行JSON）和运行状态（供Web界面读取）
+        self.history_file = self.state_dir / 'renew_history.jsonl'
+        self.status_file = self.state_dir / 'status.json'
+        # 累计指标（续期周期耗时、按原因统计的结果、截图字节数），Web 界面 /metrics 读取
+        self.metrics = TaskMetrics(self.state_dir / 'metrics.json')
+        # 各阶段耗时（每个周期一行写入 spans.jsonl，python spans.py 查看分布）
+        self.timing = SpanRecorder(self.state_dir / 'spans.jsonl', enabled=self.config.get('record_spans', True))
+        # HTTP快速通道学习到的Renew接口
+        self.endpoint_file = self.state_dir / 'renew_endpoint.json'
+        # 崩溃重启：任务管理器/监管器检测到崩溃的时间（会话重新确认可用时记录恢复用时）
+        status = self._read_status()
+        self.recovering_since = status.get('recovering_since')
+        # 上次退出时是否被标记为需要更新凭据（会话重新确认可用时清除）
+        self.needs_credentials = bool(status.get('needs_credentials'))
+        # 续期循环退出原因：error（运行时错误，监管器会立即重启）/ session_invalid 等
+        self.exit_reason = None
+        # 调度状态（上次成功时间、下次续期时间），重启后据此继续而不是立即续期
+        self.schedule_file = self.state_dir / 'schedule_state.json'
+
+        # 会话持久化（见 SESSION_PERSISTENCE_MODES）
+        self.session_persistence = self.config.get('session_persistence', 'cookies')
+        if self.session_persistence not in SESSION_PERSISTENCE_MODES:
+            self.logger.warning(f"未知的会话持久化方式: {self.session_persistence}，使用 cookies")
+            self.session_persistence = 'cookies'
+        self.storage_state_file = self.state_dir / 'storage_state.json'
+        self.profile_dir = self.state_dir / 'browser_profile'
+        # 本次启动的浏览器是否已从 storage_state / 持久化 profile 恢复会话
+        self.session_restored = False
+        self.last_renew_result = None
+
+        # 截图索引（见 screenshots.ScreenshotManifest）
+        self.manifest = screenshots.ScreenshotManifest(self.screenshots_dir)
+
+        # 请求拦截策略（见 resource_policy.py）
+        self.resource_policy = ResourcePolicy(self.config.get('resource_blocking'))
+
+        # 浏览器启动槽位（所有任务共用，限制同时启动的浏览器数量）
+        self.launch_gate = LaunchGate(
+            self.base_dir / '.launch_slots',
+            startup_options(self.config.get('startup'))['max_concurrent_launches'] if task_id else 0,
+            self.logger
+        )
+
         self.browser = None
         self.context = None
         self.page = None
+        self.playwright = None
+        # 当前context是否来自共享浏览器池
+        self.pooled = False
 
-        # 触发文件（用于外部控制）
+        # 触发文件（兼容旧版外部控制，仅在任务启动前写入时生效）
+        # 控制通道（推送式外部控制，见 control_channel.py）
         if task_id:
             self.trigger_file = self.task_dir / 'trigger.json'
+            self.control = ControlServer(self.task_dir / 'control.sock', self.logger)
         else:
             self.trigger_file = self.base_dir / 'trigger.json'
+            self.control = ControlServer(self.base_dir / 'control.sock', self.logger)
 
     def _setup_logging(self):
         """配置日志"""
+        # 多任务模式使用独立logger，同一进程内运行多个任务时互不干扰
+        if self.task_id:
+            logger = logging.getLogger(f'mchost.{self.task_id}')
+            logger.propagate = False
+        else:
+            logger = logging.getLogger()
+
         # 清除现有handlers
-        logger = logging.getLogger()
         logger.handlers.clear()
 
         # 设置日志级别
@@ -91,21 +253,36 @@ class MCHostRenewer:
         self.logger = logger
 
     def _load_task_config(self, task_id):
-        """从多任务配置文件加载任务配置"""
+        """从任务存储加载任务配置（只读取该任务一行和全局设置）"""
         try:
             tasks_config_path = self.base_dir / 'tasks_config.json'
-            if not tasks_config_path.exists():
-                self.logger.error(f"多任务配置文件不存在: {tasks_config_path}")
+            db_path = default_db_path(tasks_config_path)
+            if not db_path.exists() and not tasks_config_path.exists():
+                self.logger.error(f"多任务配置不存在: {db_path}")
                 sys.exit(1)
 
-            with open(tasks_config_path, 'r', encoding='utf-8') as f:
-                tasks_config = json.load(f)
+            store = TaskStore(db_path, json_path=tasks_config_path)
+            try:
+                task_config = store.get_task(task_id)
+                settings = store.get_settings()
+            finally:
+                store.close()
 
-            task_config = tasks_config.get('tasks', {}).get(task_id)
             if not task_config:
                 self.logger.error(f"任务不存在: {task_id}")
                 sys.exit(1)
 
+            # 全局请求拦截/截图配置，任务内的同名字段逐项覆盖
+            for key in ('resource_blocking', 'screenshot'):
+                if key in settings:
+                    task_config[key] = {**settings[key], **task_config.get(key, {})}
+            # 全局启动限制（见 launch_gate.py）
+            task_config['startup'] = settings.get('startup', {})
+            # 顶层默认值（任务内设置时以任务为准）
+            for key in ('session_persistence',):
+                if key in settings:
+                    task_config.setdefault(key, settings[key])
+
             self.logger.info(f"✓ 加载任务配置: {task_id} ({task_config.get('name')})")
             return task_config
 
@@ -139,6 +316,30 @@ class MCHostRenewer:
 
     async def init_browser(self):
         """初始化浏览器"""
+        self.session_restored = False
+
+        # 共享模式：从浏览器池中获取独立的context（手动模式/连接现有Chrome除外）
+        if (self.browser_pool
+                and not self.config.get('manual_mode', False)
+                and not self.config.get('connect_to_existing_chrome', False)):
+            # 共享浏览器上不能使用持久化 profile，退化为 storage_state
+            context_options = dict(CONTEXT_OPTIONS)
+            state_file = self._restorable_state_file()
+            if state_file:
+                context_options['storage_state'] = str(state_file)
+            with self.timing.span('init_browser.pool_context'):
+                slot, self.context = await self.browser_pool.new_context(**context_options)
+            self.session_restored = state_file is not None
+            self.pooled = True
+            with self.timing.span('init_browser.setup_page'):
+                await self.context.add_init_script(STEALTH_SCRIPT)
+                await self.resource_policy.attach(self.context)
+                self.page = await self.context.new_page()
+            self.page.set_default_timeout(60000)
+            self.logger.info(f"✓ 浏览器初始化成功（共享浏览器 #{slot}）")
+            return
+
+        self.pooled = False
         self.playwright = await async_playwright().start()
 
         # 检查是否连接到已运行的Chrome（推荐用于Mac）
@@ -236,115 +437,72 @@ class MCHostRenewer:
         use_user_profile = self.config.get('use_user_profile', False)
         user_data_dir = self.config.get('chrome_user_data_dir', None)
 
-        # 尝试使用真正的Chrome浏览器
-        try:
-            launch_args = [
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-blink-features=AutomationControlled'
-            ]
-
-            # 如果使用用户profile
-            if use_user_profile and user_data_dir:
-                launch_args.append(f'--user-data-dir={user_data_dir}')
-                self.logger.info(f"✓ 使用Chrome浏览器（用户profile: {user_data_dir}）")
-                self.logger.warning("⚠️  请确保Chrome已关闭，否则会冲突")
-            else:
-                self.logger.info("✓ 使用Chrome浏览器（临时profile）")
-
-            self.browser = await self.playwright.chromium.launch(
+        launch_args = [
+            '--no-sandbox',
+            '--disable-setuid-sandbox',
+            '--disable-dev-shm-usage',
+            '--disable-blink-features=AutomationControlled'
+        ]
+
+        # 如果使用用户profile
+        if use_user_profile and user_data_dir:
+            launch_args.append(f'--user-data-dir={user_data_dir}')
+            self.logger.info(f"✓ 使用Chrome浏览器（用户profile: {user_data_dir}）")
+            self.logger.warning("⚠️  请确保Chrome已关闭，否则会冲突")
+        else:
+            self.logger.info("✓ 使用临时profile启动浏览器")
+
+        # 持久化 profile：浏览器和 context 一起启动，会话和 HTTP 缓存保存在任务目录
+        if self.session_persistence == 'persistent_context' and not (use_user_profile and user_data_dir):
+            self.profile_dir.mkdir(exist_ok=True)
+            self.session_restored = any(self.profile_dir.iterdir())
+            with self.timing.span('init_browser.launch'):
+                self.context = await launch_chromium(
+                    self.playwright,
+                    self.base_dir / '.chrome_channel.json',
+                    log=self.logger,
+                    user_data_dir=self.profile_dir,
+                    headless=headless,
+                    env=browser_env,
+                    args=launch_args,
+                    **CONTEXT_OPTIONS
+                )
+            with self.timing.span('init_browser.setup_page'):
+                await self.context.add_init_script(STEALTH_SCRIPT)
+                await self.resource_policy.attach(self.context)
+                self.page = self.context.pages[0] if self.context.pages else await self.context.new_page()
+            self.page.set_default_timeout(60000)
+            self.logger.info(f"✓ 浏览器初始化成功（持久化 profile: {self.profile_dir}）")
+            return
+
+        # 优先使用真正的Chrome浏览器，不可用时回退到Chromium（不可用的结果所有任务共用缓存）
+        with self.timing.span('init_browser.launch'):
+            self.browser = await launch_chromium(
+                self.playwright,
+                self.base_dir / '.chrome_channel.json',
+                log=self.logger,
                 headless=headless,
-                channel="chrome",
                 env=browser_env,
                 args=launch_args
             )
-        except Exception as e:
-            # 如果Chrome不可用，使用Chromium
-            self.logger.warning(f"Chrome不可用，回退到Chromium: {e}")
-            self.browser = await self.playwright.chromium.launch(
-                headless=headless,
-                env=browser_env,
-                args=[
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-blink-features=AutomationControlled'
-                ]
-            )
 
-        # 创建上下文，添加反检测配置
-        self.context = await self.browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            user_agent='Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
-            locale='zh-CN',
-            timezone_id='Asia/Shanghai'
-        )
+        # 创建上下文，添加反检测配置（storage_state 模式下恢复上次保存的会话）
+        context_options = dict(CONTEXT_OPTIONS)
+        state_file = self._restorable_state_file()
+        if state_file:
+            context_options['storage_state'] = str(state_file)
+        with self.timing.span('init_browser.new_context'):
+            self.context = await self.browser.new_context(**context_options)
+        self.session_restored = state_file is not None
+
+        with self.timing.span('init_browser.setup_page'):
+            # 添加增强的stealth脚本（反Cloudflare检测）
+            await self.context.add_init_script(STEALTH_SCRIPT)
+
+            # 拦截续期不需要的资源
+            await self.resource_policy.attach(self.context)
 
-        # 添加增强的stealth脚本（反Cloudflare检测）
-        await self.context.add_init_script("""
-            // 隐藏webdriver标志
-            Object.defineProperty(navigator, 'webdriver', {
-                get: () => undefined
-            });
-
-            // 模拟真实浏览器的plugins
-            Object.defineProperty(navigator, 'plugins', {
-                get: () => {
-                    const plugins = [
-                        { name: 'Chrome PDF Plugin', filename: 'internal-pdf-viewer' },
-                        { name: 'Chrome PDF Viewer', filename: 'mhjfbmdgcfjbbpaeojofohoefgiehjai' },
-                        { name: 'Native Client', filename: 'internal-nacl-plugin' }
-                    ];
-                    return plugins;
-                }
-            });
-
-            // 模拟真实的语言
-            Object.defineProperty(navigator, 'languages', {
-                get: () => ['zh-CN', 'zh', 'en-US', 'en']
-            });
-
-            // 添加chrome对象
-            if (!window.chrome) {
-                window.chrome = {
-                    runtime: {},
-                    loadTimes: function() {},
-                    csi: function() {},
-                    app: {}
-                };
-            }
-
-            // 隐藏自动化控制
-            const originalQuery = window.document.querySelector;
-            window.document.querySelector = function(selector) {
-                if (selector === '[id^="credential_picker_"]') {
-                    return null;
-                }
-                return originalQuery.apply(this, arguments);
-            };
-
-            // 添加权限API
-            const originalQuery2 = window.navigator.permissions.query;
-            window.navigator.permissions.query = (parameters) => (
-                parameters.name === 'notifications' ?
-                    Promise.resolve({ state: Notification.permission }) :
-                    originalQuery2(parameters)
-            );
-
-            // 伪造canvas指纹
-            const getImageData = CanvasRenderingContext2D.prototype.getImageData;
-            CanvasRenderingContext2D.prototype.getImageData = function() {
-                const imageData = getImageData.apply(this, arguments);
-                // 添加微小噪声
-                for (let i = 0; i < imageData.data.length; i += 4) {
-                    imageData.data[i] += Math.floor(Math.random() * 3) - 1;
-                }
-                return imageData;
-            };
-        """)
-
-        self.page = await self.context.new_page()
+            self.page = await self.context.new_page()
         self.page.set_default_timeout(60000)
 
         self.logger.info("✓ 浏览器初始化成功")
@@ -353,14 +511,45 @@ class MCHostRenewer:
         """保存cookies到文件"""
         try:
             cookies = await self.context.cookies()
-            with open(self.cookies_file, 'w', encoding='utf-8') as f:
-                json.dump(cookies, f, indent=2)
+            self._write_cookies(cookies)
             self.logger.info(f"✓ Cookies已保存到: {self.cookies_file}")
             return True
         except Exception as e:
             self.logger.error(f"保存cookies失败: {e}")
             return False
 
+    def _write_cookies(self, cookies):
+        """写入 cookies.json（任务唯一的凭据文件：先写临时文件再替换，避免崩溃或Web界面读取时看到半个文件）"""
+        write_json_file(self.cookies_file, cookies)
+
+    def _restorable_state_file(self):
+        """
+        可用于恢复会话的 storage_state 文件（非 cookies 模式且文件存在时）
+
+        persistent_context 模式在共享浏览器上退化为 storage_state
+        """
+        if self.session_persistence == 'cookies' or not self.storage_state_file.exists():
+            return None
+        return self.storage_state_file
+
+    def _cookies_newer_than_session(self):
+        """cookies.json 是否比保存的会话更新（通过Web界面上传了新cookies）"""
+        try:
+            return self.cookies_file.stat().st_mtime > self.storage_state_file.stat().st_mtime
+        except FileNotFoundError:
+            return self.cookies_file.exists()
+
+    async def persist_session(self):
+        """续期成功后保存完整会话（storage_state / persistent_context 模式，先写临时文件再替换）"""
+        if self.session_persistence == 'cookies' or not self.context:
+            return
+        try:
+            tmp_file = self.storage_state_file.with_suffix('.tmp')
+            await self.context.storage_state(path=str(tmp_file))
+            os.replace(tmp_file, self.storage_state_file)
+        except Exception as e:
+            self.logger.warning(f"保存会话状态失败: {e}")
+
     async def load_cookies(self):
         """从文件加载cookies"""
         try:
@@ -369,6 +558,13 @@ class MCHostRenewer:
                 self.logger.info("✓ 使用现有Chrome的cookies，跳过加载")
                 return True
 
+            # 已从 storage_state / 持久化 profile 恢复会话，且之后没有上传新的 cookies
+            if self.session_restored and not self._cookies_newer_than_session():
+                self.logger.info("✓ 已从保存的会话状态恢复（cookies、localStorage" +
+                                 ("、HTTP缓存）" if self.session_persistence == 'persistent_context'
+                                  and not self.pooled else "）"))
+                return True
+
             if not self.cookies_file.exists():
                 self.logger.info("未找到cookies文件，需要手动登录")
                 return False
@@ -383,7 +579,8 @@ class MCHostRenewer:
                     if isinstance(same_site, str):
                         cookie['sameSite'] = same_site.capitalize()
 
-            await self.context.add_cookies(cookies)
+            with self.timing.span('load_cookies'):
+                await self.context.add_cookies(cookies)
             self.logger.info("✓ Cookies已加载")
             return True
         except Exception as e:
@@ -393,12 +590,15 @@ class MCHostRenewer:
     async def check_login_status(self):
         """检查是否已登录（通过查找Renew按钮）"""
         try:
-            await self.page.goto(self.config['mchost_url'], wait_until='domcontentloaded', timeout=30000)
-            await asyncio.sleep(3)
+            with self.timing.span('check_login.goto'):
+                await self.page.goto(self.config['mchost_url'], wait_until='domcontentloaded', timeout=30000)
+            with self.timing.span('check_login.settle'):
+                await asyncio.sleep(3)
 
             # 查找Renew按钮
             try:
-                await self.page.wait_for_selector('#renewSessionBtn', timeout=5000, state='visible')
+                with self.timing.span('check_login.wait_selector'):
+                    await self.page.wait_for_selector('#renewSessionBtn', timeout=5000, state='visible')
                 self.logger.info("✓ 已登录状态确认")
                 return True
             except:
@@ -426,12 +626,14 @@ class MCHostRenewer:
             self.logger.info("=" * 60)
 
             # 打开登录页面
-            await self.page.goto(self.config['mchost_url'], wait_until='domcontentloaded', timeout=60000)
+            with self.timing.span('manual_login.goto'):
+                await self.page.goto(self.config['mchost_url'], wait_until='domcontentloaded', timeout=60000)
 
             # 等待用户手动登录，最多等待 5 分钟
             max_wait_time = 300  # 5分钟
             check_interval = 3   # 每3秒检查一次
             elapsed_time = 0
+            wait_started = time.perf_counter()
 
             while elapsed_time < max_wait_time:
                 await asyncio.sleep(check_interval)
@@ -440,15 +642,14 @@ class MCHostRenewer:
                 # 检查是否出现了 Renew 按钮（表示登录成功）
                 try:
                     await self.page.wait_for_selector('#renewSessionBtn', timeout=1000, state='visible')
+                    self.timing.record('manual_login.wait', wait_started)
                     self.logger.info("")
                     self.logger.info("=" * 60)
                     self.logger.info("✓ 检测到登录成功！")
                     self.logger.info("=" * 60)
 
                     # 保存登录成功截图
-                    screenshot_path = self.screenshots_dir / 'login_success.png'
-                    await self.page.screenshot(path=str(screenshot_path), full_page=True)
-                    self.logger.info(f"✓ 已保存登录成功截图到: {screenshot_path}")
+                    await self.take_screenshot(name='login_success')
 
                     # 保存 cookies
                     if await self.save_cookies():
@@ -463,121 +664,555 @@ class MCHostRenewer:
                     pass
 
             # 超时
+            self.timing.record('manual_login.wait', wait_started, ok=False)
             self.logger.error("")
             self.logger.error("=" * 60)
             self.logger.error("登录超时！")
             self.logger.error(f"已等待 {max_wait_time} 秒，但未检测到登录成功")
             self.logger.error("请重新运行脚本并在 5 分钟内完成登录")
             self.logger.error("=" * 60)
-            screenshot_path = self.screenshots_dir / 'login_timeout.png'
-            await self.page.screenshot(path=str(screenshot_path), full_page=True)
-            self.logger.info(f"已保存超时截图到: {screenshot_path}")
+            await self.take_screenshot(name='login_timeout')
             return False
 
         except Exception as e:
             self.logger.error(f"手动登录过程出错: {e}")
-            screenshot_path = self.screenshots_dir / 'error.png'
-            await self.page.screenshot(path=str(screenshot_path))
-            self.logger.info(f"已保存错误截图到: {screenshot_path}")
+            await self.take_screenshot(name='error')
             return False
 
-    async def take_screenshot(self, prefix='manual'):
-        """拍摄截图"""
+    async def take_screenshot(self, prefix='manual', name=None, outcome=None):
+        """
+        拍摄截图（格式/质量/尺寸见任务配置 screenshot 字段，编码、写盘和索引更新在线程池中完成）
+
+        Args:
+            prefix: 文件名前缀（文件名为 前缀_时间戳）
+            name: 固定文件名（不含扩展名），如 login_success
+            outcome: 记录到截图索引中的结果（如 ok / failed）
+        """
         try:
             self.logger.info("正在拍摄截图...")
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            screenshot_path = self.screenshots_dir / f'{prefix}_{timestamp}.png'
-            await self.page.screenshot(path=str(screenshot_path), full_page=True)
-            self.logger.info(f"✓ 已保存截图到: {screenshot_path}")
+            options = screenshots.screenshot_options(self.config.get('screenshot'))
+            stem = name or f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            screenshot_path = self.screenshots_dir / f'{stem}{screenshots.file_extension(options)}'
+
+            with self.timing.span('screenshot.capture'):
+                data = await self.page.screenshot(**screenshots.capture_kwargs(options))
+            with self.timing.span('screenshot.write'):
+                size = await asyncio.get_running_loop().run_in_executor(
+                    None, self._save_screenshot, data, screenshot_path, options, outcome
+                )
+            self.logger.info(f"✓ 已保存截图到: {screenshot_path} ({size / 1024:.1f} KB)")
             return str(screenshot_path)
         except Exception as e:
             self.logger.error(f"截图失败: {e}")
             return None
 
+    def _watch_renew_response(self):
+        """
+        监听点击 Renew 后触发的请求响应
+
+        Returns:
+            (future, 取消监听函数)；future 的结果为第一个匹配的 (Response, 收到时间)
+        """
+        pattern = self.config.get('renew_response_pattern', 'renew').lower()
+        # URL 必须包含 pattern；再按请求方法过滤（空值表示不限方法），避免把统计上报、验证页等其他请求当作 Renew
+        method = (self.config.get('renew_response_method', 'POST') or '').upper()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def on_response(response):
+            if future.done():
+                return
+            request = response.request
+            if request.resource_type not in ('xhr', 'fetch', 'document'):
+                return
+            if pattern not in response.url.lower():
+                return
+            if not method or request.method == method:
+                # 记录收到响应的时间，用于计算Renew延迟
+                future.set_result((response, loop.time()))
+
+        self.page.on('response', on_response)
+        return future, lambda: self.page.remove_listener('response', on_response)
+
+    async def _wait_for_renew_settled(self, response_future, button_text, timeout):
+        """
+        等待点击后的可观察条件之一成立（替代固定 sleep）
+
+        条件：Renew 请求完成 / 按钮文字变化 / 会话倒计时变化 / 出现 Cloudflare 验证框
+
+        Args:
+            response_future: _watch_renew_response 返回的 future
+            button_text: 点击前的按钮文字
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            触发的条件名，超时返回 'timeout'
+        """
+        waiters = {
+            asyncio.ensure_future(asyncio.shield(response_future)): 'response',
+            asyncio.ensure_future(self.page.wait_for_function(
+                """([sel, text]) => {
+                    const btn = document.querySelector(sel);
+                    return !btn || btn.innerText !== text;
+                }""",
+                arg=['#renewSessionBtn', button_text],
+                timeout=timeout * 1000
+            )): 'button',
+            asyncio.ensure_future(self.page.wait_for_selector(
+                'iframe[src*="challenges.cloudflare.com"]', state='attached', timeout=timeout * 1000
+            )): 'cloudflare',
+        }
+
+        # 可选：页面上的会话倒计时元素
+        expiry_selector = self.config.get('session_expiry_selector')
+        if expiry_selector:
+            try:
+                expiry_text = await self.page.inner_text(expiry_selector, timeout=1000)
+                waiters[asyncio.ensure_future(self.page.wait_for_function(
+                    """([sel, text]) => {
+                        const el = document.querySelector(sel);
+                        return el && el.innerText !== text;
+                    }""",
+                    arg=[expiry_selector, expiry_text],
+                    timeout=timeout * 1000
+                ))] = 'countdown'
+            except Exception:
+                pass
+
+        pending = set(waiters)
+        reason = 'timeout'
+        # 总等待时间以 timeout 为上限（某个条件出错后，其余条件只等待剩余时间）
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                # 某个条件等待超时/出错（如页面跳转）时继续等待其余条件
+                finished = [task for task in done if not task.cancelled() and task.exception() is None]
+                if finished:
+                    reason = waiters[finished[0]]
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+        return reason
+
+    def _save_screenshot(self, data, screenshot_path, options, outcome):
+        """编码写盘并更新截图索引、清理旧截图（阻塞操作，在线程池中执行）"""
+        size = screenshots.encode_and_write(data, screenshot_path, options)
+        kind = screenshots.screenshot_kind(screenshot_path.name)
+        self.manifest.append(screenshot_path.name, size, kind, outcome)
+        self.metrics.count_screenshot(size)
+
+        # 带时间戳的截图只保留最近N张（固定文件名的截图会被覆盖，无需清理）
+        if kind in ('renew', 'manual'):
+            self.manifest.enforce_retention(kind, self.config.get('screenshot_keep', 50))
+        return size
+
     async def click_renew(self):
         """点击Renew按钮"""
         try:
             self.logger.info("正在点击Renew按钮...")
 
             # 等待按钮可见
-            await self.page.wait_for_selector('#renewSessionBtn', state='visible', timeout=10000)
+            with self.timing.span('click_renew.wait_selector'):
+                await self.page.wait_for_selector('#renewSessionBtn', state='visible', timeout=10000)
+                button_text = await self.page.inner_text('#renewSessionBtn')
 
-            # 点击按钮
-            await self.page.click('#renewSessionBtn')
+            # 点击前开始监听响应，避免漏掉快速返回的请求
+            response_future, stop_watching = self._watch_renew_response()
+            loop = asyncio.get_running_loop()
+            try:
+                # 点击按钮
+                with self.timing.span('click_renew.click'):
+                    await self.page.click('#renewSessionBtn')
+                clicked_at = loop.time()
 
-            self.logger.info("✓ 成功点击Renew按钮！")
+                self.logger.info("✓ 成功点击Renew按钮！")
 
-            # 等待更长时间以处理可能的 Cloudflare 验证（从2秒增加到10秒）
-            self.logger.info("等待响应中（可能需要通过 Cloudflare 验证）...")
-            await asyncio.sleep(10)
+                # 等待页面响应（可能需要通过 Cloudflare 验证），条件满足即结束
+                self.logger.info("等待响应中（可能需要通过 Cloudflare 验证）...")
+                wait_timeout = self.config.get('renew_wait_timeout_seconds', 10)
+                with self.timing.span('click_renew.settle'):
+                    reason = await self._wait_for_renew_settled(response_future, button_text, wait_timeout)
+                self.logger.info(f"⏱️ 点击后等待 {loop.time() - clicked_at:.2f} 秒（条件: {reason}）")
 
-            # 检查是否有 Cloudflare 验证框
-            try:
-                # 常见的 CF 验证元素
+                # 检查是否有 Cloudflare 验证框
                 cf_challenge = await self.page.query_selector('iframe[src*="challenges.cloudflare.com"]')
                 if cf_challenge:
                     self.logger.warning("⚠️ 检测到 Cloudflare 验证")
 
-                    # 如果启用了手动干预模式，等待用户手动处理
+                    # 如果启用了手动干预模式，等待用户手动处理（最多5分钟）
                     if self.config.get('manual_mode', False):
                         self.logger.info("🖥️ 手动干预模式 - 请在VNC界面中完成Cloudflare验证")
                         self.logger.info("   访问: http://服务器IP:6080/vnc.html")
-
-                        # 等待CF验证消失（最多等待5分钟）
-                        max_wait = 300  # 5分钟
-                        waited = 0
-                        while waited < max_wait:
-                            await asyncio.sleep(10)
-                            waited += 10
-                            cf_check = await self.page.query_selector('iframe[src*="challenges.cloudflare.com"]')
-                            if not cf_check:
-                                self.logger.info("✓ Cloudflare验证已通过！")
-                                break
-                            if waited % 30 == 0:
-                                self.logger.info(f"等待中... ({waited}/{max_wait}秒)")
-
-                        if waited >= max_wait:
-                            self.logger.error("❌ Cloudflare验证超时")
-                            return False
+                        cf_timeout = self.config.get('manual_cf_wait_timeout_seconds', 300)
                     else:
-                        # 自动模式：等待30秒看CF是否自动通过
+                        # 自动模式：等待CF自动通过
                         self.logger.info("等待 Cloudflare 自动验证通过...")
-                        await asyncio.sleep(30)
-            except:
-                pass
+                        cf_timeout = self.config.get('cf_wait_timeout_seconds', 30)
 
-            # 保存截图（用于Web查看）
-            await self.take_screenshot('renew')
-
-            # 清理旧截图（只保留最近50张）
-            screenshots = sorted(self.screenshots_dir.glob('renew_*.png'), key=os.path.getmtime, reverse=True)
-            for old_screenshot in screenshots[50:]:
-                old_screenshot.unlink()
-                self.logger.debug(f"清理旧截图: {old_screenshot.name}")
+                    cf_started = loop.time()
+                    try:
+                        with self.timing.span('click_renew.cf_wait'):
+                            await self.page.wait_for_selector(
+                                'iframe[src*="challenges.cloudflare.com"]', state='detached', timeout=cf_timeout * 1000
+                            )
+                        self.logger.info(f"✓ Cloudflare验证已通过！（等待 {loop.time() - cf_started:.2f} 秒）")
+                    except PlaywrightTimeoutError:
+                        self.logger.error(f"❌ Cloudflare验证超时（{cf_timeout} 秒）")
+                        if self.config.get('manual_mode', False):
+                            self._record_renew_result({'ok': False, 'cause': 'cf_challenge'})
+                            return False
 
-            # 检查 Renew 是否成功（检查按钮是否仍然存在）
-            try:
-                await self.page.wait_for_selector('#renewSessionBtn', state='visible', timeout=5000)
-                self.logger.info("✓ Renew 操作完成")
-                return True
-            except:
-                self.logger.warning("⚠️ 无法确认 Renew 状态，但已完成点击")
-                return True
+                    # 验证通过后等待被拦截的 Renew 请求完成
+                    if not response_future.done():
+                        try:
+                            await asyncio.wait_for(asyncio.shield(response_future), timeout=wait_timeout)
+                        except asyncio.TimeoutError:
+                            pass
+            finally:
+                stop_watching()
+
+            # 根据捕获到的请求响应判定本次Renew结果
+            with self.timing.span('click_renew.result'):
+                result = await self._build_renew_result(response_future, clicked_at)
+            self._record_renew_result(result)
+
+            # 仅在失败或配置要求时保存截图（用于Web查看）
+            if not result['ok'] or self.config.get('screenshot_on_renew', False):
+                await self.take_screenshot(
+                    'renew' if result['ok'] else 'renew_failed',
+                    outcome='ok' if result['ok'] else 'failed'
+                )
+
+            return result['ok']
 
         except PlaywrightTimeoutError:
             self.logger.error("找不到Renew按钮，可能会话已过期")
+            self._record_renew_result({'ok': False, 'cause': 'session_expired'})
             # 保存错误截图
-            screenshot_path = self.screenshots_dir / 'renew_error.png'
-            await self.page.screenshot(path=str(screenshot_path))
+            await self.take_screenshot(name='renew_error', outcome='failed')
             return False
         except Exception as e:
             self.logger.error(f"点击Renew按钮时出错: {e}")
-            screenshot_path = self.screenshots_dir / 'renew_error.png'
-            await self.page.screenshot(path=str(screenshot_path))
+            self._record_renew_result({'ok': False, 'cause': 'error', 'error': str(e)})
+            await self.take_screenshot(name='renew_error', outcome='failed')
             return False
 
+    async def _build_renew_result(self, response_future, clicked_at):
+        """
+        根据点击后捕获的请求响应生成本次Renew结果
+
+        Returns:
+            dict: ok, cause, status, latency_ms, url, session_expires_at
+        """
+        result = {'ok': False, 'cause': 'no_response', 'status': None,
+                  'latency_ms': None, 'url': None, 'session_expires_at': None}
+
+        if await self.page.query_selector('iframe[src*="challenges.cloudflare.com"]'):
+            result['cause'] = 'cf_challenge'
+
+        if not response_future.done():
+            return result
+
+        response, received_at = response_future.result()
+        result['status'] = response.status
+        result['url'] = response.url
+        result['latency_ms'] = round((received_at - clicked_at) * 1000, 1)
+
+        if '/auth' in response.url or '/auth' in self.page.url:
+            result['cause'] = 'session_expired'
+        elif 200 <= response.status < 300:
+            result['ok'] = True
+            result['cause'] = 'ok'
+            # 学习Renew接口供HTTP快速通道重放
+            if self.config.get('http_fast_path', False):
+                try:
+                    await http_renew.save_endpoint(self.endpoint_file, response.request)
+                except Exception as e:
+                    self.logger.warning(f"保存Renew接口失败: {e}")
+        elif result['cause'] != 'cf_challenge':
+            result['cause'] = f'http_{response.status}'
+
+        # 尝试从响应中读取会话到期时间，读不到时读取页面上的会话倒计时
+        try:
+            expires_at = parse_session_expiry(await response.json())
+            if expires_at:
+                result['session_expires_at'] = datetime.fromtimestamp(expires_at).isoformat()
+                result['expiry_source'] = 'response'
+        except Exception:
+            pass
+        if result['ok'] and not result['session_expires_at']:
+            remaining = await self.read_session_countdown()
+            if remaining:
+                result['session_expires_at'] = (datetime.now() + timedelta(seconds=remaining)).isoformat()
+                result['expiry_source'] = 'page'
+
+        return result
+
+    async def read_session_countdown(self):
+        """
+        读取页面上的会话倒计时（session_expiry_selector）
+
+        Returns:
+            剩余秒数，未配置或无法解析时返回 None
+        """
+        selector = self.config.get('session_expiry_selector')
+        if not selector:
+            return None
+        try:
+            text = await self.page.inner_text(selector, timeout=2000)
+        except Exception as e:
+            self.logger.debug(f"读取会话倒计时失败: {e}")
+            return None
+        remaining = parse_countdown_text(text)
+        if remaining is None:
+            self.logger.warning(f"无法解析会话倒计时: {text.strip()[:50]!r}")
+        return remaining
+
+    def _record_renew_result(self, result):
+        """记录Renew结果（日志 + renew_history.jsonl + status.json）"""
+        result = {'timestamp': datetime.now().isoformat(), **result}
+        self.last_renew_result = result
+
+        if result['ok']:
+            self.logger.info(
+                f"✓ Renew 成功 (HTTP {result['status']}, {result['latency_ms']} ms"
+                + (f", 会话到期: {result['session_expires_at']}" if result.get('session_expires_at') else '')
+                + ")"
+            )
+        else:
+            self.logger.error(f"✗ Renew 失败 (原因: {result['cause']}, HTTP {result.get('status')})")
+
+        try:
+            with open(self.history_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(result, ensure_ascii=False) + '\n')
+        except Exception as e:
+            self.logger.warning(f"写入Renew记录失败: {e}")
+
+        status = {'last_renew': result}
+        if result['ok']:
+            status['last_success'] = result['timestamp']
+            self.mark_recovered()
+        if self.resource_policy.enabled:
+            status['resource_blocking'] = self.resource_policy.stats
+        self.update_status(**status)
+
+    def plan_next_renew(self):
+        """
+        计算距下一次续期的秒数
+
+        最近一次续期成功且得到了会话到期时间时，在到期前 expiry_safety_margin_seconds 续期，
+        以 renew_interval_minutes 为上限、min_renew_delay_seconds 为下限；否则按固定间隔。
+        结果写入 status.json 的 schedule 字段供Web界面显示。
+
+        Returns:
+            距下一次续期的秒数
+        """
+        interval = self.config.get('renew_interval_minutes', 15) * 60
+        delay, reason = interval, 'interval'
+
+        result = self.last_renew_result or {}
+        expires_at = result.get('session_expires_at') if result.get('ok') else None
+        if expires_at and self.config.get('adaptive_schedule', True):
+            remaining = (datetime.fromisoformat(expires_at) - datetime.now()).total_seconds()
+            margin = self.config.get('expiry_safety_margin_seconds', 120)
+            floor = self.config.get('min_renew_delay_seconds', 60)
+            candidate = max(floor, remaining - margin)
+            if candidate < interval:
+                delay, reason = candidate, 'session_expiry'
+            self.logger.info(
+                f"📅 会话将于 {expires_at[:19]} 到期（剩余 {remaining / 60:.1f} 分钟，"
+                f"来源: {'页面倒计时' if result.get('expiry_source') == 'page' else 'Renew响应'}）"
+            )
+
+        next_renew_at = datetime.now() + timedelta(seconds=delay)
+        if reason == 'session_expiry':
+            self.logger.info(
+                f"等待 {delay / 60:.1f} 分钟后执行下一次续期（会话到期前 "
+                f"{self.config.get('expiry_safety_margin_seconds', 120)} 秒，{next_renew_at:%H:%M:%S}）"
+            )
+        else:
+            self.logger.info(f"等待 {delay / 60:.1f} 分钟后执行下一次续期（固定间隔，{next_renew_at:%H:%M:%S}）")
+
+        self.record_schedule(delay, reason, expires_at)
+        return delay
+
+    def record_schedule(self, delay, reason, session_expires_at=None):
+        """
+        记录下一次续期时间：写入 status.json（Web界面显示）和 schedule_state.json（重启后恢复）
+
+        Args:
+            delay: 距下一次续期的秒数
+            reason: interval（固定间隔）/ session_expiry（按会话到期）/ delayed（延迟Renew请求）
+            session_expires_at: 已知的会话到期时间
+        """
+        next_renew_at = (datetime.now() + timedelta(seconds=delay)).isoformat()
+        self.update_status(schedule={
+            'next_renew_at': next_renew_at,
+            'delay_seconds': round(delay),
+            'reason': reason,
+            'session_expires_at': session_expires_at
+        })
+
+        result = self.last_renew_result or {}
+        state = self.load_schedule_state()
+        if result.get('ok'):
+            state['last_success'] = result['timestamp']
+        state.update({'next_due': next_renew_at, 'reason': reason, 'updated_at': datetime.now().isoformat()})
+        try:
+            tmp_file = self.schedule_file.with_suffix('.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(state, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_file, self.schedule_file)
+        except Exception as e:
+            self.logger.warning(f"保存调度状态失败: {e}")
+
+    def load_schedule_state(self):
+        """读取 schedule_state.json（不存在或损坏时返回空 dict）"""
+        try:
+            with open(self.schedule_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            return state if isinstance(state, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self.logger.warning(f"读取调度状态失败: {e}")
+            return {}
+
+    def resume_delay(self):
+        """
+        启动时距第一次续期的秒数：按上次保存的下次续期时间继续（包括未完成的延迟Renew请求），
+        但不晚于上次成功时间 + 当前续期间隔；没有记录或已过期时立即续期
+
+        Returns:
+            秒数（0 表示立即续期）
+        """
+        state = self.load_schedule_state()
+        if not state.get('next_due'):
+            return 0
+
+        try:
+            next_due = datetime.fromisoformat(state['next_due'])
+            if state.get('last_success'):
+                # 续期间隔改短后不沿用旧的下次续期时间（延迟Renew请求除外）
+                latest = datetime.fromisoformat(state['last_success']) + timedelta(
+                    minutes=self.config.get('renew_interval_minutes', 15))
+                if state.get('reason') != 'delayed':
+                    next_due = min(next_due, latest)
+        except (TypeError, ValueError) as e:
+            self.logger.warning(f"调度状态无效，立即续期: {e}")
+            return 0
+
+        delay = (next_due - datetime.now()).total_seconds()
+        if delay <= 0:
+            self.logger.info(f"⏯️ 上次计划的续期时间 {state['next_due'][:19]} 已过，立即续期")
+            return 0
+
+        self.logger.info(
+            f"⏯️ 恢复调度状态：上次成功 {(state.get('last_success') or '无')[:19]}，"
+            f"下次续期 {next_due:%Y-%m-%d %H:%M:%S}（{delay / 60:.1f} 分钟后），不立即续期"
+        )
+        self.update_status(schedule={
+            'next_renew_at': next_due.isoformat(),
+            'delay_seconds': round(delay),
+            'reason': state.get('reason', 'interval'),
+            'session_expires_at': None
+        })
+        return delay
+
+    def _read_status(self):
+        try:
+            with open(self.status_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def preflight_credentials(self):
+        """
+        启动浏览器前离线检查 cookies（见 cookie_check.py），会话 cookie 已过期时标记需要更新凭据
+
+        手动干预模式和连接现有Chrome时可以人工登录，不做检查
+
+        Returns:
+            是否继续启动浏览器
+        """
+        if (not self.task_id or self.config.get('manual_mode', False)
+                or self.config.get('connect_to_existing_chrome', False)):
+            return True
+
+        check = cookie_check.check_cookies(
+            self.cookies_file,
+            self.storage_state_file if self.session_persistence != 'cookies' else None,
+            self.config.get('session_cookie_names')
+        )
+        if check['ok']:
+            if check['expires_at']:
+                self.logger.info(
+                    f"🍪 Cookie预检通过，会话cookie将于 "
+                    f"{datetime.fromtimestamp(check['expires_at']):%Y-%m-%d %H:%M:%S} 过期"
+                )
+            return True
+
+        messages = {
+            'missing': '没有可用的 cookies',
+            'invalid': f"cookies 文件无法解析（{check.get('error')}）",
+            'expired': f"会话 cookie 已过期: {', '.join(check['expired'])}"
+        }
+        self.logger.error(f"🔑 {messages.get(check['reason'], check['reason'])}，需要更新凭据（不启动浏览器）")
+        self.mark_needs_credentials(check['reason'])
+        return False
+
+    def mark_needs_credentials(self, reason):
+        """标记任务需要更新凭据：任务管理器在 cookies 更新之前不再自动重启该任务"""
+        if self.task_id:
+            self.logger.error("请通过Web界面更新cookies，更新后任务管理器会自动重新启动任务")
+        self.update_status(needs_credentials={
+            'reason': reason,
+            'since': datetime.now().isoformat(),
+            # 记录当时的凭据文件修改时间，文件更新后才重新启动
+            'credentials_mtime': cookie_check.credentials_mtime(self.cookies_file, self.storage_state_file)
+        })
+        self.needs_credentials = True
+
+    def mark_recovered(self):
+        """
+        会话首次确认可用（登录检查通过或续期成功）：清除需要更新凭据的标记，
+        崩溃重启时记录恢复用时
+        """
+        if self.needs_credentials:
+            self.update_status(needs_credentials=None)
+            self.needs_credentials = False
+        if not self.recovering_since:
+            return
+        try:
+            seconds = (datetime.now() - datetime.fromisoformat(self.recovering_since)).total_seconds()
+        except (TypeError, ValueError):
+            seconds = None
+        if seconds is not None:
+            self.logger.info(f"🩹 崩溃恢复完成，用时 {seconds:.1f} 秒")
+        self.update_status(recovering_since=None, last_recovery={
+            'crashed_at': self.recovering_since,
+            'recovered_at': datetime.now().isoformat(),
+            'seconds': round(seconds, 1) if seconds is not None else None
+        })
+        self.recovering_since = None
+
+    def update_status(self, **fields):
+        """合并更新 status.json（原子写入，供Web界面读取）"""
+        try:
+            merge_json_file(self.status_file, fields)
+        except Exception as e:
+            self.logger.warning(f"更新状态文件失败: {e}")
+
     def check_trigger(self):
-        """检查是否有外部触发信号"""
+        """检查是否有旧版触发文件（trigger.json）"""
         if not self.trigger_file.exists():
             return None
 
@@ -589,8 +1224,7 @@ class MCHostRenewer:
             # 删除触发文件
             self.trigger_file.unlink()
 
-            action = trigger.get('action')
-            self.logger.info(f"✉️ 收到外部触发信号: {action}")
+            self.logger.info(f"检测到遗留的触发文件: {trigger.get('action')}")
             return trigger
         except Exception as e:
             self.logger.error(f"读取触发文件失败: {e}")
@@ -606,101 +1240,125 @@ class MCHostRenewer:
     async def run(self):
         """主运行循环"""
         try:
-            # 初始化浏览器
-            await self.init_browser()
+            # Cookie 离线预检：会话 cookie 已过期时不启动浏览器
+            if not self.preflight_credentials():
+                self.exit_reason = 'needs_credentials'
+                return
 
-            # 如果连接到现有Chrome，直接打开页面，让用户手动登录
-            if self.config.get('connect_to_existing_chrome', False):
-                self.logger.info("")
-                self.logger.info("=" * 60)
-                self.logger.info("📱 已在Chrome中打开新标签页")
-                self.logger.info("请在标签页中手动登录 MCHost")
-                self.logger.info("")
-                self.logger.info("登录步骤：")
-                self.logger.info("1. 脚本会自动打开MCHost页面")
-                self.logger.info("2. 如果需要登录，请手动登录")
-                self.logger.info("3. 如果遇到Cloudflare验证，手动完成验证")
-                self.logger.info("4. 登录成功后，脚本将自动开始监测Renew按钮")
-                self.logger.info("=" * 60)
-                self.logger.info("")
+            # 启动控制通道；任务启动前写入的旧版触发文件转入命令队列
+            await self.control.start()
+            trigger = self.check_trigger()
+            if trigger:
+                self.control.commands.put_nowait(trigger)
 
-                # 直接访问MCHost页面
-                await self.page.goto(self.config['mchost_url'])
-                self.logger.info(f"✓ 已打开页面: {self.config['mchost_url']}")
+            need_manual_login = False
+            if self.fast_path_ready():
+                # 已学习Renew接口：先不启动浏览器，续期时走HTTP快速通道
+                self.logger.info("⚡ 已学习Renew接口，使用HTTP快速通道（需要时才启动浏览器）")
+            else:
+                # 初始化浏览器（占用启动槽位，直到首次打开页面完成）
+                await self.launch_gate.acquire()
+                await self.init_browser()
 
-                # 等待用户手动登录（检测是否有Renew按钮）
-                self.logger.info("等待您手动登录...")
-                logged_in = False
-                for i in range(60):  # 等待最多5分钟
-                    await asyncio.sleep(5)
-                    try:
-                        # 检查是否能找到Renew按钮
-                        renew_btn = await self.page.query_selector('#renewSessionBtn')
-                        if renew_btn:
-                            self.logger.info("✓ 检测到Renew按钮，登录成功！")
-                            logged_in = True
-                            break
-                    except:
-                        pass
+                # 如果连接到现有Chrome，直接打开页面，让用户手动登录
+                if self.config.get('connect_to_existing_chrome', False):
+                    self.logger.info("")
+                    self.logger.info("=" * 60)
+                    self.logger.info("📱 已在Chrome中打开新标签页")
+                    self.logger.info("请在标签页中手动登录 MCHost")
+                    self.logger.info("")
+                    self.logger.info("登录步骤：")
+                    self.logger.info("1. 脚本会自动打开MCHost页面")
+                    self.logger.info("2. 如果需要登录，请手动登录")
+                    self.logger.info("3. 如果遇到Cloudflare验证，手动完成验证")
+                    self.logger.info("4. 登录成功后，脚本将自动开始监测Renew按钮")
+                    self.logger.info("=" * 60)
+                    self.logger.info("")
 
-                    if (i + 1) % 6 == 0:  # 每30秒提示一次
-                        self.logger.info(f"仍在等待登录... ({(i+1)*5}秒)")
+                    # 直接访问MCHost页面
+                    await self.page.goto(self.config['mchost_url'])
+                    self.logger.info(f"✓ 已打开页面: {self.config['mchost_url']}")
+                    self.launch_gate.release()
+
+                    # 等待用户手动登录（检测是否有Renew按钮）
+                    self.logger.info("等待您手动登录...")
+                    logged_in = False
+                    for i in range(60):  # 等待最多5分钟
+                        await asyncio.sleep(5)
+                        try:
+                            # 检查是否能找到Renew按钮
+                            renew_btn = await self.page.query_selector('#renewSessionBtn')
+                            if renew_btn:
+                                self.logger.info("✓ 检测到Renew按钮，登录成功！")
+                                logged_in = True
+                                break
+                        except:
+                            pass
 
-                if not logged_in:
-                    self.logger.error("❌ 超时：未检测到登录成功")
-                    self.logger.error("请确保已登录并能看到Renew按钮")
-                    return
+                        if (i + 1) % 6 == 0:  # 每30秒提示一次
+                            self.logger.info(f"仍在等待登录... ({(i+1)*5}秒)")
 
-            else:
-                # 原有逻辑：使用cookies登录
-                # 多任务模式下，cookies必须已存在
-                if self.task_id and not self.cookies_file.exists():
-                    self.logger.error("多任务模式下需要先上传 cookies.json 文件")
-                    self.logger.error(f"请将 cookies 文件放置在: {self.cookies_file}")
-                    return
-
-                # 检查是否需要手动登录（没有cookies文件时使用非headless模式）
-                need_manual_login = not self.cookies_file.exists()
-
-                if need_manual_login:
-                    self.logger.info("首次运行，需要手动登录")
-                    self.logger.info("将打开浏览器窗口...")
-                    # 临时设置为非headless模式
-                    original_headless = self.config.get('headless', True)
-                    self.config['headless'] = False
-
-                # 尝试加载cookies
-                logged_in = False
-                if await self.load_cookies():
-                    # 检查cookies是否有效
-                    self.logger.info("检查保存的登录会话是否有效...")
-                    if await self.check_login_status():
-                        logged_in = True
-                        self.logger.info("✓ 使用保存的会话登录成功")
-                    else:
-                        self.logger.warning("保存的会话已失效，需要重新登录")
+                    if not logged_in:
+                        self.logger.error("❌ 超时：未检测到登录成功")
+                        self.logger.error("请确保已登录并能看到Renew按钮")
+                        return
 
-                # 如果cookies无效或不存在，进行手动登录
-                if not logged_in:
-                    self.logger.info("")
-                    if need_manual_login:
-                        self.logger.info("需要手动登录（首次运行或会话失效）")
-                    else:
-                        self.logger.info("会话失效，需要重新登录")
-                        # 如果之前是headless模式，现在需要重新打开非headless浏览器
-                        if self.config.get('headless', True):
-                            self.logger.info("正在重启浏览器以显示窗口...")
-                            await self.cleanup()
-                            self.config['headless'] = False
-                            await self.init_browser()
-
-                    if not await self.manual_login():
-                        self.logger.error("手动登录失败，退出程序")
+                else:
+                    # 原有逻辑：使用cookies登录
+                    # 多任务模式下，cookies必须已存在
+                    if self.task_id and not self.cookies_file.exists():
+                        self.logger.error("多任务模式下需要先上传 cookies.json 文件")
+                        self.logger.error(f"请将 cookies 文件放置在: {self.cookies_file}")
                         return
 
-                    # 恢复headless设置
+                    # 检查是否需要手动登录（没有cookies文件时使用非headless模式）
+                    need_manual_login = not self.cookies_file.exists()
+
                     if need_manual_login:
-                        self.config['headless'] = original_headless
+                        self.logger.info("首次运行，需要手动登录")
+                        self.logger.info("将打开浏览器窗口...")
+                        # 临时设置为非headless模式
+                        original_headless = self.config.get('headless', True)
+                        self.config['headless'] = False
+
+                    # 尝试加载cookies
+                    logged_in = False
+                    if await self.load_cookies():
+                        # 检查cookies是否有效
+                        self.logger.info("检查保存的登录会话是否有效...")
+                        if await self.check_login_status():
+                            logged_in = True
+                            self.logger.info("✓ 使用保存的会话登录成功")
+                            self.mark_recovered()
+                        else:
+                            self.logger.warning("保存的会话已失效，需要重新登录")
+                    # 等待人工登录期间不占用启动槽位
+                    self.launch_gate.release()
+
+                    # 如果cookies无效或不存在，进行手动登录
+                    if not logged_in:
+                        self.logger.info("")
+                        if need_manual_login:
+                            self.logger.info("需要手动登录（首次运行或会话失效）")
+                        else:
+                            self.logger.info("会话失效，需要重新登录")
+                            # 如果之前是headless模式，现在需要重新打开非headless浏览器
+                            if self.config.get('headless', True):
+                                self.logger.info("正在重启浏览器以显示窗口...")
+                                await self.cleanup()
+                                self.config['headless'] = False
+                                await self.init_browser()
+
+                        if not await self.manual_login():
+                            self.logger.error("手动登录失败，退出程序")
+                            if self.task_id and not self.config.get('manual_mode', False):
+                                self.exit_reason = 'needs_credentials'
+                                self.mark_needs_credentials('login_failed')
+                            return
+
+                        # 恢复headless设置
+                        if need_manual_login:
+                            self.config['headless'] = original_headless
 
             # 检查是否为测试模式
             test_mode = self.config.get('test_mode', False)
@@ -708,7 +1366,7 @@ class MCHostRenewer:
                 self.logger.info("")
                 self.logger.info("=" * 60)
                 self.logger.info("测试模式：登录成功，即将退出")
-                self.logger.info(f"请查看截图: {self.screenshots_dir}/login_success.png")
+                self.logger.info(f"请查看截图: {self.screenshots_dir}/login_success.*")
                 self.logger.info("=" * 60)
                 self.logger.info("")
                 self.logger.info("确认登录成功后：")
@@ -731,97 +1389,302 @@ class MCHostRenewer:
                 self.logger.info("=" * 60)
                 self.logger.info("")
 
+            self.flush_spans('startup')
+
             # 主循环：每N分钟点击一次Renew
             renew_interval = self.config.get('renew_interval_minutes', 15) * 60
-            self.logger.info(f"开始自动续期循环，每 {renew_interval // 60} 分钟执行一次")
+            self.logger.info(f"开始自动续期循环，最长每 {renew_interval // 60} 分钟执行一次（已知会话到期时间时提前续期）")
             self.logger.info("提示: 现在可以通过Web界面进行手动控制")
             self.logger.info("")
 
-            while True:
-                # 立即执行一次renew
-                success = await self.click_renew()
+            # 续期时间由调度器统一安排：到期且分配到执行槽位后续期，等待期间处理控制命令（无空闲轮询）
+            scheduler = self.scheduler
+            key = self.schedule_key
+            # 第一次续期：按保存的调度状态继续，没有记录时立即执行
+            turn = scheduler.schedule(key, self.resume_delay())
+            command = None
 
-                if not success:
-                    self.logger.warning("Renew失败，会话可能已过期")
-                    self.logger.info("尝试使用保存的cookies重新登录...")
+            while True:
+                if command is None:
+                    command = self.command_reader = asyncio.ensure_future(self.control.commands.get())
+                await asyncio.wait({turn.future, command}, return_when=asyncio.FIRST_COMPLETED)
 
-                    # 重新加载页面和cookies
-                    if await self.load_cookies() and await self.check_login_status():
-                        self.logger.info("✓ 重新登录成功")
-                    else:
-                        self.logger.error("会话已完全失效")
+                if turn.future.done():
+                    try:
+                        session_ok = await self.scheduled_renew(turn)
+                    finally:
+                        scheduler.release(turn)
+                    if not session_ok:
+                        self.exit_reason = 'session_invalid'
                         if self.task_id:
-                            self.logger.error("请通过Web界面更新cookies")
-                        else:
-                            self.logger.error("请手动重新运行脚本进行登录")
+                            self.mark_needs_credentials('session_expired')
                         return
 
-                # 等待指定时间，每2秒检查一次触发信号（提高响应速度）
-                self.logger.info(f"等待 {renew_interval // 60} 分钟后执行下一次续期...")
-                elapsed = 0
-                check_interval = 2  # 改为每2秒检查一次，提高响应速度
-
-                while elapsed < renew_interval:
-                    await asyncio.sleep(check_interval)
-                    elapsed += check_interval
-
-                    # 检查触发信号
-                    trigger = self.check_trigger()
-                    if trigger:
-                        action = trigger.get('action')
-
-                        if action == 'screenshot':
-                            # 立即截图
-                            self.logger.info("📷 收到立即截图请求...")
-                            result = await self.take_screenshot('manual')
-                            if result:
-                                self.logger.info("✓ 立即截图完成")
-                            else:
-                                self.logger.error("✗ 立即截图失败")
-
-                        elif action == 'renew_now':
-                            # 立即点击Renew，然后重置计时器
-                            self.logger.info("▶️ 收到立即Renew请求...")
-                            success = await self.click_renew()
-                            if success:
-                                self.logger.info("✓ 手动Renew成功，重置计时器")
-                                break  # 跳出等待循环，重新开始计时
-                            else:
-                                self.logger.error("✗ 手动Renew失败")
-
-                        elif action == 'renew_delayed':
-                            # 延迟N分钟后点击Renew
-                            delay_minutes = trigger.get('delay_minutes', 0)
-                            if delay_minutes > 0:
-                                self.logger.info(f"⏱️ 收到延迟Renew请求: {delay_minutes} 分钟后执行")
-                                # 修改剩余等待时间
-                                remaining = renew_interval - elapsed
-                                new_wait = delay_minutes * 60
-                                self.logger.info(f"原计划剩余 {remaining // 60:.1f} 分钟，调整为 {delay_minutes} 分钟")
-                                # 重新计算elapsed，使得剩余时间=delay_minutes
-                                elapsed = renew_interval - new_wait
-                                if elapsed < 0:
-                                    elapsed = 0
+                    turn = scheduler.schedule(key, self.plan_next_renew())
+                    continue
+
+                trigger = command.result()
+                command = None
+                action = trigger.get('action')
+                self.logger.info(f"✉️ 收到外部触发信号: {action}")
+
+                if action == 'screenshot':
+                    # 立即截图（先撤下本任务的续期请求，避免它占住槽位与截图互相等待，截图后按原计划重新登记）
+                    self.logger.info("📷 收到立即截图请求...")
+                    remaining = scheduler.remaining(turn)
+                    scheduler.cancel(turn)
+                    async with scheduler.slot(key):
+                        # HTTP快速通道下浏览器可能未启动
+                        result = await self.take_screenshot('manual') if await self.ensure_browser() else None
+                    turn = scheduler.schedule(key, remaining)
+                    self.flush_spans('screenshot')
+                    if result:
+                        self.logger.info("✓ 立即截图完成")
+                    else:
+                        self.logger.error("✗ 立即截图失败")
+
+                elif action == 'renew_now':
+                    # 立即点击Renew，然后重置计时器
+                    self.logger.info("▶️ 收到立即Renew请求...")
+                    remaining = scheduler.remaining(turn)
+                    scheduler.cancel(turn)
+                    async with scheduler.slot(key):
+                        success = await self.renew_once()
+                    if success:
+                        self.logger.info("✓ 手动Renew成功，重置计时器")
+                        turn = scheduler.schedule(key, self.plan_next_renew())
+                    else:
+                        self.logger.error("✗ 手动Renew失败")
+                        turn = scheduler.schedule(key, remaining)
+
+                elif action == 'renew_delayed':
+                    # 延迟N分钟后点击Renew
+                    delay_minutes = trigger.get('delay_minutes', 0)
+                    if delay_minutes > 0:
+                        self.logger.info(f"⏱️ 收到延迟Renew请求: {delay_minutes} 分钟后执行")
+                        self.logger.info(
+                            f"原计划剩余 {scheduler.remaining(turn) / 60:.1f} 分钟，调整为 {delay_minutes} 分钟"
+                        )
+                        # 重新登记截止时间，使得剩余时间=delay_minutes（保存到调度状态，重启后仍然有效）
+                        scheduler.cancel(turn)
+                        turn = scheduler.schedule(key, delay_minutes * 60)
+                        self.record_schedule(delay_minutes * 60, 'delayed')
 
         except KeyboardInterrupt:
             self.logger.info("收到退出信号，正在关闭...")
         except Exception as e:
             self.logger.error(f"运行时错误: {e}")
+            self.exit_reason = 'error'
+        finally:
+            # 撤销调度（释放占用的槽位）和等待中的命令读取
+            self.scheduler.cancel_task(self.schedule_key)
+            if self.command_reader:
+                self.command_reader.cancel()
+            self.launch_gate.release()
+            await self.control.close()
+            await self.cleanup()
+            self.flush_spans('stop')
+
+    def flush_spans(self, cycle):
+        """结束一个阶段计时周期（写入 spans.jsonl，失败只记录调试日志）"""
+        try:
+            self.timing.flush(cycle)
+        except Exception as e:
+            self.logger.debug(f"写入阶段耗时失败: {e}")
+
+    def fast_path_ready(self):
+        """HTTP快速通道是否可用（已启用、已学习接口且不依赖人工操作）"""
+        return (self.config.get('http_fast_path', False)
+                and http_renew.is_available()
+                and not self.config.get('manual_mode', False)
+                and not self.config.get('connect_to_existing_chrome', False)
+                and self.cookies_file.exists()
+                and http_renew.load_endpoint(self.endpoint_file) is not None)
+
+    async def fast_path_renew(self):
+        """
+        通过HTTP快速通道续期
+
+        Returns:
+            结果 dict（见 http_renew.replay_renew）；读取 cookies/接口描述等出错时 cause 为 error，
+            由调用方回退到浏览器，不会让任务退出
+        """
+        try:
+            endpoint = http_renew.load_endpoint(self.endpoint_file)
+            with open(self.cookies_file, 'r', encoding='utf-8') as f:
+                cookies = json.load(f)
+
+            result = await http_renew.replay_renew(endpoint, cookies)
+
+            # 服务端轮换了会话cookie：写回 cookies.json
+            if result.pop('cookies_changed', False):
+                self._write_cookies(cookies)
+        except Exception as e:
+            self.logger.warning(f"HTTP快速通道出错: {e}")
+            return {'ok': False, 'cause': 'error', 'status': None, 'latency_ms': None, 'url': None,
+                    'session_expires_at': None, 'via': 'http', 'error': str(e)}
+
+        body = result.pop('body', None)
+        expires_at = parse_session_expiry(body)
+        if expires_at:
+            result['session_expires_at'] = datetime.fromtimestamp(expires_at).isoformat()
+            result['expiry_source'] = 'response'
+        return result
+
+    async def scheduled_renew(self, turn):
+        """
+        调度器分配到槽位后执行续期；失败时尝试用保存的cookies恢复会话
+
+        Args:
+            turn: 本次调度请求（用于记录延迟）
+
+        Returns:
+            会话是否仍然有效（False 表示需要重新登录，续期循环应退出）
+        """
+        lateness = turn.granted_at - turn.due
+        if lateness >= 1:
+            self.logger.info(f"⏳ 等待执行槽位 {lateness:.1f} 秒")
+
+        success = await self.renew_once()
+        if success:
+            return True
+
+        self.logger.warning("Renew失败，会话可能已过期")
+        self.logger.info("尝试使用保存的cookies重新登录...")
+
+        # 重新加载页面和cookies
+        if await self.load_cookies() and await self.check_login_status():
+            self.logger.info("✓ 重新登录成功")
+            return True
+
+        self.logger.error("会话已完全失效")
+        if not self.task_id:
+            self.logger.error("请手动重新运行脚本进行登录")
+        return False
+
+    async def renew_once(self):
+        """
+        执行一次续期：优先HTTP快速通道，遇到验证页/跳转登录/非2xx时回退到浏览器
+
+        Returns:
+            是否续期成功
+        """
+        started = time.monotonic()
+        previous = self.last_renew_result
+        outcome = 'error'
+        try:
+            success = await self._renew_once()
+            # 没有得到Renew结果（浏览器启动后会话无效）时单独计数
+            result = self.last_renew_result if self.last_renew_result is not previous else None
+            outcome = 'ok' if success else (result['cause'] if result else 'session_invalid')
+            return success
+        except asyncio.CancelledError:
+            # 任务停止时取消的周期不计入
+            outcome = None
+            raise
         finally:
+            # 记录周期耗时和结果原因、各阶段耗时
+            if outcome:
+                try:
+                    self.metrics.observe_cycle(time.monotonic() - started, outcome)
+                except Exception as e:
+                    self.logger.debug(f"写入指标失败: {e}")
+            self.flush_spans('renew')
+
+    async def _renew_once(self):
+        if self.page is None and self.fast_path_ready():
+            result = await self.fast_path_renew()
+            self._record_renew_result(result)
+            if result['ok']:
+                return True
+            self.logger.warning(f"HTTP快速通道失败（{result['cause']}），回退到浏览器")
+
+        # 共享浏览器被回收后需要重新获取context；快速通道模式下此时才启动浏览器
+        if not await self.ensure_browser():
+            self.logger.error("浏览器初始化后会话无效")
+            return False
+
+        success = await self.click_renew()
+        if success:
+            await self.persist_session()
+
+        # 浏览器续期成功且已学习接口：保存最新cookies并释放浏览器，下次继续走快速通道
+        if success and self.fast_path_ready():
+            await self.save_cookies()
             await self.cleanup()
+            self.logger.info("⚡ 已释放浏览器，下次续期使用HTTP快速通道")
+        return success
+
+    async def ensure_browser(self):
+        """
+        确认浏览器可用（共享浏览器被回收后重新获取context并恢复会话）
+
+        Returns:
+            浏览器是否可用
+        """
+        if self.page and not self.page.is_closed():
+            return True
+
+        if self.page:
+            self.logger.warning("⚠️ 浏览器页面已失效（浏览器可能已崩溃），正在重新初始化...")
+        else:
+            self.logger.info("正在启动浏览器...")
+        await self.cleanup()
+        await self.launch_gate.acquire()
+        try:
+            await self.init_browser()
+            return await self.load_cookies() and await self.check_login_status()
+        finally:
+            self.launch_gate.release()
 
     async def cleanup(self):
         """清理资源"""
+        if not (self.context or self.browser or self.playwright):
+            return
         try:
-            if self.context:
-                await self.context.close()
-            if self.browser:
-                await self.browser.close()
-            if hasattr(self, 'playwright') and self.playwright:
-                await self.playwright.stop()
+            with self.timing.span('cleanup'):
+                if self.context:
+                    await self.context.close()
+                # 共享模式下浏览器归浏览器池所有，只关闭自己的context
+                if self.browser and not self.pooled:
+                    await self.browser.close()
+                if self.playwright:
+                    await self.playwright.stop()
             self.logger.info("浏览器已关闭")
         except Exception as e:
             self.logger.warning(f"清理资源时出错: {e}")
+        finally:
+            self.context = None
+            self.browser = None
+            self.page = None
+            self.playwright = None
+
+
+async def run_pooled(task_ids, pool_size=1):
+    """
+    共享模式：一个进程内用共享浏览器池运行多个任务
+
+    Args:
+        task_ids: 任务ID列表
+        pool_size: 浏览器进程数量
+    """
+    from browser_pool import BrowserPool
+
+    pool = BrowserPool(size=pool_size)
+    await pool.start()
+    try:
+        renewers = []
+        for task_id in task_ids:
+            try:
+                renewers.append(MCHostRenewer(task_id=task_id, browser_pool=pool))
+            except SystemExit:
+                # 配置加载失败只跳过该任务
+                logging.getLogger().error(f"任务初始化失败，已跳过: {task_id}")
+        # return_exceptions=True：单个任务异常不影响其他任务
+        await asyncio.gather(*(renewer.run() for renewer in renewers), return_exceptions=True)
+    finally:
+        await pool.close()
+        await http_renew.close_session()
 
 
 async def main():
@@ -829,6 +1692,8 @@ async def main():
     # 解析命令行参数
     parser = argparse.ArgumentParser(description='MCHost 自动续期脚本')
     parser.add_argument('--task-id', type=str, help='任务ID（多任务模式）')
+    parser.add_argument('--task-ids', type=str, help='逗号分隔的任务ID列表（共享浏览器模式）')
+    parser.add_argument('--pool-size', type=int, default=1, help='共享浏览器进程数量（默认1）')
     parser.add_argument('--config', type=str, help='配置文件路径（单任务模式）')
     args = parser.parse_args()
 
@@ -841,7 +1706,13 @@ async def main():
 
     logger.info("=" * 50)
     logger.info("MCHost 自动续期脚本启动")
-    if args.task_id:
+    if args.task_ids:
+        task_ids = [task_id.strip() for task_id in args.task_ids.split(',') if task_id.strip()]
+        logger.info(f"运行模式: 共享浏览器 ({len(task_ids)} 个任务, {args.pool_size} 个浏览器)")
+        logger.info("=" * 50)
+        await run_pooled(task_ids, args.pool_size)
+        return
+    elif args.task_id:
         logger.info(f"运行模式: 多任务 (Task ID: {args.task_id})")
     else:
         logger.info("运行模式: 单任务")
@@ -859,8 +1730,14 @@ async def main():
 
     # 创建并运行renewer
     renewer = MCHostRenewer(task_id=args.task_id, config_path=args.config)
-    await renewer.run()
+    try:
+        await renewer.run()
+    finally:
+        await http_renew.close_session()
+
+    # 运行时错误以非零退出码退出，任务管理器据此立即重启
+    return 1 if renewer.exit_reason == 'error' else 0
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+MCHost 运行指标
+续期脚本把每个任务的累计计数（续期周期耗时分布、按原因统计的续期结果、截图字节数）
+保存在 tasks/<id>/metrics.json；任务管理器守护进程提供重启次数和进程资源占用；
+Web 界面的 /metrics 把它们汇总成 Prometheus 文本格式（curl 即可抓取，不需要外部服务）。
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+# 续期周期耗时直方图的桶上界（秒）
+CYCLE_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+
+class TaskMetrics:
+    """
+    单个任务的累计计数（只由该任务的续期脚本写入）
+
+    metrics.json：
+        {"cycle": {"buckets": [...], "counts": [...], "sum": ..., "count": ...},
+         "renew": {"ok": 10, "cf_challenge": 1, ...},
+         "screenshots": 3, "screenshot_bytes": 123456}
+
+    截图在线程池中写盘，计数更新用锁保护；每次更新整体写临时文件再替换。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.data = load_task_metrics(self.path)
+
+    def observe_cycle(self, seconds: float, outcome: str):
+        """
+        记录一次续期周期
+
+        Args:
+            seconds: 周期耗时（秒）
+            outcome: 结果原因（ok / cf_challenge / session_expired / no_response / http_xxx / error ...）
+        """
+        with self.lock:
+            cycle = self.data['cycle']
+            for i, bound in enumerate(cycle['buckets']):
+                if seconds <= bound:
+                    cycle['counts'][i] += 1
+            cycle['sum'] = round(cycle['sum'] + seconds, 3)
+            cycle['count'] += 1
+            self.data['renew'][outcome] = self.data['renew'].get(outcome, 0) + 1
+            self._save()
+
+    def count_screenshot(self, size: int):
+        """记录一张已写盘的截图"""
+        with self.lock:
+            self.data['screenshots'] += 1
+            self.data['screenshot_bytes'] += size
+            self._save()
+
+    def _save(self):
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+
+
+def load_task_metrics(path: Path) -> dict:
+    """读取 metrics.json（不存在、损坏或桶配置变化时从零开始）"""
+    data = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    cycle = data.get('cycle') or {}
+    if cycle.get('buckets') != list(CYCLE_BUCKETS) or len(cycle.get('counts', [])) != len(CYCLE_BUCKETS):
+        cycle = {'buckets': list(CYCLE_BUCKETS), 'counts': [0] * len(CYCLE_BUCKETS), 'sum': 0.0, 'count': 0}
+    return {
+        'cycle': cycle,
+        'renew': data.get('renew') or {},
+        'screenshots': data.get('screenshots', 0),
+        'screenshot_bytes': data.get('screenshot_bytes', 0)
+    }
+
+
+# ==================== 进程资源占用（Linux /proc） ====================
+
+def _read_proc_stat(pid: int) -> Optional[tuple]:
+    """返回 (ppid, CPU 时钟周期数, 常驻内存页数)，进程不存在时返回 None"""
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # 进程名可能包含空格和括号，从最后一个 ')' 之后开始按字段解析（第 3 个字段起）
+    fields = stat[stat.rfind(')') + 2:].split()
+    return int(fields[1]), int(fields[11]) + int(fields[12]), int(fields[21])
+
+
+def process_table() -> Dict[int, tuple]:
+    """
+    读取一次所有进程的 (ppid, CPU 时钟周期数, 常驻内存页数)
+
+    一次抓取中统计多个进程时先调用本函数，再把结果传给 process_usage，避免每个进程都扫描一遍 /proc
+    """
+    table = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            stat = _read_proc_stat(int(entry))
+            if stat:
+                table[int(entry)] = stat
+    return table
+
+
+def process_usage(pid: int, table: Dict[int, tuple] = None) -> Optional[Dict[str, dict]]:
+    """
+    进程及其子孙进程（浏览器）的资源占用
+
+    Args:
+        pid: 进程ID（任务进程，或 supervisor 模式下的守护进程）
+        table: process_table() 的结果（不传时现场读取）
+
+    Returns:
+        {'renewer': {...}, 'browser': {...}}，每项包含 rss_bytes、cpu_seconds、processes；
+        进程不存在或系统没有 /proc 时返回 None
+    """
+    if table is None:
+        if _read_proc_stat(pid) is None:
+            return None
+        table = process_table()
+    own = table.get(pid)
+    if own is None:
+        return None
+
+    # 建立父子关系，收集所有子孙进程（Chromium 主进程、渲染进程、GPU 进程等）
+    children = {}
+    for child, (ppid, _, _) in table.items():
+        children.setdefault(ppid, []).append(child)
+    descendants, pending = [], list(children.get(pid, []))
+    while pending:
+        child = pending.pop()
+        descendants.append(child)
+        pending.extend(children.get(child, []))
+
+    ticks = os.sysconf('SC_CLK_TCK')
+    page_size = os.sysconf('SC_PAGE_SIZE')
+
+    def summarize(stat_list):
+        return {
+            'rss_bytes': sum(stat[2] for stat in stat_list) * page_size,
+            'cpu_seconds': round(sum(stat[1] for stat in stat_list) / ticks, 2),
+            'processes': len(stat_list)
+        }
+
+    return {
+        'renewer': summarize([own]),
+        'browser': summarize([table[child] for child in descendants])
+    }
+
+
+# ==================== Prometheus 文本格式 ====================
+
+def _label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{key}="{_label_value(value)}"' for key, value in labels.items()) + '}'
+
+
+def _number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class _Writer:
+    """按指标分组输出（同一指标的所有样本必须连续，且前面有 HELP/TYPE）"""
+
+    def __init__(self):
+        self.families: Dict[str, dict] = {}
+
+    def add(self, name: str, kind: str, help_text: str, value, sample: str = None, **labels):
+        family = self.families.setdefault(name, {'kind': kind, 'help': help_text, 'samples': []})
+        family['samples'].append(f'{sample or name}{_labels(**labels) if labels else ""} {_number(value)}')
+
+    def render(self) -> str:
+        lines = []
+        for name, family in self.families.items():
+            lines.append(f'# HELP {name} {family["help"]}')
+            lines.append(f'# TYPE {name} {family["kind"]}')
+            lines.extend(family['samples'])
+        return '\n'.join(lines) + '\n'
+
+
+def render_metrics(tasks: list, tasks_dir: Path, daemon: dict = None) -> str:
+    """
+    生成 Prometheus 文本格式的指标
+
+    Args:
+        tasks: 任务状态列表（ManagerClient.get_all_tasks_status）
+        tasks_dir: 任务数据目录
+        daemon: 守护进程 metrics 命令的回复（未运行时为 None）
+
+    Returns:
+        text/plain; version=0.0.4 格式的文本
+    """
+    out = _Writer()
+    out.add('mchost_manager_up', 'gauge', '任务管理器守护进程是否在线', 1 if daemon is not None else 0)
+    daemon = daemon or {}
+
+    for task in tasks:
+        task_id = task['task_id']
+        task_dir = Path(tasks_dir) / task_id
+        out.add('mchost_task_running', 'gauge', '任务是否正在运行', 1 if task.get('running') else 0, task=task_id)
+
+        try:
+            with open(task_dir / 'status.json', 'r', encoding='utf-8') as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            status = {}
+        out.add('mchost_task_needs_credentials', 'gauge', '任务是否需要更新 cookies',
+                1 if status.get('needs_credentials') else 0, task=task_id)
+        blocked = (status.get('resource_blocking') or {}).get('blocked_requests')
+        if blocked is not None:
+            out.add('mchost_blocked_requests_total', 'counter', '请求拦截中止的请求数（节省量指标，不含字节数）',
+                    blocked, task=task_id)
+        if status.get('last_success'):
+            out.add('mchost_last_success_timestamp_seconds', 'gauge', '最近一次续期成功的时间（Unix 时间戳）',
+                    round(datetime.fromisoformat(status['last_success']).timestamp(), 3), task=task_id)
+
+        data = load_task_metrics(task_dir / 'metrics.json')
+        cycle = data['cycle']
+        name = 'mchost_renew_cycle_seconds'
+        help_text = '续期周期耗时（秒，从开始续期到得到结果，含浏览器启动和 Cloudflare 等待）'
+        for bound, count in zip(cycle['buckets'], cycle['counts']):
+            out.add(name, 'histogram', help_text, count, sample=f'{name}_bucket', task=task_id, le=_number(float(bound)))
+        out.add(name, 'histogram', help_text, cycle['count'], sample=f'{name}_bucket', task=task_id, le='+Inf')
+        out.add(name, 'histogram', help_text, cycle['sum'], sample=f'{name}_sum', task=task_id)
+        out.add(name, 'histogram', help_text, cycle['count'], sample=f'{name}_count', task=task_id)
+
+        for outcome, count in sorted(data['renew'].items()):
+            out.add('mchost_renew_total', 'counter', '续期次数（按结果原因：ok / cf_challenge / session_expired / no_response 等）',
+                    count, task=task_id, outcome=outcome)
+        out.add('mchost_screenshots_total', 'counter', '写入的截图数量', data['screenshots'], task=task_id)
+        out.add('mchost_screenshot_bytes_total', 'counter', '写入的截图字节数', data['screenshot_bytes'], task=task_id)
+
+    for task_id, reasons in sorted(daemon.get('restarts', {}).items()):
+        for reason, count in sorted(reasons.items()):
+            out.add('mchost_task_restarts_total', 'counter', '任务管理器/监管器重启任务的次数（crash：异常退出；exited：正常退出；not_running：未在运行）',
+                    count, task=task_id, reason=reason)
+
+    # process 模式按任务统计；supervisor 模式所有任务在守护进程内，task 标签为空
+    for task_id, usage in sorted(daemon.get('processes', {}).items()):
+        for process, stats in usage.items():
+            out.add('mchost_process_resident_memory_bytes', 'gauge', '常驻内存（renewer：续期进程；browser：其浏览器子进程合计）',
+                    stats['rss_bytes'], task=task_id, process=process)
+            out.add('mchost_process_cpu_seconds_total', 'counter', '累计 CPU 时间（秒，只含仍在运行的进程）',
+                    stats['cpu_seconds'], task=task_id, process=process)
+            out.add('mchost_process_count', 'gauge', '进程数量', stats['processes'], task=task_id, process=process)
+
+    scheduler = daemon.get('scheduler')
+    if scheduler:
+        out.add('mchost_scheduler_workers', 'gauge', '调度器执行槽位数量', scheduler['workers'])
+        out.add('mchost_scheduler_busy', 'gauge', '正在使用的执行槽位', scheduler['busy'])
+        out.add('mchost_scheduler_queue_depth', 'gauge', '已到期但等待槽位的续期数', scheduler['queue_depth'])
+        if 'p95' in scheduler['lateness']:
+            out.add('mchost_scheduler_lateness_p95_seconds', 'gauge', '最近调度延迟的 p95（秒）', scheduler['lateness']['p95'])
+
+    return out.render()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+MCHost 请求拦截策略
+通过 context.route 拦截续期不需要的资源（图片、字体、媒体、第三方统计），
+Renew 按钮和 Cloudflare 验证所需的请求始终放行
+
+节省量以拦截的请求数（按类型/域名）计：被中止的请求不会收到响应，无法得知它本来的字节数
+（GET 请求也没有 content-length 请求头），因此只统计放行请求的字节数，不估算拦截的字节数
+"""
+
+import logging
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# 默认拦截的资源类型
+DEFAULT_RESOURCE_TYPES = ['image', 'font', 'media']
+
+# 默认拦截的第三方统计/广告域名
+DEFAULT_BLOCK_DOMAINS = [
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'googlesyndication.com',
+    'facebook.net',
+    'hotjar.com',
+    'clarity.ms',
+    'sentry.io'
+]
+
+# 始终放行的域名（Cloudflare 验证）
+ALWAYS_ALLOW_DOMAINS = ['challenges.cloudflare.com']
+
+# 始终放行的资源类型（页面、脚本、接口请求是 Renew 按钮工作的前提）
+ALWAYS_ALLOW_TYPES = ('document', 'script', 'xhr', 'fetch')
+
+
+def _domain_matches(host: str, domain: str) -> bool:
+    domain = domain.lstrip('.').lower()
+    return host == domain or host.endswith('.' + domain)
+
+
+class ResourcePolicy:
+    """请求拦截策略和计数"""
+
+    def __init__(self, config: dict = None):
+        """
+        初始化拦截策略
+
+        Args:
+            config: resource_blocking 配置
+                {
+                    "enabled": true,
+                    "resource_types": ["image", "font", "media"],
+                    "block_domains": [...],
+                    "allow_domains": [...]
+                }
+        """
+        config = config or {}
+        self.enabled = config.get('enabled', False)
+        self.resource_types = set(config.get('resource_types', DEFAULT_RESOURCE_TYPES)) - set(ALWAYS_ALLOW_TYPES)
+        self.block_domains = config.get('block_domains', DEFAULT_BLOCK_DOMAINS)
+        self.allow_domains = ALWAYS_ALLOW_DOMAINS + config.get('allow_domains', [])
+
+        # 拦截计数即节省量指标；字节数只统计放行的响应（见模块说明）
+        self.stats = {
+            'blocked_requests': 0,
+            'blocked_by_type': {},
+            'blocked_by_domain': {},
+            'allowed_requests': 0,
+            'allowed_bytes': 0
+        }
+
+    def should_block(self, url: str, resource_type: str, frame_url: str = '') -> bool:
+        """判断请求是否应被拦截"""
+        host = (urlsplit(url).hostname or '').lower()
+
+        # Cloudflare 验证框内发起的请求全部放行
+        if any(_domain_matches(host, d) for d in self.allow_domains):
+            return False
+        if frame_url and any(_domain_matches((urlsplit(frame_url).hostname or '').lower(), d)
+                             for d in ALWAYS_ALLOW_DOMAINS):
+            return False
+
+        if any(_domain_matches(host, d) for d in self.block_domains):
+            return True
+        return resource_type in self.resource_types
+
+    async def attach(self, context):
+        """在 BrowserContext 上启用拦截和流量计数"""
+        if not self.enabled:
+            return
+        await context.route('**/*', self._handle_route)
+        context.on('response', self._on_response)
+
+    async def _handle_route(self, route):
+        request = route.request
+        try:
+            frame_url = request.frame.url
+        except Exception:
+            frame_url = ''
+
+        if self.should_block(request.url, request.resource_type, frame_url):
+            host = urlsplit(request.url).hostname or ''
+            self.stats['blocked_requests'] += 1
+            by_type = self.stats['blocked_by_type']
+            by_type[request.resource_type] = by_type.get(request.resource_type, 0) + 1
+            by_domain = self.stats['blocked_by_domain']
+            by_domain[host] = by_domain.get(host, 0) + 1
+            await route.abort('blockedbyclient')
+        else:
+            await route.continue_()
+
+    def _on_response(self, response):
+        self.stats['allowed_requests'] += 1
+        try:
+            self.stats['allowed_bytes'] += int(response.headers.get('content-length', 0))
+        except ValueError:
+            pass
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+MCHost 续期调度器
+所有任务的下一次续期截止时间保存在一个最小堆中，到期的任务按截止时间先后
+分配有限的执行槽位（同时进行的浏览器操作数量），每个任务仍按自己的续期间隔调度。
+
+supervisor 模式下所有任务共用一个调度器；process 模式下每个任务进程使用
+只有一个槽位的独立调度器（跨进程的浏览器启动数量由 launch_gate.py 限制）。
+
+用法（在续期协程中）：
+    ticket = scheduler.schedule(task_id, delay)   # 登记下一次截止时间
+    await ticket.future                           # 到期且分配到槽位
+    try:
+        ...                                       # 执行续期
+    finally:
+        scheduler.release(ticket)
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class Ticket:
+    """一次调度请求"""
+
+    __slots__ = ('task_id', 'due', 'seq', 'future', 'granted_at', 'cancelled')
+
+    def __init__(self, task_id: str, due: float, seq: int, future: asyncio.Future):
+        self.task_id = task_id
+        # 计划开始时间（事件循环时间）
+        self.due = due
+        self.seq = seq
+        # 分配到槽位时完成
+        self.future = future
+        self.granted_at = None
+        self.cancelled = False
+
+
+class RenewScheduler:
+    """截止时间驱动的中央调度器（同一事件循环内使用）"""
+
+    def __init__(self, workers: int = 1, window: int = 500):
+        """
+        初始化调度器
+
+        Args:
+            workers: 执行槽位数量（同时进行的续期/浏览器操作上限）
+            window: 统计延迟时保留的最近调度次数
+        """
+        self.workers = max(1, int(workers))
+        # 等待中的调度请求 (due, seq, ticket)；取消的请求延迟删除
+        self.heap = []
+        self.seq = itertools.count()
+        # 已分配槽位、尚未释放的请求
+        self.busy: Set[Ticket] = set()
+        # 每个任务未完成的请求（停止任务时统一取消）
+        self.task_tickets: Dict[str, Set[Ticket]] = {}
+
+        self.wakeup = None
+        self.dispatcher = None
+
+        # 统计：最近的延迟（实际开始 - 计划开始，秒）、累计占用槽位时间
+        self.lateness = deque(maxlen=window)
+        self.dispatched = 0
+        self.busy_seconds = 0.0
+        self.started_at = None
+
+    # ==================== 调度接口 ====================
+
+    def schedule(self, task_id: str, delay: float = 0) -> Ticket:
+        """
+        登记一次调度：delay 秒后到期，到期后按截止时间先后分配槽位
+
+        Args:
+            task_id: 任务ID
+            delay: 距计划开始的秒数（0 表示尽快）
+
+        Returns:
+            调度请求，await ticket.future 等待分配到槽位
+        """
+        loop = asyncio.get_running_loop()
+        self._ensure_dispatcher(loop)
+
+        ticket = Ticket(task_id, loop.time() + max(0.0, delay), next(self.seq), loop.create_future())
+        heapq.heappush(self.heap, (ticket.due, ticket.seq, ticket))
+        self.task_tickets.setdefault(task_id, set()).add(ticket)
+        self.wakeup.set()
+        return ticket
+
+    def release(self, ticket: Ticket):
+        """释放槽位（执行完成后调用；重复调用忽略）"""
+        if ticket in self.busy:
+            self.busy.discard(ticket)
+            self.busy_seconds += asyncio.get_running_loop().time() - ticket.granted_at
+        self._forget(ticket)
+        if self.wakeup:
+            self.wakeup.set()
+
+    def cancel(self, ticket: Ticket):
+        """取消调度（已分配槽位的直接释放）"""
+        if ticket in self.busy:
+            self.release(ticket)
+            return
+        # 还在堆中等待（调用方等待 future 时被取消的，future 已被 asyncio 取消），标记后由分派协程丢弃
+        ticket.cancelled = True
+        if not ticket.future.done():
+            ticket.future.cancel()
+        self._forget(ticket)
+
+    def cancel_task(self, task_id: str):
+        """取消任务的所有调度并释放其占用的槽位（任务停止时调用）"""
+        for ticket in list(self.task_tickets.get(task_id, ())):
+            self.cancel(ticket)
+
+    def remaining(self, ticket: Ticket) -> float:
+        """距计划开始的剩余秒数"""
+        return max(0.0, ticket.due - asyncio.get_running_loop().time())
+
+    @asynccontextmanager
+    async def slot(self, task_id: str):
+        """立即请求一个槽位，退出时释放（手动截图、立即续期等）"""
+        ticket = self.schedule(task_id, 0)
+        try:
+            await ticket.future
+            yield ticket
+        finally:
+            self.cancel(ticket)
+
+    def _forget(self, ticket: Ticket):
+        tickets = self.task_tickets.get(ticket.task_id)
+        if tickets is not None:
+            tickets.discard(ticket)
+            if not tickets:
+                del self.task_tickets[ticket.task_id]
+
+    # ==================== 分派 ====================
+
+    def _ensure_dispatcher(self, loop):
+        if self.dispatcher is not None and not self.dispatcher.done():
+            return
+        self.wakeup = asyncio.Event()
+        self.started_at = self.started_at or loop.time()
+        self.dispatcher = loop.create_task(self._dispatch(), name='renew-scheduler')
+
+    async def _dispatch(self):
+        """分派协程：到期的请求按截止时间先后分配空闲槽位，没有可做的事时休眠到下一个截止时间"""
+        loop = asyncio.get_running_loop()
+        while True:
+            self.wakeup.clear()
+            now = loop.time()
+
+            while self.heap and len(self.busy) < self.workers and self.heap[0][0] <= now:
+                _, _, ticket = heapq.heappop(self.heap)
+                if ticket.cancelled or ticket.future.done():
+                    continue
+                ticket.granted_at = now
+                self.busy.add(ticket)
+                self.dispatched += 1
+                self.lateness.append(now - ticket.due)
+                ticket.future.set_result(ticket)
+
+            # 丢弃堆顶已取消的请求，避免按它们的截止时间空转
+            while self.heap and (self.heap[0][2].cancelled or self.heap[0][2].future.done()):
+                heapq.heappop(self.heap)
+
+            timeout = None
+            if self.heap and len(self.busy) < self.workers:
+                timeout = max(0.0, self.heap[0][0] - now)
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def close(self):
+        """停止分派协程"""
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            self.dispatcher = None
+
+    # ==================== 统计 ====================
+
+    def metrics(self) -> dict:
+        """
+        调度统计（用于根据实际负载确定每台主机的任务数和槽位数）
+
+        Returns:
+            scheduled: 等待中的调度请求数
+            queue_depth: 已到期但没有空闲槽位、正在排队的请求数
+            busy / workers: 正在使用的槽位 / 槽位总数
+            utilisation: 启动以来的槽位占用率（0~1）
+            lateness: 最近调度的延迟（实际开始 - 计划开始，秒）
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        waiting = [ticket for _, _, ticket in self.heap if not ticket.cancelled and not ticket.future.done()]
+
+        busy_seconds = self.busy_seconds + sum(now - ticket.granted_at for ticket in self.busy)
+        uptime = now - self.started_at if self.started_at else 0
+        utilisation = busy_seconds / (self.workers * uptime) if uptime > 0 else 0.0
+
+        samples = sorted(self.lateness)
+        lateness = {'samples': len(samples)}
+        if samples:
+            lateness.update({
+                'avg': round(sum(samples) / len(samples), 3),
+                'p50': round(samples[len(samples) // 2], 3),
+                'p95': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+                'max': round(samples[-1], 3)
+            })
+
+        next_due: Optional[float] = min((ticket.due for ticket in waiting), default=None)
+        return {
+            'workers': self.workers,
+            'busy': len(self.busy),
+            'scheduled': len(waiting),
+            'queue_depth': sum(1 for ticket in waiting if ticket.due <= now),
+            'next_due_seconds': round(next_due - now, 1) if next_due is not None else None,
+            'dispatched': self.dispatched,
+            'utilisation': round(utilisation, 4),
+            'lateness': lateness
+        }
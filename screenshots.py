@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+MCHost 截图工具
+截图格式/质量/尺寸配置、在事件循环之外完成的编码和写盘，以及每任务截图索引
+"""
+
+import io
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from fileutil import tail_lines
+
+try:
+    from PIL import Image
+except ImportError:  # 可选依赖：未安装时不支持 WebP 和尺寸缩放
+    Image = None
+
+# 截图文件扩展名 -> MIME 类型
+SCREENSHOT_MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.webp': 'image/webp'
+}
+
+# 默认截图配置：视口 JPEG，体积约为全页 PNG 的十分之一
+DEFAULT_SCREENSHOT_OPTIONS = {
+    'format': 'jpeg',
+    'quality': 70,
+    'full_page': False,
+    'clip': None,
+    'max_width': 0,
+    'max_height': 0
+}
+
+
+def screenshot_options(config: dict = None) -> dict:
+    """
+    合并截图配置
+
+    Args:
+        config: 任务配置中的 screenshot 字段
+            {"format": "jpeg|png|webp", "quality": 70, "full_page": false,
+             "clip": {"x": 0, "y": 0, "width": 1280, "height": 720},
+             "max_width": 1280, "max_height": 0}
+    """
+    options = {**DEFAULT_SCREENSHOT_OPTIONS, **(config or {})}
+    fmt = str(options['format']).lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if fmt not in ('png', 'jpeg', 'webp'):
+        fmt = 'jpeg'
+    # 没有 Pillow 时无法转 WebP，退回 JPEG
+    if fmt == 'webp' and Image is None:
+        fmt = 'jpeg'
+    options['format'] = fmt
+    options['quality'] = max(1, min(100, int(options['quality'])))
+    return options
+
+
+def file_extension(options: dict) -> str:
+    """截图文件扩展名"""
+    return {'png': '.png', 'jpeg': '.jpg', 'webp': '.webp'}[options['format']]
+
+
+def capture_kwargs(options: dict) -> dict:
+    """生成 page.screenshot 参数（WebP 先按 PNG 截取，再由 Pillow 转码）"""
+    kwargs = {
+        'type': 'jpeg' if options['format'] == 'jpeg' else 'png',
+        'full_page': bool(options['full_page'])
+    }
+    if options['format'] == 'jpeg':
+        kwargs['quality'] = options['quality']
+    if options.get('clip'):
+        kwargs['clip'] = options['clip']
+        kwargs['full_page'] = False
+    return kwargs
+
+
+def encode_and_write(data: bytes, path: Path, options: dict) -> int:
+    """
+    按配置缩放/转码并写盘（阻塞操作，应在线程池中执行）
+
+    Returns:
+        写入的字节数
+    """
+    max_width = options.get('max_width') or 0
+    max_height = options.get('max_height') or 0
+    needs_convert = options['format'] == 'webp' or max_width or max_height
+
+    if needs_convert and Image is not None:
+        with Image.open(io.BytesIO(data)) as image:
+            if max_width or max_height:
+                image.thumbnail((max_width or image.width, max_height or image.height))
+            buffer = io.BytesIO()
+            if options['format'] == 'png':
+                image.save(buffer, format='PNG', optimize=True)
+            else:
+                image.convert('RGB').save(
+                    buffer,
+                    format='WEBP' if options['format'] == 'webp' else 'JPEG',
+                    quality=options['quality']
+                )
+            data = buffer.getvalue()
+
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+class ScreenshotManifest:
+    """
+    每任务截图索引（screenshots/manifest.jsonl，只追加）
+
+    每行一条记录：
+        {"name": ..., "ts": ..., "size": ..., "kind": "renew|manual|error|login", "outcome": ...}
+    删除记录：
+        {"deleted": name, "ts": ...}
+
+    Web 界面的截图列表和旧截图清理都只读取文件末尾的少量记录，不再扫描目录。
+    """
+
+    # 超过该大小时压缩索引（去掉已删除和重复的记录）
+    COMPACT_SIZE = 256 * 1024
+
+    def __init__(self, screenshots_dir: Path, read_only: bool = False):
+        """
+        Args:
+            screenshots_dir: 截图目录
+            read_only: 只读（Web 界面使用）：索引不存在时不重建、不写文件，recent() 临时扫描目录；
+                       只有续期脚本（唯一的写入方）重建和追加索引，避免与其追加写入互相覆盖
+        """
+        self.screenshots_dir = Path(screenshots_dir)
+        self.path = self.screenshots_dir / 'manifest.jsonl'
+        self.read_only = read_only
+        if not read_only and not self.path.exists() and self.screenshots_dir.exists():
+            self.rebuild()
+
+    def _scan(self):
+        """扫描目录中的截图文件（按修改时间排序）"""
+        if not self.screenshots_dir.exists():
+            return []
+        files = sorted(
+            (p for p in self.screenshots_dir.iterdir() if p.suffix.lower() in SCREENSHOT_MIME_TYPES),
+            key=lambda p: p.stat().st_mtime
+        )
+        return [
+            {
+                'name': p.name,
+                'ts': datetime.fromtimestamp(p.stat().st_mtime).isoformat(),
+                'size': p.stat().st_size,
+                'kind': screenshot_kind(p.name),
+                'outcome': None
+            }
+            for p in files
+        ]
+
+    def rebuild(self):
+        """从现有截图文件重建索引（旧版本升级时执行一次）"""
+        self._write_all(self._scan())
+
+    def _write_all(self, entries):
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def _append(self, record: dict):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def append(self, name: str, size: int, kind: str, outcome: str = None):
+        """记录一张新截图"""
+        self._append({
+            'name': name,
+            'ts': datetime.now().isoformat(),
+            'size': size,
+            'kind': kind,
+            'outcome': outcome
+        })
+
+    def _tail_records(self, limit: int):
+        """读取末尾 limit 条记录（按时间倒序）"""
+        if self.read_only and not self.path.exists():
+            # 续期脚本尚未建立索引：临时列出目录，不写索引
+            return list(reversed(self._scan()))[:limit]
+        records = []
+        for line in reversed(tail_lines(self.path, limit)):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+
+    def recent(self, limit: int = 20, kind: str = None):
+        """
+        最近的截图（按时间倒序，同名截图只保留最新一条）
+
+        只读取末尾约 limit 的若干倍条记录，开销与目录中的文件总数无关
+        """
+        results = []
+        seen = set()
+        for record in self._tail_records(limit * 4 + 20):
+            name = record.get('deleted') or record.get('name')
+            if not name or name in seen:
+                continue
+            seen.add(name)
+            if 'deleted' in record:
+                continue
+            if kind and record.get('kind') != kind:
+                continue
+            results.append(record)
+            if len(results) >= limit:
+                break
+        return results
+
+    def enforce_retention(self, kind: str, keep: int):
+        """
+        只保留某类截图最近的 keep 张，删除更早的文件
+
+        每次新增截图后调用，通常只需删除一张，只读取末尾约 2*keep 条记录
+        """
+        live = self.recent(keep * 2, kind=kind)
+        for record in live[keep:]:
+            try:
+                (self.screenshots_dir / record['name']).unlink()
+            except FileNotFoundError:
+                pass
+            self._append({'deleted': record['name'], 'ts': datetime.now().isoformat()})
+
+        if self.path.stat().st_size > self.COMPACT_SIZE:
+            self.compact()
+
+    def compact(self):
+        """去掉已删除和被覆盖的记录（偶尔执行的全量重写）"""
+        latest = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if 'deleted' in record:
+                    latest.pop(record['deleted'], None)
+                elif record.get('name'):
+                    latest.pop(record['name'], None)
+                    latest[record['name']] = record
+        self._write_all(list(latest.values()))
+
+
+def screenshot_kind(name: str) -> str:
+    """根据文件名推断截图类型"""
+    if name.startswith('manual'):
+        return 'manual'
+    if 'error' in name or 'timeout' in name:
+        return 'error'
+    if name.startswith('login'):
+        return 'login'
+    return 'renew'
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+MCHost 会话到期时间解析
+从 Renew 接口返回的 JSON 或页面上的倒计时文字中解析会话到期时间（续期脚本和 HTTP 快速通道共用）
+"""
+
+import re
+import time
+from datetime import datetime
+
+# 响应中可能表示会话到期时间的字段
+EXPIRY_ABSOLUTE_KEYS = ('expires_at', 'expiresAt', 'expires', 'expiry', 'session_expires', 'sessionExpiresAt')
+# 响应中可能表示会话剩余秒数的字段
+EXPIRY_REMAINING_KEYS = ('remaining', 'remaining_seconds', 'remainingSeconds', 'seconds_left', 'ttl', 'expires_in')
+
+
+def parse_session_expiry(data, now=None):
+    """
+    从 Renew 接口返回的 JSON 中解析会话到期时间
+
+    Args:
+        data: 响应 JSON（dict，可嵌套一层 data/session）
+        now: 当前时间戳（默认 time.time()）
+
+    Returns:
+        到期时间戳（秒），无法解析时返回 None
+    """
+    if not isinstance(data, dict):
+        return None
+    now = now if now is not None else time.time()
+
+    for key in EXPIRY_REMAINING_KEYS:
+        value = data.get(key)
+        if isinstance(value, (int, float)) and value > 0:
+            return now + float(value)
+
+    for key in EXPIRY_ABSOLUTE_KEYS:
+        value = data.get(key)
+        if isinstance(value, (int, float)) and value > 0:
+            # 毫秒时间戳
+            return float(value) / 1000 if value > 1e12 else float(value)
+        if isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+            except ValueError:
+                continue
+
+    for key in ('data', 'session'):
+        nested = parse_session_expiry(data.get(key), now) if isinstance(data.get(key), dict) else None
+        if nested:
+            return nested
+    return None
+
+
+# 倒计时文字中的时间单位（长的在前，避免 "min" 被当成 "m"）
+COUNTDOWN_UNITS = re.compile(
+    r'(\d+(?:\.\d+)?)\s*(小时|分钟|分|秒|hours?|hrs?|minutes?|mins?|seconds?|secs?|h|m|s)(?![A-Za-z])',
+    re.IGNORECASE
+)
+COUNTDOWN_SECONDS = {'小': 3600, '分': 60, '秒': 1, 'h': 3600, 'm': 60, 's': 1}
+
+
+def parse_countdown_text(text):
+    """
+    从页面上的会话倒计时文字中解析剩余秒数
+
+    支持 "14:32"、"01:14:32"、"14 分钟"、"1h 30m"、"15 minutes" 等写法
+
+    Returns:
+        剩余秒数，无法解析时返回 None
+    """
+    if not text:
+        return None
+
+    match = re.search(r'(\d+):(\d{2})(?::(\d{2}))?', text)
+    if match:
+        first, second, third = match.groups()
+        if third is not None:
+            return int(first) * 3600 + int(second) * 60 + int(third)
+        return int(first) * 60 + int(second)
+
+    seconds = [float(value) * COUNTDOWN_SECONDS[unit[0].lower()] for value, unit in COUNTDOWN_UNITS.findall(text)]
+    return sum(seconds) if seconds else None
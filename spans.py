@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+MCHost 续期阶段计时
+续期脚本把一次周期（启动、续期、登录）中各阶段的耗时（page.goto、wait_for_selector、
+点击、Cloudflare 等待、截图、清理等）记录在内存中，周期结束时写入 tasks/<id>/spans.jsonl 一行：
+
+    {"ts": "...", "cycle": "renew", "total_ms": 5234.1,
+     "spans": [["check_login.goto", 812.4, true], ["click_renew.click", 95.0, true], ...]}
+
+每个阶段只调用两次 time.perf_counter()，每个周期只追加写一次文件。
+
+查看各任务各阶段的耗时分布：
+    python spans.py                # 所有任务，最近 500 个周期
+    python spans.py server1 --last 100
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+from fileutil import tail_lines
+
+# spans.jsonl 超过该大小时只保留最近 KEEP_LINES 个周期
+MAX_BYTES = 2 * 1024 * 1024
+KEEP_LINES = 2000
+
+
+class _Span:
+    """单个阶段的计时（with 语句，可跨 await 使用）"""
+
+    __slots__ = ('recorder', 'phase', 'started')
+
+    def __init__(self, recorder, phase: str):
+        self.recorder = recorder
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.record(self.phase, self.started, exc_type is None)
+        return False
+
+
+class _NullSpan:
+    """关闭记录时使用的空计时"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class SpanRecorder:
+    """单个任务的阶段计时记录器"""
+
+    def __init__(self, path: Path, enabled: bool = True):
+        """
+        初始化记录器
+
+        Args:
+            path: spans.jsonl 路径
+            enabled: 是否记录（关闭时 span() 返回空计时）
+        """
+        self.path = Path(path)
+        self.enabled = enabled
+        # 当前周期已结束的阶段 [阶段, 毫秒, 是否正常结束]
+        self.spans: List[list] = []
+        self.cycle_started = None
+
+    def span(self, phase: str):
+        """
+        计时一个阶段
+
+        用法：
+            with self.timing.span('check_login.goto'):
+                await self.page.goto(...)
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        if self.cycle_started is None:
+            self.cycle_started = time.perf_counter()
+        return _Span(self, phase)
+
+    def record(self, phase: str, started: float, ok: bool = True):
+        """
+        记录一个已结束的阶段（不便用 with 包住的阶段，如带多个出口的等待循环）
+
+        Args:
+            phase: 阶段名称
+            started: 开始时间（time.perf_counter()）
+            ok: 是否正常结束
+        """
+        if not self.enabled:
+            return
+        if self.cycle_started is None:
+            self.cycle_started = started
+        self.spans.append([phase, round((time.perf_counter() - started) * 1000, 1), ok])
+
+    def flush(self, cycle: str):
+        """
+        结束当前周期，把已记录的阶段写入 spans.jsonl（没有记录时忽略）
+
+        Args:
+            cycle: 周期类型（startup / renew / login / stop）
+        """
+        if not self.spans:
+            return
+        record = {
+            'ts': datetime.now().isoformat(),
+            'cycle': cycle,
+            'total_ms': round((time.perf_counter() - self.cycle_started) * 1000, 1),
+            'spans': self.spans
+        }
+        self.spans = []
+        self.cycle_started = None
+
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        if self.path.stat().st_size > MAX_BYTES:
+            self._truncate()
+
+    def _truncate(self):
+        lines = tail_lines(self.path, KEEP_LINES)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(line + '\n' for line in lines)
+        os.replace(tmp_path, self.path)
+
+
+# ==================== 报告 ====================
+
+def _percentile(samples: list, q: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def collect_samples(paths, last: int = 500):
+    """
+    读取一个或多个 spans.jsonl 最近 last 个周期的阶段耗时
+
+    Returns:
+        ({阶段: [毫秒, ...]}, {阶段: 未正常结束次数})，周期总耗时记为 <cycle>.total
+    """
+    samples: Dict[str, list] = {}
+    failed: Dict[str, int] = {}
+    for path in paths:
+        for line in tail_lines(path, last):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            samples.setdefault(f"{record['cycle']}.total", []).append(record['total_ms'])
+            for phase, elapsed, ok in record['spans']:
+                samples.setdefault(phase, []).append(elapsed)
+                if not ok:
+                    failed[phase] = failed.get(phase, 0) + 1
+    return samples, failed
+
+
+def summarize(samples: Dict[str, list], failed: Dict[str, int] = None) -> Dict[str, dict]:
+    """
+    各阶段耗时分布
+
+    Returns:
+        {阶段: {'count', 'failed', 'p50', 'p95', 'p99', 'max'}}（毫秒）
+    """
+    failed = failed or {}
+    stats = {}
+    for phase, values in sorted(samples.items()):
+        values = sorted(values)
+        stats[phase] = {
+            'count': len(values),
+            'failed': failed.get(phase, 0),
+            'p50': _percentile(values, 0.50),
+            'p95': _percentile(values, 0.95),
+            'p99': _percentile(values, 0.99),
+            'max': values[-1]
+        }
+    return stats
+
+
+def phase_stats(path: Path, last: int = 500) -> Dict[str, dict]:
+    """统计一个任务最近 last 个周期中各阶段的耗时（见 summarize）"""
+    return summarize(*collect_samples([path], last))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='MCHost 续期阶段耗时报告（p50/p95/p99，毫秒）')
+    parser.add_argument('task_ids', nargs='*', help='任务ID（默认所有任务）')
+    parser.add_argument('--last', type=int, default=500, help='每个任务统计最近多少个周期（默认 500）')
+    parser.add_argument('--tasks-dir', default=str(Path(__file__).parent / 'tasks'), help='任务数据目录')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出')
+    args = parser.parse_args(argv)
+
+    tasks_dir = Path(args.tasks_dir)
+    task_ids = args.task_ids
+    if not task_ids and tasks_dir.exists():
+        task_ids = sorted(p.name for p in tasks_dir.iterdir() if (p / 'spans.jsonl').exists())
+
+    report = {}
+    for task_id in task_ids:
+        path = tasks_dir / task_id / 'spans.jsonl'
+        if path.exists():
+            report[task_id] = phase_stats(path, args.last)
+        else:
+            print(f"任务没有阶段记录: {task_id}", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return 0
+
+    for task_id, stats in report.items():
+        print(f"\n== {task_id} ==")
+        width = max((len(phase) for phase in stats), default=5)
+        print(f"{'phase':<{width}}  {'n':>5}  {'fail':>4}  {'p50':>9}  {'p95':>9}  {'p99':>9}  {'max':>9}")
+        for phase, s in stats.items():
+            print(f"{phase:<{width}}  {s['count']:>5}  {s['failed']:>4}  "
+                  f"{s['p50']:>9.1f}  {s['p95']:>9.1f}  {s['p99']:>9.1f}  {s['max']:>9.1f}")
+    if not report:
+        print("没有阶段记录")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+MCHost 单进程任务监管器
+在一个进程、一个事件循环中以 asyncio 任务的形式运行所有续期循环，
+共享同一个 Playwright 驱动和浏览器池；续期时间由共享的调度器统一安排（见 scheduler.py）
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+
+from browser_pool import BrowserPool
+from mchost_renew import CONTEXT_OPTIONS, MCHostRenewer
+from scheduler import RenewScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class RenewSupervisor:
+    """
+    单进程监管器
+
+    事件循环运行在后台线程中，对外提供与 TaskManager 相同风格的同步接口，
+    TaskManager 在 supervisor 模式下用它替代 subprocess.Popen。
+    """
+
+    def __init__(self, pool_size: int = 1, workers: int = 2, standby_size: int = 1):
+        """
+        初始化监管器
+
+        Args:
+            pool_size: 共享浏览器进程数量
+            workers: 调度器执行槽位数量（所有任务同时进行的续期/浏览器操作上限）
+            standby_size: 浏览器池热备 context 数量（新启动或崩溃重启的任务直接领取）
+        """
+        self.pool_size = pool_size
+        self.standby_size = standby_size
+        self.loop = None
+        self.thread = None
+        self.pool = None
+        self.scheduler = RenewScheduler(workers=workers)
+
+        # 运行中的续期循环 {task_id: asyncio.Task}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        # 对应的 renewer 实例 {task_id: MCHostRenewer}
+        self.renewers: Dict[str, MCHostRenewer] = {}
+        # 崩溃后等待重启的任务 {task_id: TimerHandle}、连续崩溃记录 {task_id: (次数, 最后崩溃时间)}
+        self.restart_handles: Dict[str, asyncio.TimerHandle] = {}
+        self.crash_counts: Dict[str, tuple] = {}
+        # 崩溃重启累计次数 {task_id: 次数}（/metrics 输出）
+        self.restart_counts: Dict[str, int] = {}
+
+        self._started = threading.Event()
+
+    # ==================== 生命周期 ====================
+
+    def start(self):
+        """启动后台事件循环和浏览器池"""
+        if self.thread and self.thread.is_alive():
+            return
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name='renew-supervisor', daemon=True)
+        self.thread.start()
+        self._started.wait()
+
+        self._call(self._start_pool())
+        logger.info(f"✓ 监管器已启动（共享浏览器 {self.pool_size} 个，执行槽位 {self.scheduler.workers} 个）")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._started.set)
+        self.loop.run_forever()
+
+    async def _start_pool(self):
+        self.pool = BrowserPool(
+            size=self.pool_size,
+            standby_size=self.standby_size,
+            standby_options=CONTEXT_OPTIONS,
+            channel_cache=Path(__file__).parent / '.chrome_channel.json'
+        )
+        await self.pool.start()
+
+    def shutdown(self, timeout: float = 30) -> Dict[str, dict]:
+        """
+        停止所有任务并关闭事件循环
+
+        Args:
+            timeout: 总截止时间（秒），任务清理和关闭浏览器池共用
+
+        Returns:
+            各任务的停止结果（见 stop_tasks）
+        """
+        if not self.loop:
+            return {}
+        deadline = time.monotonic() + timeout
+        results = self.stop_all(timeout=timeout)
+        self.loop.call_soon_threadsafe(self.scheduler.close)
+        if self.pool:
+            try:
+                self._call(self.pool.close(), timeout=max(deadline - time.monotonic(), 1))
+            except Exception as e:
+                logger.warning(f"关闭浏览器池超时或出错: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.loop = None
+        self.thread = None
+        logger.info("监管器已停止")
+        return results
+
+    def _call(self, coro, timeout: float = None):
+        """在监管器事件循环中执行协程并等待结果"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return future.result(timeout=timeout)
+
+    # ==================== 任务控制 ====================
+
+    def start_task(self, task_id: str) -> bool:
+        """启动任务续期循环"""
+        if not self.loop:
+            self.start()
+        return self._call(self._start_task(task_id))
+
+    async def _start_task(self, task_id: str) -> bool:
+        if self.is_running(task_id):
+            return False
+
+        try:
+            renewer = MCHostRenewer(task_id=task_id, browser_pool=self.pool, scheduler=self.scheduler)
+        except SystemExit:
+            # MCHostRenewer 加载配置失败时会调用 sys.exit
+            logger.error(f"任务初始化失败: {task_id}")
+            return False
+
+        task = self.loop.create_task(self._guarded_run(task_id, renewer), name=f'renew-{task_id}')
+        self.tasks[task_id] = task
+        self.renewers[task_id] = renewer
+        return True
+
+    async def _guarded_run(self, task_id: str, renewer: MCHostRenewer):
+        """包装续期循环，单个任务的异常不影响其他任务；因错误退出时立即重启"""
+        crashed = False
+        try:
+            await renewer.run()
+            crashed = renewer.exit_reason == 'error'
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            logger.error(f"任务异常退出: {task_id} - {type(e).__name__}: {e}")
+            crashed = True
+        finally:
+            if self.tasks.get(task_id) is asyncio.current_task():
+                del self.tasks[task_id]
+                self.renewers.pop(task_id, None)
+                if crashed:
+                    self._schedule_restart(task_id, renewer)
+
+    def _schedule_restart(self, task_id: str, renewer: MCHostRenewer):
+        """
+        崩溃的任务立即重启，不等待任务管理器的存活检查；
+        5 分钟内连续崩溃时按 2、4、8…秒（最多 60 秒）退避
+        """
+        now = self.loop.time()
+        count, last_crash = self.crash_counts.get(task_id, (0, 0.0))
+        count = count + 1 if now - last_crash < 300 else 1
+        self.crash_counts[task_id] = (count, now)
+        self.restart_counts[task_id] = self.restart_counts.get(task_id, 0) + 1
+        delay = 0 if count == 1 else min(60, 2 ** (count - 1))
+
+        # 记录崩溃时间，新的续期循环在会话重新确认可用时记录恢复用时
+        renewer.update_status(recovering_since=datetime.now().isoformat())
+        logger.warning(f"⚡ 任务因错误退出，{delay} 秒后重启（5 分钟内第 {count} 次）: {task_id}")
+        self.restart_handles[task_id] = self.loop.call_later(
+            delay, lambda: self.loop.create_task(self._restart_crashed(task_id))
+        )
+
+    async def _restart_crashed(self, task_id: str):
+        self.restart_handles.pop(task_id, None)
+        if not self.is_running(task_id):
+            await self._start_task(task_id)
+
+    def stop_task(self, task_id: str, timeout: float = 5) -> bool:
+        """停止任务续期循环（取消后等待清理完成）"""
+        return task_id in self.stop_tasks([task_id], timeout=timeout)
+
+    def stop_tasks(self, task_ids, timeout: float = 5) -> Dict[str, dict]:
+        """
+        同时停止多个任务续期循环，在同一个截止时间内等待它们清理完成
+
+        Args:
+            task_ids: 任务ID列表
+            timeout: 总等待时间（秒）
+
+        Returns:
+            {task_id: {'seconds': 停止用时, 'killed': 是否超时未完成清理}}，未运行的任务不包含在内
+        """
+        if not self.loop:
+            return {}
+        # 比内部截止时间多留一点余量，避免跨线程等待先超时
+        return self._call(self._stop_tasks(list(task_ids), timeout), timeout=timeout + 5)
+
+    async def _stop_tasks(self, task_ids, timeout: float) -> Dict[str, dict]:
+        started = self.loop.time()
+        stopping = {}
+        for task_id in task_ids:
+            # 等待崩溃重启的任务直接取消重启
+            handle = self.restart_handles.pop(task_id, None)
+            if handle:
+                handle.cancel()
+            task = self.tasks.pop(task_id, None)
+            self.renewers.pop(task_id, None)
+            if task is None or task.done():
+                continue
+            task.cancel()
+            stopping[task_id] = task
+
+        if not stopping:
+            return {}
+
+        # 记录每个任务实际完成清理的时间
+        finished = {}
+        for task_id, task in stopping.items():
+            task.add_done_callback(lambda _, task_id=task_id: finished.setdefault(task_id, self.loop.time()))
+
+        _, pending = await asyncio.wait(stopping.values(), timeout=timeout)
+
+        results = {}
+        for task_id, task in stopping.items():
+            if task in pending:
+                logger.warning(f"⚠️ 任务未在 {timeout} 秒内完成清理: {task_id}")
+                results[task_id] = {'seconds': round(self.loop.time() - started, 2), 'killed': True}
+                continue
+            if not task.cancelled() and task.exception():
+                logger.warning(f"停止任务时出错: {task_id} - {task.exception()}")
+            results[task_id] = {'seconds': round(finished[task_id] - started, 2), 'killed': False}
+        return results
+
+    def stop_all(self, timeout: float = 30) -> Dict[str, dict]:
+        """同时停止所有任务"""
+        return self.stop_tasks(list(self.tasks.keys()) + list(self.restart_handles.keys()), timeout=timeout)
+
+    def is_running(self, task_id: str) -> bool:
+        """任务续期循环是否仍在运行（崩溃后等待重启的任务也视为运行中）"""
+        if task_id in self.restart_handles:
+            return True
+        task = self.tasks.get(task_id)
+        return task is not None and not task.done()
+
+    def pool_stats(self) -> dict:
+        """浏览器池状态（见 BrowserPool.stats）"""
+        return self.pool.stats() if self.pool else {}
+
+    def scheduler_metrics(self) -> dict:
+        """调度器统计（见 RenewScheduler.metrics）"""
+        if not self.loop:
+            return {}
+        return self._call(self._scheduler_metrics(), timeout=5)
+
+    async def _scheduler_metrics(self) -> dict:
+        return self.scheduler.metrics()
@@ -11,9 +11,19 @@ import sys
 import time
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 import subprocess
 import logging
+import random
+import threading
+
+from control_channel import send_command
+from cookie_check import credentials_mtime
+from fileutil import merge_json_file
+from launch_gate import startup_options
+from metrics import process_table, process_usage
+from manager_api import MANAGER_SOCKET_NAME, ManagerAPIServer, call, status_entry
+from task_store import EDITABLE_KEYS, TaskStore, default_db_path, new_task_config, strip_runtime_keys
 
 # 配置日志
 logging.basicConfig(
@@ -26,16 +36,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 影响续期脚本行为的全局设置（与任务内同名字段合并后生效）
+TASK_SETTING_KEYS = ('resource_blocking', 'screenshot')
+# 可在顶层设置默认值的任务字段（任务内设置时以任务为准）
+TASK_DEFAULT_KEYS = ('session_persistence',)
+
+# 只用于显示的任务字段：修改后不需要重启任务
+DISPLAY_KEYS = ('name', 'created_at')
+
 
 class TaskManager:
     """任务管理器"""
 
-    def __init__(self, config_path: str = None):
+    def __init__(self, config_path: str = None, run_mode: str = None):
         """
         初始化任务管理器
 
         Args:
-            config_path: 配置文件路径
+            config_path: tasks_config.json 路径（任务存储在同目录的 tasks_config.db，
+                         数据库不存在时从该文件导入）
+            run_mode: 运行模式 process（每任务一个进程）/ supervisor（单进程监管），
+                      默认读取配置文件中的 run_mode
         """
         self.base_dir = Path(__file__).parent
         self.config_path = Path(config_path) if config_path else self.base_dir / 'tasks_config.json'
@@ -45,32 +66,298 @@ class TaskManager:
         # 任务进程字典 {task_id: subprocess.Popen}
         self.processes: Dict[str, subprocess.Popen] = {}
 
-        # 加载配置
-        self.config = self.load_config()
+        # 任务存储（SQLite，每个任务一行）
+        self.store = TaskStore(default_db_path(self.config_path), json_path=self.config_path)
+        self.settings = self.store.get_settings()
+        logger.info(f"✓ 加载任务存储成功，共 {len(self.store.list_tasks())} 个任务")
+
+        # 运行模式
+        self.run_mode = run_mode or self.settings.get('run_mode', 'process')
+        if self.run_mode not in ('process', 'supervisor'):
+            logger.warning(f"未知的运行模式: {self.run_mode}，使用 process 模式")
+            self.run_mode = 'process'
+
+        # supervisor 模式下的单进程监管器（首次启动任务时创建）
+        self.supervisor = None
+
+        # 热加载：已生效的任务配置 {task_id: 生效配置}、已处理的配置版本号、
+        # tasks_config.json 的修改时间（检测手工编辑）
+        self.applied_configs: Dict[str, dict] = {}
+        self.config_revision = None
+        self.json_mtime = self._json_mtime()
+        # 上一次读取/导出的 tasks_config.json 内容（手工编辑后只合并相对它变化的部分）
+        self.json_snapshot = self._read_json()
+
+        # 守护进程模式：控制 API 线程和监控循环共用的锁、状态缓存 {task_id: status}、
+        # 被手动停止的任务（存活检查和配置协调不会自动拉起）
+        self.lock = threading.RLock()
+        self.status_cache: Dict[str, dict] = {}
+        self.held_tasks = set()
+        # 状态缓存版本：缓存内容变化时加一并唤醒等待变化的控制 API 请求（Web 界面的事件推送）
+        self.status_version = 0
+        self.status_changed = threading.Condition()
+
+        # 错峰启动：等待启动的任务（按紧急程度排序）和下一次允许启动的时间（monotonic）
+        self.start_queue: List[str] = []
+        self.next_start_at = 0.0
+
+        # process 模式崩溃重启：连续崩溃记录 {task_id: (次数, 最后崩溃时间)}、
+        # 退避中的任务 {task_id: 允许重启的时间（monotonic）}
+        self.crash_counts: Dict[str, tuple] = {}
+        self.crash_backoff: Dict[str, float] = {}
+
+        # 需要更新凭据、暂停自动重启的任务（只用于避免重复日志）
+        self.credential_waits = set()
+
+        # 监控循环重启任务的次数 {task_id: {原因: 次数}}（/metrics 输出）
+        self.restart_counts: Dict[str, Dict[str, int]] = {}
+
+    def get_supervisor(self):
+        """获取单进程监管器（supervisor 模式）"""
+        if self.supervisor is None:
+            # 延迟导入：process 模式下管理器本身不需要加载 Playwright
+            from supervisor import RenewSupervisor
+            self.supervisor = RenewSupervisor(
+                pool_size=self.settings.get('pool_size', 1),
+                workers=self.settings.get('scheduler', {}).get('workers', 2),
+                standby_size=self.settings.get('standby_contexts', 1)
+            )
+            self.supervisor.start()
+        return self.supervisor
+
+    def is_task_running(self, task_id: str) -> bool:
+        """任务是否正在运行"""
+        if self.run_mode == 'supervisor':
+            return self.supervisor is not None and self.supervisor.is_running(task_id)
+        return task_id in self.processes and self.processes[task_id].poll() is None
 
     def load_config(self) -> dict:
-        """加载配置文件"""
-        if not self.config_path.exists():
-            logger.warning(f"配置文件不存在: {self.config_path}")
-            return {"tasks": {}}
+        """以 tasks_config.json 格式返回当前配置"""
+        return self.store.load_config()
+
+    def import_config(self, path: Path) -> int:
+        """从 tasks_config.json 格式的文件导入（替换现有任务）"""
+        before = set(self.store.list_tasks())
+        count = self.store.import_json(path)
+        self.settings = self.store.get_settings()
+        logger.info(f"✓ 已导入 {count} 个任务: {path}")
+        removed = sorted(before - set(self.store.list_tasks()))
+        if removed:
+            logger.warning(f"导入的文件中没有这些任务，已删除: {', '.join(removed)}")
+        if Path(path).resolve() == self.config_path.resolve():
+            self.json_snapshot = self._read_json()
+        return count
+
+    def export_config(self, path: Path) -> int:
+        """导出为 tasks_config.json 格式"""
+        count = self.store.export_json(path)
+        logger.info(f"✓ 已导出 {count} 个任务: {path}")
+        if Path(path).resolve() == self.config_path.resolve():
+            self.json_snapshot = self._read_json()
+            self.json_mtime = self._json_mtime()
+        return count
+
+    def merge_config_file(self) -> dict:
+        """
+        合并 tasks_config.json 的手工修改（按任务ID，只应用文件中变化的任务和全局设置）
 
+        Returns:
+            store.merge_json 的结果
+        """
+        config = self._read_json(strict=True)
+        changes = self.store.merge_json(self.json_snapshot, config)
+        self.json_snapshot = config
+        self.settings = self.store.get_settings()
+
+        summary = ', '.join(f"{kind} {len(ids)}" for kind, ids in changes.items() if ids)
+        logger.info(f"✓ 已合并配置文件的修改: {summary or '无变化'}")
+        if changes['removed']:
+            logger.warning(f"配置文件中删除了这些任务，已从数据库删除: {', '.join(changes['removed'])}")
+        return changes
+
+    def _json_mtime(self) -> Optional[float]:
+        try:
+            return self.config_path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _read_json(self, strict: bool = False) -> dict:
+        """读取 tasks_config.json（strict=False 时不存在或损坏返回空配置）"""
         try:
             with open(self.config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-            logger.info(f"✓ 加载配置文件成功，共 {len(config.get('tasks', {}))} 个任务")
-            return config
-        except Exception as e:
-            logger.error(f"加载配置文件失败: {e}")
-            return {"tasks": {}}
+                return json.load(f)
+        except (OSError, ValueError):
+            if strict:
+                raise
+            return {}
+
+    def effective_config(self, task_config: dict) -> dict:
+        """任务实际生效的配置（合并全局设置，去掉 last_run 等运行时字段和显示字段）"""
+        effective = {
+            key: value for key, value in strip_runtime_keys(task_config).items()
+            if key not in DISPLAY_KEYS
+        }
+        for key in TASK_SETTING_KEYS:
+            if key in self.settings:
+                effective[key] = {**self.settings[key], **task_config.get(key, {})}
+        for key in TASK_DEFAULT_KEYS:
+            if key in self.settings:
+                effective.setdefault(key, self.settings[key])
+        return effective
+
+    def check_config_changes(self) -> bool:
+        """
+        检查配置是否变化，有变化时协调任务
+
+        无变化时只需读取一次配置版本号和 tasks_config.json 的修改时间，与任务数量无关
+
+        Returns:
+            是否执行了协调
+        """
+        json_mtime = self._json_mtime()
+        if json_mtime != self.json_mtime:
+            self.json_mtime = json_mtime
+            if json_mtime is not None:
+                logger.info(f"检测到配置文件被修改，合并修改: {self.config_path}")
+                try:
+                    self.merge_config_file()
+                except Exception as e:
+                    logger.error(f"合并配置文件失败: {e}")
+
+        if self.store.revision() == self.config_revision:
+            return False
+        self.reconcile()
+        return True
+
+    def reconcile(self) -> dict:
+        """
+        按当前配置协调任务：只启动新增的任务、只停止删除/禁用的任务、
+        只重启生效配置发生变化的任务，其他任务不受影响
+
+        Returns:
+            {'added': [...], 'removed': [...], 'changed': [...], 'elapsed_ms': ...}
+        """
+        started = time.perf_counter()
+        # 先记录版本号：协调期间发生的修改会在下一次检查时再处理
+        self.config_revision = self.store.revision()
+
+        old_run_mode = self.settings.get('run_mode', 'process')
+        self.settings = self.store.get_settings()
+        if self.settings.get('run_mode', 'process') != old_run_mode:
+            logger.warning("运行模式已修改，需重启任务管理器后生效")
+
+        desired = {
+            task_id: self.effective_config(task_config)
+            for task_id, task_config in self.store.list_tasks().items()
+            if task_config.get('enabled', True)
+        }
+        removed = [task_id for task_id in self.applied_configs if task_id not in desired]
+        added = [task_id for task_id in desired if task_id not in self.applied_configs]
+        changed = [
+            task_id for task_id in desired
+            if task_id in self.applied_configs and desired[task_id] != self.applied_configs[task_id]
+        ]
 
-    def save_config(self):
-        """保存配置文件"""
+        for task_id in removed:
+            self.held_tasks.discard(task_id)
+        # 手动停止的任务保持停止，下次手动启动时使用新配置
+        restarting = [task_id for task_id in changed if task_id not in self.held_tasks]
+
+        # 需要停止的任务（删除/禁用的和需要重启的）一起停止，再加入启动队列错峰启动
+        self.start_queue = [task_id for task_id in self.start_queue if task_id in desired]
+        self.stop_tasks(
+            [task_id for task_id in removed + restarting if self.is_task_running(task_id)],
+            timeout=self.settings.get('shutdown_timeout_seconds', 20)
+        )
+
+        self.applied_configs = desired
+        self.queue_starts(restarting + added)
+        self.drain_start_queue()
+        self.refresh_status()
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        if added or removed or changed:
+            logger.info(
+                f"🔄 配置已协调（版本 {self.config_revision}）: 新增 {len(added)}，停止 {len(removed)}，"
+                f"重启 {len(changed)}，未变 {len(desired) - len(added) - len(changed)}，用时 {elapsed_ms} ms"
+            )
+        else:
+            logger.info(f"配置无需协调（版本 {self.config_revision}），用时 {elapsed_ms} ms")
+        return {'added': added, 'removed': removed, 'changed': changed, 'elapsed_ms': elapsed_ms}
+
+    # ==================== 错峰启动 ====================
+
+    def start_urgency(self, task_id: str) -> float:
+        """
+        任务的启动紧急程度：距上次续期成功的时间 / 续期间隔
+
+        Returns:
+            越大越紧急；从未成功续期（或没有记录）的任务返回 inf
+        """
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=2, ensure_ascii=False)
-            logger.info("✓ 配置文件已保存")
-        except Exception as e:
-            logger.error(f"保存配置文件失败: {e}")
+            with open(self.get_task_dir(task_id) / 'status.json', 'r', encoding='utf-8') as f:
+                last_success = json.load(f).get('last_success')
+            elapsed = (datetime.now() - datetime.fromisoformat(last_success)).total_seconds()
+        except Exception:
+            return float('inf')
+
+        task_config = self.applied_configs.get(task_id, {})
+        interval = max(1, task_config.get('renew_interval_minutes', 15)) * 60
+        return elapsed / interval
+
+    def queue_starts(self, task_ids: list):
+        """将任务加入启动队列，队列按紧急程度重新排序（最紧急的先启动）"""
+        queued = set(self.start_queue)
+        new_ids = [task_id for task_id in task_ids if task_id not in queued]
+        if not new_ids:
+            return
+        if not self.start_queue:
+            self.next_start_at = max(self.next_start_at, time.monotonic())
+
+        urgency = {task_id: self.start_urgency(task_id) for task_id in self.start_queue + new_ids}
+        self.start_queue = sorted(urgency, key=urgency.get, reverse=True)
+        if len(self.start_queue) > 1:
+            startup = startup_options(self.settings.get('startup'))
+            logger.info(
+                f"🚦 {len(self.start_queue)} 个任务等待启动，"
+                f"每 {startup['ramp_interval_seconds']} 秒启动一个（按逾期程度排序）"
+            )
+
+    def seconds_until_next_start(self) -> Optional[float]:
+        """距下一次错峰启动的秒数（队列为空时返回 None）"""
+        if not self.start_queue:
+            return None
+        return max(0.0, self.next_start_at - time.monotonic())
+
+    def drain_start_queue(self) -> list:
+        """
+        启动队列中已到时间的任务（每次启动后等待 ramp_interval_seconds 加随机抖动）
+
+        Returns:
+            本次启动的任务ID列表
+        """
+        started = []
+        while self.start_queue and time.monotonic() >= self.next_start_at:
+            task_id = self.start_queue.pop(0)
+            # 排队期间被删除/禁用、手动停止或已经启动的任务跳过
+            if (task_id not in self.applied_configs or task_id in self.held_tasks
+                    or self.is_task_running(task_id)):
+                continue
+
+            self.start_task(task_id)
+            started.append(task_id)
+            startup = startup_options(self.settings.get('startup'))
+            self.next_start_at = (time.monotonic() + startup['ramp_interval_seconds']
+                                  + random.uniform(0, startup['jitter_seconds']))
+
+        if started:
+            self.refresh_status(started)
+        return started
+
+    def run_start_queue(self):
+        """阻塞直到启动队列中的任务全部启动（交互模式使用）"""
+        while self.start_queue:
+            time.sleep(self.seconds_until_next_start() or 0)
+            self.drain_start_queue()
 
     def get_task_dir(self, task_id: str) -> Path:
         """获取任务目录"""
@@ -80,7 +367,7 @@ class TaskManager:
 
     def get_task_config(self, task_id: str) -> Optional[dict]:
         """获取任务配置"""
-        return self.config.get('tasks', {}).get(task_id)
+        return self.store.get_task(task_id)
 
     def add_task(self, task_id: str, name: str, mchost_url: str,
                  renew_interval_minutes: int = 15) -> bool:
@@ -96,27 +383,14 @@ class TaskManager:
         Returns:
             是否添加成功
         """
-        if task_id in self.config.get('tasks', {}):
+        if not self.store.add_task(task_id, new_task_config(name, mchost_url, renew_interval_minutes)):
             logger.error(f"任务ID已存在: {task_id}")
             return False
 
-        if 'tasks' not in self.config:
-            self.config['tasks'] = {}
-
-        self.config['tasks'][task_id] = {
-            'name': name,
-            'mchost_url': mchost_url,
-            'renew_interval_minutes': renew_interval_minutes,
-            'enabled': True,
-            'created_at': datetime.now().isoformat(),
-            'last_run': None
-        }
-
         # 创建任务目录
         task_dir = self.get_task_dir(task_id)
         (task_dir / 'screenshots').mkdir(exist_ok=True)
 
-        self.save_config()
         logger.info(f"✓ 添加任务成功: {task_id} ({name})")
         return True
 
@@ -131,15 +405,11 @@ class TaskManager:
         Returns:
             是否更新成功
         """
-        if task_id not in self.config.get('tasks', {}):
+        fields = {key: value for key, value in kwargs.items() if key in EDITABLE_KEYS}
+        if self.store.update_task(task_id, **fields) is None:
             logger.error(f"任务不存在: {task_id}")
             return False
 
-        for key, value in kwargs.items():
-            if key in ['name', 'mchost_url', 'renew_interval_minutes', 'enabled']:
-                self.config['tasks'][task_id][key] = value
-
-        self.save_config()
         logger.info(f"✓ 更新任务配置成功: {task_id}")
         return True
 
@@ -153,7 +423,7 @@ class TaskManager:
         Returns:
             是否删除成功
         """
-        if task_id not in self.config.get('tasks', {}):
+        if not self.get_task_config(task_id):
             logger.error(f"任务不存在: {task_id}")
             return False
 
@@ -161,8 +431,7 @@ class TaskManager:
         self.stop_task(task_id)
 
         # 删除配置
-        del self.config['tasks'][task_id]
-        self.save_config()
+        self.store.delete_task(task_id)
 
         logger.info(f"✓ 删除任务成功: {task_id}")
         return True
@@ -186,11 +455,16 @@ class TaskManager:
             logger.warning(f"任务已禁用: {task_id}")
             return False
 
+        # 手动启动后恢复自动拉起
+        self.held_tasks.discard(task_id)
+
         # 检查是否已经在运行
-        if task_id in self.processes:
-            if self.processes[task_id].poll() is None:
-                logger.warning(f"任务已在运行: {task_id}")
-                return False
+        if self.is_task_running(task_id):
+            logger.warning(f"任务已在运行: {task_id}")
+            return False
+
+        if self.run_mode == 'supervisor':
+            return self._start_supervised_task(task_id)
 
         # 启动任务进程
         try:
@@ -212,9 +486,8 @@ class TaskManager:
 
             self.processes[task_id] = process
 
-            # 更新最后运行时间
-            self.config['tasks'][task_id]['last_run'] = datetime.now().isoformat()
-            self.save_config()
+            # 更新最后运行时间（只写该任务一行）
+            self.store.update_task(task_id, last_run=datetime.now().isoformat())
 
             logger.info(f"✓ 启动任务成功: {task_id} (PID: {process.pid})")
             return True
@@ -223,42 +496,113 @@ class TaskManager:
             logger.error(f"启动任务失败: {task_id} - {e}")
             return False
 
-    def stop_task(self, task_id: str) -> bool:
+    def _start_supervised_task(self, task_id: str) -> bool:
+        """在单进程监管器中启动任务（supervisor 模式）"""
+        try:
+            if not self.get_supervisor().start_task(task_id):
+                logger.error(f"启动任务失败: {task_id}")
+                return False
+
+            self.store.update_task(task_id, last_run=datetime.now().isoformat())
+
+            logger.info(f"✓ 启动任务成功: {task_id} (supervisor)")
+            return True
+        except Exception as e:
+            logger.error(f"启动任务失败: {task_id} - {e}")
+            return False
+
+    def stop_task(self, task_id: str, hold: bool = False) -> bool:
         """
         停止任务
 
         Args:
             task_id: 任务ID
+            hold: 保持停止状态（手动停止：存活检查和配置协调不会自动重新启动）
 
         Returns:
             是否停止成功
         """
-        if task_id not in self.processes:
+        if hold:
+            self.held_tasks.add(task_id)
+
+        if not self.is_task_running(task_id) and task_id not in self.processes:
             logger.warning(f"任务未运行: {task_id}")
             return False
 
-        process = self.processes[task_id]
-
         try:
-            # 发送终止信号
-            process.terminate()
-
-            # 等待进程结束（最多5秒）
-            try:
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                # 强制杀死
-                process.kill()
-                process.wait()
-
-            del self.processes[task_id]
-            logger.info(f"✓ 停止任务成功: {task_id}")
-            return True
-
+            return task_id in self.stop_tasks([task_id], timeout=5)
         except Exception as e:
             logger.error(f"停止任务失败: {task_id} - {e}")
             return False
 
+    def stop_tasks(self, task_ids, timeout: float = 5) -> Dict[str, dict]:
+        """
+        同时停止多个任务：先向所有任务发送终止信号，在同一个截止时间内一起等待退出，
+        超时未退出的强制结束（SIGKILL）
+
+        Args:
+            task_ids: 任务ID列表
+            timeout: 总等待时间（秒），与任务数量无关
+
+        Returns:
+            {task_id: {'seconds': 停止用时, 'killed': 是否被强制结束}}，未运行的任务不包含在内
+        """
+        started = time.monotonic()
+
+        if self.run_mode == 'supervisor':
+            results = self.supervisor.stop_tasks(task_ids, timeout=timeout) if self.supervisor else {}
+        else:
+            results = self._stop_processes(task_ids, timeout)
+
+        for task_id, result in results.items():
+            note = '，已强制结束' if result['killed'] else ''
+            logger.info(f"✓ 停止任务成功: {task_id}（{result['seconds']} 秒{note}）")
+        if len(results) > 1:
+            killed = sum(1 for result in results.values() if result['killed'])
+            logger.info(
+                f"⏹️ 已停止 {len(results)} 个任务，总用时 {time.monotonic() - started:.2f} 秒"
+                f"（强制结束 {killed} 个）"
+            )
+        return results
+
+    def _stop_processes(self, task_ids, timeout: float) -> Dict[str, dict]:
+        started = time.monotonic()
+        deadline = started + timeout
+
+        # 同时发送终止信号
+        pending = {}
+        for task_id in task_ids:
+            process = self.processes.get(task_id)
+            if process is None:
+                continue
+            try:
+                process.terminate()
+            except OSError:
+                pass
+            pending[task_id] = process
+
+        # 一起等待退出
+        results = {}
+        while pending and time.monotonic() < deadline:
+            for task_id, process in list(pending.items()):
+                if process.poll() is not None:
+                    results[task_id] = {'seconds': round(time.monotonic() - started, 2), 'killed': False}
+                    del pending[task_id]
+            if pending:
+                time.sleep(0.05)
+
+        # 超时未退出：强制杀死
+        for task_id, process in pending.items():
+            logger.warning(f"⚠️ 任务未在 {timeout} 秒内退出，强制结束: {task_id}")
+            process.kill()
+        for task_id, process in pending.items():
+            process.wait()
+            results[task_id] = {'seconds': round(time.monotonic() - started, 2), 'killed': True}
+
+        for task_id in results:
+            self.processes.pop(task_id, None)
+        return results
+
     def restart_task(self, task_id: str) -> bool:
         """
         重启任务
@@ -270,8 +614,8 @@ class TaskManager:
             是否重启成功
         """
         logger.info(f"重启任务: {task_id}")
+        # stop_task 会等到任务真正退出后才返回
         self.stop_task(task_id)
-        time.sleep(1)
         return self.start_task(task_id)
 
     def get_task_status(self, task_id: str) -> dict:
@@ -287,11 +631,16 @@ class TaskManager:
         task_config = self.get_task_config(task_id)
         if not task_config:
             return {'error': '任务不存在'}
+        return self._build_status(task_id, task_config)
 
+    def _build_status(self, task_id: str, task_config: dict) -> dict:
         is_running = False
         pid = None
 
-        if task_id in self.processes:
+        if self.run_mode == 'supervisor':
+            is_running = self.is_task_running(task_id)
+            pid = os.getpid() if is_running else None
+        elif task_id in self.processes:
             process = self.processes[task_id]
             if process.poll() is None:
                 is_running = True
@@ -300,35 +649,162 @@ class TaskManager:
                 # 进程已结束，清理
                 del self.processes[task_id]
 
-        return {
-            'task_id': task_id,
-            'name': task_config.get('name'),
-            'enabled': task_config.get('enabled', True),
-            'running': is_running,
-            'pid': pid,
-            'mchost_url': task_config.get('mchost_url'),
-            'renew_interval_minutes': task_config.get('renew_interval_minutes'),
-            'created_at': task_config.get('created_at'),
-            'last_run': task_config.get('last_run')
-        }
+        return status_entry(task_id, task_config, is_running, pid)
 
     def get_all_tasks_status(self) -> list:
         """获取所有任务状态"""
         return [
-            self.get_task_status(task_id)
-            for task_id in self.config.get('tasks', {}).keys()
+            self._build_status(task_id, task_config)
+            for task_id, task_config in self.store.list_tasks().items()
         ]
 
+    # ==================== 状态缓存（守护进程模式） ====================
+
+    def refresh_status(self, task_ids: list = None):
+        """
+        重建状态缓存（控制 API 的状态查询直接读取缓存）
+
+        Args:
+            task_ids: 只刷新这些任务（None 表示全部）
+        """
+        previous = self.status_cache
+        if task_ids is None:
+            self.status_cache = {status['task_id']: status for status in self.get_all_tasks_status()}
+        else:
+            self.status_cache = dict(previous)
+            for task_id in task_ids:
+                task_config = self.get_task_config(task_id)
+                if task_config:
+                    self.status_cache[task_id] = self._build_status(task_id, task_config)
+                else:
+                    self.status_cache.pop(task_id, None)
+        if self.status_cache != previous:
+            self._status_updated()
+
+    def refresh_running_states(self):
+        """只更新缓存中的运行状态（监控循环每次检查时调用，不读取配置）"""
+        changed = False
+        for task_id, status in list(self.status_cache.items()):
+            running = self.is_task_running(task_id)
+            if running != status['running']:
+                pid = None
+                if running:
+                    pid = os.getpid() if self.run_mode == 'supervisor' else self.processes[task_id].pid
+                self.status_cache[task_id] = {**status, 'running': running, 'pid': pid}
+                changed = True
+        if changed:
+            self._status_updated()
+
+    def _status_updated(self):
+        """状态缓存已变化：版本加一并唤醒等待者"""
+        with self.status_changed:
+            self.status_version += 1
+            self.status_changed.notify_all()
+
+    def cached_status(self, task_id: str = None):
+        """从缓存读取状态（不加锁、不调用 poll()、不读取配置）"""
+        if task_id is None:
+            return list(self.status_cache.values())
+        return self.status_cache.get(task_id, {'error': '任务不存在'})
+
+    def wait_status(self, since, timeout: float) -> int:
+        """
+        等待状态缓存变化（不持有管理器锁）
+
+        Args:
+            since: 调用方已知的版本（None 表示不等待，直接返回当前版本）
+            timeout: 最长等待秒数
+
+        Returns:
+            当前版本（超时未变化时与 since 相同）
+        """
+        with self.status_changed:
+            self.status_changed.wait_for(lambda: self.status_version != since, timeout=timeout)
+            return self.status_version
+
     def start_all_enabled_tasks(self):
-        """启动所有已启用的任务"""
-        for task_id, task_config in self.config.get('tasks', {}).items():
-            if task_config.get('enabled', True):
-                self.start_task(task_id)
+        """启动所有已启用的任务（并记录为已生效的配置）"""
+        self.reconcile()
 
-    def stop_all_tasks(self):
-        """停止所有任务"""
-        for task_id in list(self.processes.keys()):
-            self.stop_task(task_id)
+    def stop_all_tasks(self, timeout: float = None) -> Dict[str, dict]:
+        """
+        同时停止所有任务
+
+        Args:
+            timeout: 总截止时间（秒），默认读取配置 shutdown_timeout_seconds（20 秒），
+                     应小于 systemd 的停止超时（默认 90 秒）
+
+        Returns:
+            各任务的停止结果（见 stop_tasks）
+        """
+        timeout = timeout or self.settings.get('shutdown_timeout_seconds', 20)
+        self.start_queue.clear()
+
+        if self.run_mode != 'supervisor':
+            return self.stop_tasks(list(self.processes.keys()), timeout=timeout)
+
+        # supervisor 模式：停止所有续期循环并关闭共享浏览器池
+        if not self.supervisor:
+            return {}
+        started = time.monotonic()
+        results = self.supervisor.shutdown(timeout=timeout)
+        self.supervisor = None
+        for task_id, result in results.items():
+            note = '，未完成清理' if result['killed'] else ''
+            logger.info(f"✓ 停止任务成功: {task_id}（{result['seconds']} 秒{note}）")
+        logger.info(f"⏹️ 已停止 {len(results)} 个任务，总用时 {time.monotonic() - started:.2f} 秒")
+        return results
+
+    def scheduler_metrics(self) -> dict:
+        """
+        续期调度统计：队列深度、延迟（实际开始 - 计划开始）和槽位占用率
+
+        supervisor 模式返回共享调度器的统计；process 模式下每个任务进程独立调度，没有全局统计
+        """
+        if self.run_mode != 'supervisor':
+            return {'error': 'process 模式下每个任务独立调度，没有全局调度统计（使用 --mode supervisor）'}
+        if not self.supervisor:
+            return {'error': '监管器未启动'}
+        return {**self.supervisor.scheduler_metrics(), 'browser_pool': self.supervisor.pool_stats()}
+
+    def count_restart(self, task_id: str, reason: str):
+        """记录一次自动重启（crash：进程异常退出；exited：续期循环/进程已退出；not_running：未在运行）"""
+        counts = self.restart_counts.setdefault(task_id, {})
+        counts[reason] = counts.get(reason, 0) + 1
+
+    def process_metrics(self) -> dict:
+        """
+        运行指标（Web 界面 /metrics 使用）：重启次数、进程资源占用、调度统计
+
+        process 模式按任务统计任务进程和其浏览器子进程；supervisor 模式所有任务在守护进程内，
+        只统计守护进程和共享浏览器（task 为空）
+        """
+        restarts = {task_id: dict(counts) for task_id, counts in dict(self.restart_counts).items()}
+        if self.supervisor:
+            for task_id, count in dict(self.supervisor.restart_counts).items():
+                counts = restarts.setdefault(task_id, {})
+                counts['crash'] = counts.get('crash', 0) + count
+
+        # 每次抓取只扫描一遍 /proc
+        processes = {}
+        try:
+            table = process_table()
+        except OSError:
+            table = {}
+        if self.run_mode == 'supervisor':
+            usage = process_usage(os.getpid(), table)
+            if usage:
+                processes[''] = usage
+        else:
+            for task_id, process in dict(self.processes).items():
+                usage = process_usage(process.pid, table)
+                if usage:
+                    processes[task_id] = usage
+
+        result = {'restarts': restarts, 'processes': processes}
+        if self.run_mode == 'supervisor' and self.supervisor:
+            result['scheduler'] = self.supervisor.scheduler_metrics()
+        return result
 
     def trigger_action(self, task_id: str, action: str, **kwargs) -> bool:
         """
@@ -348,7 +824,6 @@ class TaskManager:
             return False
 
         task_dir = self.get_task_dir(task_id)
-        trigger_file = task_dir / 'trigger.json'
 
         trigger_data = {
             'action': action,
@@ -359,22 +834,20 @@ class TaskManager:
         if action == 'renew_delayed' and 'delay_minutes' in kwargs:
             trigger_data['delay_minutes'] = kwargs['delay_minutes']
 
+        # 优先通过控制通道推送给运行中的任务
+        if send_command(task_dir / 'control.sock', trigger_data):
+            logger.info(f"✓ 触发命令已送达: {task_id} - {action}")
+            return True
+
+        # 任务未运行：写入触发文件，任务启动时处理
+        trigger_file = task_dir / 'trigger.json'
         try:
-            logger.info(f"📝 创建触发文件: {trigger_file}")
-            logger.info(f"📝 触发动作: {action}")
+            logger.info(f"📝 控制通道不可用，创建触发文件: {trigger_file}")
 
             with open(trigger_file, 'w', encoding='utf-8') as f:
                 json.dump(trigger_data, f, indent=2)
 
-            # 验证文件是否创建成功
-            if trigger_file.exists():
-                logger.info(f"✓ 触发文件创建成功: {task_id} - {action}")
-                logger.info(f"✓ 文件路径: {trigger_file}")
-                logger.info(f"✓ 文件大小: {trigger_file.stat().st_size} bytes")
-            else:
-                logger.error(f"✗ 触发文件创建失败，文件不存在")
-                return False
-
+            logger.info(f"✓ 触发文件创建成功: {task_id} - {action}")
             return True
         except Exception as e:
             logger.error(f"触发任务操作失败: {task_id} - {e}")
@@ -385,44 +858,188 @@ class TaskManager:
         """持续运行，监控任务状态"""
         logger.info("任务管理器启动")
 
+        # 控制 API（Web 界面和命令行通过它查询状态、启动/停止/触发任务）
+        self.refresh_status()
+        api_server = ManagerAPIServer(self, self.base_dir / MANAGER_SOCKET_NAME)
+        api_server.start()
+
         # 启动所有已启用的任务
-        self.start_all_enabled_tasks()
+        with self.lock:
+            self.start_all_enabled_tasks()
 
         # 注册信号处理
         def signal_handler(sig, frame):
             logger.info("收到停止信号，正在停止所有任务...")
-            self.stop_all_tasks()
+            api_server.close()
+            with self.lock:
+                self.stop_all_tasks()
             sys.exit(0)
 
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
 
+        # 配置变化检查间隔（秒）；任务存活检查每30秒一次
+        check_interval = self.settings.get('config_check_seconds', 2)
+        last_health_check = time.monotonic()
+
         # 监控循环
         try:
             while True:
-                time.sleep(30)  # 每30秒检查一次
-
-                # 检查已启用但未运行的任务
-                for task_id, task_config in self.config.get('tasks', {}).items():
-                    if not task_config.get('enabled', True):
+                # 启动队列非空时提前醒来，按错峰间隔启动下一个任务
+                wait = self.seconds_until_next_start()
+                time.sleep(check_interval if wait is None else min(check_interval, wait))
+
+                with self.lock:
+                    # 热加载：配置变化时只处理受影响的任务
+                    self.check_config_changes()
+                    if self.run_mode != 'supervisor':
+                        self._reap_crashed_processes()
+                    self.drain_start_queue()
+                    self.refresh_running_states()
+
+                    if time.monotonic() - last_health_check < 30:
                         continue
-
-                    # 检查进程是否还在运行
-                    if task_id in self.processes:
-                        if self.processes[task_id].poll() is not None:
-                            # 进程已结束，重新启动
-                            logger.warning(f"任务已停止，正在重启: {task_id}")
-                            del self.processes[task_id]
-                            self.start_task(task_id)
-                    else:
-                        # 任务未运行，启动它
-                        logger.info(f"启动任务: {task_id}")
-                        self.start_task(task_id)
+                    last_health_check = time.monotonic()
+                    self._restart_dead_tasks()
+                    self.refresh_status()
 
         except Exception as e:
             logger.error(f"监控循环异常: {e}")
+            api_server.close()
             self.stop_all_tasks()
 
+    def _reap_crashed_processes(self):
+        """
+        发现异常退出（退出码非零）的任务进程后立即加入启动队列，不等待 30 秒的存活检查；
+        5 分钟内连续崩溃时按 2、4、8…秒（最多 60 秒）退避。正常退出（如会话失效）的任务仍由存活检查处理
+        """
+        now = time.monotonic()
+        crashed = []
+        for task_id, process in list(self.processes.items()):
+            returncode = process.poll()
+            if returncode is None or returncode == 0:
+                continue
+            del self.processes[task_id]
+            if task_id in self.held_tasks or task_id not in self.applied_configs:
+                continue
+
+            count, last_crash = self.crash_counts.get(task_id, (0, 0.0))
+            count = count + 1 if now - last_crash < 300 else 1
+            self.crash_counts[task_id] = (count, now)
+            delay = 0 if count == 1 else min(60, 2 ** (count - 1))
+            logger.warning(f"⚡ 任务进程异常退出（退出码 {returncode}），{delay} 秒后重启（5 分钟内第 {count} 次）: {task_id}")
+
+            # 记录崩溃时间，新进程在会话重新确认可用时记录恢复用时
+            try:
+                merge_json_file(self.get_task_dir(task_id) / 'status.json',
+                                {'recovering_since': datetime.now().isoformat()})
+            except Exception as e:
+                logger.warning(f"记录崩溃时间失败: {task_id} - {e}")
+            self.crash_backoff[task_id] = now + delay
+            self.count_restart(task_id, 'crash')
+
+        for task_id, not_before in list(self.crash_backoff.items()):
+            if now >= not_before:
+                del self.crash_backoff[task_id]
+                if task_id in self.applied_configs and task_id not in self.held_tasks:
+                    crashed.append(task_id)
+        if crashed:
+            self.queue_starts(crashed)
+            self.drain_start_queue()
+
+    def waiting_for_credentials(self, task_id: str) -> bool:
+        """
+        任务是否被续期脚本标记为需要更新凭据（status.json 的 needs_credentials），
+        且之后 cookies.json / storage_state.json 没有更新
+        """
+        task_dir = self.get_task_dir(task_id)
+        try:
+            with open(task_dir / 'status.json', 'r', encoding='utf-8') as f:
+                mark = json.load(f).get('needs_credentials')
+        except Exception:
+            return False
+        if not mark:
+            return False
+
+        mtime = credentials_mtime(task_dir / 'cookies.json', task_dir / 'storage_state.json')
+        marked_mtime = mark.get('credentials_mtime')
+        if mtime is not None and (marked_mtime is None or mtime > marked_mtime):
+            return False
+        return True
+
+    def _restart_dead_tasks(self):
+        """将已启用但未运行的任务加入启动队列（手动停止和已在排队的任务除外）"""
+        queued = set(self.start_queue)
+        dead = []
+        waiting = set()
+        for task_id, task_config in self.store.list_tasks().items():
+            if (not task_config.get('enabled', True) or task_id in self.held_tasks
+                    or task_id in queued or task_id in self.crash_backoff):
+                continue
+
+            # supervisor 模式：续期循环退出后重新启动
+            if self.run_mode == 'supervisor':
+                if self.is_task_running(task_id):
+                    continue
+                message = f"任务未运行，等待重新启动: {task_id}"
+                reason = 'exited'
+            # 检查进程是否还在运行
+            elif task_id in self.processes:
+                if self.processes[task_id].poll() is None:
+                    continue
+                # 进程已结束，重新启动
+                del self.processes[task_id]
+                message = f"任务已停止，等待重新启动: {task_id}"
+                reason = 'exited'
+            else:
+                # 任务未运行，启动它
+                message = f"任务未运行，等待启动: {task_id}"
+                reason = 'not_running'
+
+            # 需要更新凭据的任务在 cookies 更新之前不再启动（否则每次都要启动浏览器才发现会话失效）
+            if self.waiting_for_credentials(task_id):
+                waiting.add(task_id)
+                if task_id not in self.credential_waits:
+                    logger.warning(f"🔑 任务需要更新凭据，更新 cookies 前暂停自动重启: {task_id}")
+                continue
+            if task_id in self.credential_waits:
+                logger.info(f"🔑 检测到凭据更新，重新启动任务: {task_id}")
+            else:
+                logger.warning(message)
+            self.count_restart(task_id, reason)
+            dead.append(task_id)
+
+        self.credential_waits = waiting
+        self.queue_starts(dead)
+        self.drain_start_queue()
+
+
+def run_ctl(argv: list) -> int:
+    """
+    命令行客户端：向守护进程的控制 API 发送一条命令并打印回复
+
+    Returns:
+        进程退出码
+    """
+    command, rest = argv[0], argv[1:]
+    request = {'command': command}
+    if rest:
+        request['task_id'] = rest[0]
+    if command == 'trigger':
+        if len(rest) < 2:
+            print("用法: --ctl trigger ID ACTION [DELAY_MINUTES]")
+            return 2
+        request['action'] = rest[1]
+        if len(rest) > 2:
+            request['delay_minutes'] = int(rest[2])
+
+    reply = call(Path(__file__).parent / MANAGER_SOCKET_NAME, request)
+    if reply is None:
+        print("任务管理器守护进程未运行（task_manager.py --daemon）")
+        return 1
+    print(json.dumps(reply, indent=2, ensure_ascii=False))
+    return 0 if reply.get('ok') else 1
+
 
 def main():
     """主函数"""
@@ -431,10 +1048,29 @@ def main():
     parser = argparse.ArgumentParser(description='MCHost 多任务管理器')
     parser.add_argument('--config', type=str, help='配置文件路径')
     parser.add_argument('--daemon', action='store_true', help='以守护进程模式运行')
+    parser.add_argument('--mode', choices=['process', 'supervisor'],
+                        help='运行模式：process 每任务一个进程 / supervisor 单进程运行所有任务')
+    parser.add_argument('--import-json', type=str, metavar='PATH',
+                        help='从 tasks_config.json 格式的文件导入任务（替换现有任务）后退出')
+    parser.add_argument('--export-json', type=str, metavar='PATH',
+                        help='将任务导出为 tasks_config.json 格式后退出')
+    parser.add_argument('--ctl', nargs='+', metavar='COMMAND',
+                        help='向运行中的守护进程发送命令后退出：status [ID] / start ID / stop ID / '
+                             'restart ID / trigger ID ACTION [DELAY_MINUTES] / reload / scheduler')
 
     args = parser.parse_args()
 
-    manager = TaskManager(config_path=args.config)
+    if args.ctl:
+        sys.exit(run_ctl(args.ctl))
+
+    manager = TaskManager(config_path=args.config, run_mode=args.mode)
+
+    if args.import_json or args.export_json:
+        if args.import_json:
+            manager.import_config(Path(args.import_json))
+        if args.export_json:
+            manager.export_config(Path(args.export_json))
+        return
 
     if args.daemon:
         manager.run_forever()
@@ -442,10 +1078,10 @@ def main():
         # 交互模式
         print("MCHost 任务管理器")
         print("=" * 50)
-        manager.start_all_enabled_tasks()
-        print("\n按 Ctrl+C 停止所有任务并退出")
-
         try:
+            manager.start_all_enabled_tasks()
+            manager.run_start_queue()
+            print("\n按 Ctrl+C 停止所有任务并退出")
             signal.pause()
         except KeyboardInterrupt:
             print("\n正在停止所有任务...")
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+MCHost 任务存储
+SQLite（WAL 模式）保存任务配置：每个任务一行，按行原子更新，读写互不阻塞；
+兼容 tasks_config.json 格式的导入和导出
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0);
+'''
+
+
+# 运行时记录的字段：修改它们不算配置变化（不增加版本号）
+RUNTIME_KEYS = ('last_run',)
+
+
+def strip_runtime_keys(task_config: dict) -> dict:
+    """去掉运行时字段，只保留影响任务行为的配置"""
+    return {key: value for key, value in task_config.items() if key not in RUNTIME_KEYS}
+
+
+# 允许通过 Web 界面/管理器修改的任务字段
+EDITABLE_KEYS = ('name', 'mchost_url', 'renew_interval_minutes', 'enabled', 'manual_mode')
+
+
+def new_task_config(name: str, mchost_url: str, renew_interval_minutes: int = 15) -> dict:
+    """新任务的默认配置"""
+    return {
+        'name': name,
+        'mchost_url': mchost_url,
+        'renew_interval_minutes': renew_interval_minutes,
+        'enabled': True,
+        'created_at': datetime.now().isoformat(),
+        'last_run': None
+    }
+
+
+def default_db_path(json_path: Path) -> Path:
+    """tasks_config.json 对应的数据库路径（同目录的 tasks_config.db）"""
+    return Path(json_path).with_suffix('.db')
+
+
+class TaskStore:
+    """任务配置存储"""
+
+    def __init__(self, db_path: Path, json_path: Path = None):
+        """
+        打开任务存储
+
+        Args:
+            db_path: SQLite 数据库路径
+            json_path: tasks_config.json 路径；数据库不存在时自动从该文件导入
+        """
+        self.db_path = Path(db_path)
+        self.json_path = Path(json_path) if json_path else None
+        # 每个线程独立连接（sqlite3 连接不能跨线程共享）
+        self._local = threading.local()
+
+        is_new = not self.db_path.exists()
+        self._conn().executescript(SCHEMA)
+
+        if is_new and self.json_path and self.json_path.exists():
+            count = self.import_json(self.json_path)
+            logger.info(f"✓ 已从 {self.json_path.name} 导入 {count} 个任务")
+
+    # ==================== 连接和事务 ====================
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None：自动提交，写操作显式使用 BEGIN IMMEDIATE
+            conn = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._conn())
+
+    @staticmethod
+    def _bump_revision(conn):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ==================== 读取 ====================
+
+    def revision(self) -> int:
+        """配置版本号（每次修改配置加一，用于检测配置变化）"""
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return row[0] if row else 0
+
+    def get_task(self, task_id: str) -> Optional[dict]:
+        """读取单个任务配置，不存在时返回 None"""
+        row = self._conn().execute('SELECT data FROM tasks WHERE task_id = ?', (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_tasks(self) -> dict:
+        """读取所有任务配置 {task_id: config}（按添加顺序）"""
+        rows = self._conn().execute('SELECT task_id, data FROM tasks ORDER BY rowid').fetchall()
+        return {task_id: json.loads(data) for task_id, data in rows}
+
+    def get_settings(self) -> dict:
+        """读取全局设置（run_mode、pool_size、resource_blocking 等）"""
+        rows = self._conn().execute('SELECT key, value FROM settings').fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def get_setting(self, key: str, default=None):
+        row = self._conn().execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def load_config(self) -> dict:
+        """以 tasks_config.json 格式返回全部配置"""
+        return {**self.get_settings(), 'tasks': self.list_tasks()}
+
+    # ==================== 写入 ====================
+
+    def add_task(self, task_id: str, task_config: dict) -> bool:
+        """
+        添加任务
+
+        Returns:
+            任务ID已存在时返回 False
+        """
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    'INSERT INTO tasks (task_id, data, updated_at) VALUES (?, ?, ?)',
+                    (task_id, json.dumps(task_config, ensure_ascii=False), datetime.now().isoformat())
+                )
+                self._bump_revision(conn)
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def modify_task(self, task_id: str, func: Callable[[dict], None]) -> Optional[dict]:
+        """
+        在同一事务内读取、修改并写回任务配置（读-改-写不会丢失并发更新）
+
+        Args:
+            task_id: 任务ID
+            func: 原地修改任务配置 dict 的函数
+
+        Returns:
+            修改后的配置；任务不存在时返回 None
+        """
+        with self._transaction() as conn:
+            row = conn.execute('SELECT data FROM tasks WHERE task_id = ?', (task_id,)).fetchone()
+            if not row:
+                return None
+            task_config = json.loads(row[0])
+            before = strip_runtime_keys(task_config)
+            func(task_config)
+            conn.execute(
+                'UPDATE tasks SET data = ?, updated_at = ? WHERE task_id = ?',
+                (json.dumps(task_config, ensure_ascii=False), datetime.now().isoformat(), task_id)
+            )
+            # 只更新 last_run 等运行时字段时不通知配置变化
+            if strip_runtime_keys(task_config) != before:
+                self._bump_revision(conn)
+        return task_config
+
+    def update_task(self, task_id: str, **fields) -> Optional[dict]:
+        """更新任务的若干字段，返回更新后的配置（任务不存在时返回 None）"""
+        return self.modify_task(task_id, lambda task_config: task_config.update(fields))
+
+    def delete_task(self, task_id: str) -> bool:
+        """删除任务，任务不存在时返回 False"""
+        with self._transaction() as conn:
+            deleted = conn.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,)).rowcount
+            if deleted:
+                self._bump_revision(conn)
+        return bool(deleted)
+
+    def set_setting(self, key: str, value):
+        """写入全局设置"""
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                (key, json.dumps(value, ensure_ascii=False))
+            )
+            self._bump_revision(conn)
+
+    # ==================== JSON 导入导出 ====================
+
+    def import_json(self, path: Path) -> int:
+        """
+        从 tasks_config.json 导入（替换全部任务和全局设置）
+
+        Returns:
+            导入的任务数量
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+        tasks = config.get('tasks', {})
+        now = datetime.now().isoformat()
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM tasks')
+            conn.execute('DELETE FROM settings')
+            conn.executemany(
+                'INSERT INTO tasks (task_id, data, updated_at) VALUES (?, ?, ?)',
+                [(task_id, json.dumps(task_config, ensure_ascii=False), now)
+                 for task_id, task_config in tasks.items()]
+            )
+            conn.executemany(
+                'INSERT INTO settings (key, value) VALUES (?, ?)',
+                [(key, json.dumps(value, ensure_ascii=False))
+                 for key, value in config.items() if key != 'tasks']
+            )
+            self._bump_revision(conn)
+        return len(tasks)
+
+    def merge_json(self, old: dict, new: dict) -> dict:
+        """
+        按任务ID合并 tasks_config.json 的手工修改：只应用文件中相对上一次读取发生变化的任务和全局设置，
+        文件中未改动的部分保留数据库中的值（通过 Web 界面/控制 API 做的修改不会被旧文件覆盖）
+
+        Args:
+            old: 上一次读取（导入/导出）时的文件内容
+            new: 当前文件内容
+
+        Returns:
+            {'added': [...], 'updated': [...], 'removed': [...], 'settings': [...]}
+        """
+        old_tasks, new_tasks = old.get('tasks', {}), new.get('tasks', {})
+        upserts = {task_id: task_config for task_id, task_config in new_tasks.items()
+                   if old_tasks.get(task_id) != task_config}
+        removed = [task_id for task_id in old_tasks if task_id not in new_tasks]
+        old_settings = {key: value for key, value in old.items() if key != 'tasks'}
+        new_settings = {key: value for key, value in new.items() if key != 'tasks'}
+        settings = [key for key in set(old_settings) | set(new_settings)
+                    if old_settings.get(key) != new_settings.get(key)]
+
+        changes = {'added': [], 'updated': [], 'removed': [], 'settings': sorted(settings)}
+        if not upserts and not removed and not settings:
+            return changes
+
+        now = datetime.now().isoformat()
+        with self._transaction() as conn:
+            for task_id, task_config in upserts.items():
+                exists = conn.execute('SELECT 1 FROM tasks WHERE task_id = ?', (task_id,)).fetchone()
+                conn.execute(
+                    'INSERT OR REPLACE INTO tasks (task_id, data, updated_at) VALUES (?, ?, ?)',
+                    (task_id, json.dumps(task_config, ensure_ascii=False), now)
+                )
+                changes['updated' if exists else 'added'].append(task_id)
+            for task_id in removed:
+                if conn.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,)).rowcount:
+                    changes['removed'].append(task_id)
+            for key in settings:
+                if key in new_settings:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                        (key, json.dumps(new_settings[key], ensure_ascii=False))
+                    )
+                else:
+                    conn.execute('DELETE FROM settings WHERE key = ?', (key,))
+            self._bump_revision(conn)
+        return changes
+
+    def export_json(self, path: Path) -> int:
+        """
+        导出为 tasks_config.json 格式（先写临时文件再替换，不会留下写了一半的文件）
+
+        Returns:
+            导出的任务数量
+        """
+        path = Path(path)
+        config = self.load_config()
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return len(config['tasks'])
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE 写事务：开始时即获取写锁，异常时回滚"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute('COMMIT')
+        else:
+            self.conn.execute('ROLLBACK')
+        return False
@@ -0,0 +1,70 @@
+import json
+
+from cookie_check import check_cookies
+
+NOW = 1_000_000
+
+
+def write_cookies(tmp_path, cookies):
+    path = tmp_path / 'cookies.json'
+    path.write_text(json.dumps(cookies), encoding='utf-8')
+    return path
+
+
+def cookie(name, expires=-1):
+    return {'name': name, 'value': 'x', 'domain': 'example.com', 'path': '/', 'expires': expires}
+
+
+def test_missing_and_invalid(tmp_path):
+    assert check_cookies(tmp_path / 'cookies.json', now=NOW)['reason'] == 'missing'
+    assert check_cookies(write_cookies(tmp_path, []), now=NOW)['reason'] == 'missing'
+    (tmp_path / 'cookies.json').write_text('{broken', encoding='utf-8')
+    assert check_cookies(tmp_path / 'cookies.json', now=NOW)['reason'] == 'invalid'
+
+
+def test_expired_session_cookie(tmp_path):
+    path = write_cookies(tmp_path, [cookie('laravel_session', NOW - 10), cookie('theme')])
+    result = check_cookies(path, now=NOW)
+    assert not result['ok']
+    assert result['reason'] == 'expired'
+    assert result['expired'] == ['laravel_session']
+
+
+def test_expired_tracker_cookie_does_not_fail(tmp_path):
+    path = write_cookies(tmp_path, [
+        cookie('_hjSession_123', NOW - 10), cookie('csrftoken', NOW - 10),
+        cookie('remember_web_abc', NOW - 10), cookie('laravel_session', NOW + 3600)
+    ])
+    result = check_cookies(path, now=NOW)
+    assert result['ok']
+    assert result['expires_at'] == NOW + 3600
+
+
+def test_inferred_session_cookies_must_all_expire(tmp_path):
+    cookies = [cookie('PHPSESSID', NOW - 10), cookie('auth_token', NOW + 60)]
+    assert check_cookies(write_cookies(tmp_path, cookies), now=NOW)['ok']
+
+    cookies[1]['expires'] = NOW - 1
+    assert check_cookies(write_cookies(tmp_path, cookies), now=NOW)['reason'] == 'expired'
+
+    # 没有过期时间的会话 cookie 视为仍然有效
+    cookies.append(cookie('sessionid'))
+    assert check_cookies(write_cookies(tmp_path, cookies), now=NOW)['ok']
+
+
+def test_explicit_names_any_expired_fails(tmp_path):
+    path = write_cookies(tmp_path, [cookie('a', NOW - 10), cookie('b', NOW + 60)])
+    assert check_cookies(path, now=NOW)['ok']
+    result = check_cookies(path, session_cookie_names=['a', 'b'], now=NOW)
+    assert result['reason'] == 'expired' and result['expired'] == ['a']
+    assert check_cookies(path, session_cookie_names=['c'], now=NOW)['reason'] == 'missing'
+
+
+def test_newer_storage_state_wins(tmp_path):
+    import os
+    path = write_cookies(tmp_path, [cookie('laravel_session', NOW - 10)])
+    state = tmp_path / 'storage_state.json'
+    state.write_text(json.dumps({'cookies': [cookie('laravel_session', NOW + 60)], 'origins': []}), encoding='utf-8')
+    os.utime(path, (NOW, NOW))
+    os.utime(state, (NOW + 1, NOW + 1))
+    assert check_cookies(path, state, now=NOW)['ok']
@@ -0,0 +1,36 @@
+from fileutil import read_lines_after, read_lines_before, tail_lines
+
+
+def test_read_lines_after_waits_for_complete_line(tmp_path):
+    path = tmp_path / 'task.log'
+    path.write_bytes(b'one\ntwo\npart')
+    lines, offset = read_lines_after(path, 0)
+    assert lines == ['one', 'two'] and offset == 8
+    assert read_lines_after(path, offset) == ([], offset)
+
+    with open(path, 'ab') as f:
+        f.write(b'ial\n')
+    assert read_lines_after(path, offset) == (['partial'], len(path.read_bytes()))
+
+
+def test_read_lines_after_advances_past_overlong_line(tmp_path):
+    path = tmp_path / 'task.log'
+    path.write_bytes(b'x' * 100 + b'\nnext\n')
+    lines, offset = read_lines_after(path, 0, max_bytes=40)
+    assert lines == ['x' * 40] and offset == 40
+    lines, offset = read_lines_after(path, offset, max_bytes=40)
+    assert lines == ['x' * 40] and offset == 80
+    lines, offset = read_lines_after(path, offset, max_bytes=40)
+    assert lines == ['x' * 20, 'next'] and offset == len(path.read_bytes())
+
+
+def test_read_lines_before_pages_backwards(tmp_path):
+    path = tmp_path / 'task.log'
+    path.write_text(''.join(f'line {i}\n' for i in range(10)), encoding='utf-8')
+    size = path.stat().st_size
+    lines, start = read_lines_before(path, size, 3)
+    assert lines == ['line 7', 'line 8', 'line 9']
+    lines, _ = read_lines_before(path, start, 2)
+    assert lines == ['line 5', 'line 6']
+    assert tail_lines(path, 1) == ['line 9']
+    assert tail_lines(tmp_path / 'missing.log', 5) == []
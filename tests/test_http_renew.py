@@ -0,0 +1,182 @@
+import asyncio
+from http.cookies import SimpleCookie
+from types import SimpleNamespace
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+import http_renew
+from session_expiry import parse_session_expiry
+
+NOW = 1_000_000
+
+
+def response(url, *set_cookies, history=()):
+    cookies = SimpleCookie()
+    for header in set_cookies:
+        cookies.load(header)
+    return SimpleNamespace(url=url, cookies=cookies, history=list(history))
+
+
+def test_cookie_header_filters_domain_path_secure_and_expiry():
+    cookies = [
+        {'name': 'a', 'value': '1', 'domain': '.example.com', 'path': '/'},
+        {'name': 'b', 'value': '2', 'domain': 'other.com', 'path': '/'},
+        {'name': 'c', 'value': '3', 'domain': 'www.example.com', 'path': '/api'},
+        {'name': 'd', 'value': '4', 'domain': 'www.example.com', 'path': '/admin'},
+        {'name': 'e', 'value': '5', 'domain': 'example.com', 'path': '/', 'secure': True},
+        {'name': 'f', 'value': '6', 'domain': 'example.com', 'path': '/', 'expires': NOW - 1},
+        {'name': 'g', 'value': '7', 'domain': 'example.com', 'path': '/', 'expires': -1},
+    ]
+    assert http_renew.cookie_header(cookies, 'http://www.example.com/api/renew', now=NOW) == 'a=1; c=3; g=7'
+    assert 'e=5' in http_renew.cookie_header(cookies, 'https://www.example.com/api/renew', now=NOW)
+
+
+def test_merge_updates_value_and_expiry():
+    cookies = [{'name': 'sid', 'value': 'old', 'domain': 'www.example.com', 'path': '/', 'expires': NOW + 10}]
+    changed = http_renew.merge_set_cookies(
+        cookies, response('https://www.example.com/api/renew', 'sid=new; Max-Age=3600; Path=/'), now=NOW
+    )
+    assert changed
+    assert cookies == [{'name': 'sid', 'value': 'new', 'domain': 'www.example.com', 'path': '/', 'expires': NOW + 3600}]
+
+    # 值和过期时间都没变
+    assert not http_renew.merge_set_cookies(
+        cookies, response('https://www.example.com/api/renew', 'sid=new; Max-Age=3600; Path=/'), now=NOW
+    )
+
+
+def test_merge_adds_new_cookies_including_redirects():
+    cookies = []
+    redirect = response('https://www.example.com/login/step', 'flow=1; Expires=Wed, 21 Oct 2099 07:28:00 GMT')
+    final = response('https://www.example.com/api/renew', 'laravel_session=abc; Path=/; HttpOnly; Secure',
+                     history=[redirect])
+    assert http_renew.merge_set_cookies(cookies, final, now=NOW)
+
+    by_name = {cookie['name']: cookie for cookie in cookies}
+    assert by_name['flow']['path'] == '/login'
+    assert by_name['flow']['expires'] == 4096250880.0
+    session = by_name['laravel_session']
+    assert session['domain'] == 'www.example.com'
+    assert session['expires'] == -1
+    assert session['httpOnly'] and session['secure']
+
+
+def test_merge_removes_expired_cookies():
+    cookies = [{'name': 'sid', 'value': 'x', 'domain': '.example.com', 'path': '/', 'expires': -1}]
+    assert http_renew.merge_set_cookies(
+        cookies, response('https://example.com/logout', 'sid=; Max-Age=0; Domain=example.com; Path=/'), now=NOW
+    )
+    assert cookies == []
+
+
+# ==================== replay_renew（本地模拟服务器） ====================
+
+
+async def handle_ok(request):
+    assert request.headers['Cookie'] == 'sid=old'
+    assert await request.text() == 'a=1'
+    return web.json_response({'ok': True, 'remaining': 900})
+
+
+async def handle_rotate(request):
+    response = web.json_response({'ok': True})
+    response.set_cookie('sid', 'rotated', max_age=3600, path='/')
+    return response
+
+
+async def handle_expired(request):
+    raise web.HTTPFound('/auth')
+
+
+async def handle_auth(request):
+    return web.Response(text='login', content_type='text/html')
+
+
+async def handle_cf_header(request):
+    return web.Response(status=403, text='blocked', headers={'cf-mitigated': 'challenge'})
+
+
+async def handle_cf_body(request):
+    return web.Response(text='<title>Just a moment...</title>', content_type='text/html')
+
+
+async def handle_error(request):
+    return web.Response(status=503, text='unavailable')
+
+
+async def handle_slow(request):
+    await asyncio.sleep(1)
+    return web.json_response({'ok': True})
+
+
+def replay(path, cookies=None, timeout=None):
+    """启动本地服务器并重放 POST <path>，返回 (结果, cookies)"""
+    cookies = cookies if cookies is not None else [
+        {'name': 'sid', 'value': 'old', 'domain': '127.0.0.1', 'path': '/', 'expires': -1}
+    ]
+
+    async def main():
+        app = web.Application()
+        for route, handler in (('/ok', handle_ok), ('/rotate', handle_rotate), ('/expired', handle_expired),
+                               ('/cf-header', handle_cf_header), ('/cf-body', handle_cf_body),
+                               ('/error', handle_error), ('/slow', handle_slow)):
+            app.router.add_post(route, handler)
+        app.router.add_get('/auth', handle_auth)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        if timeout:
+            http_renew._session = aiohttp.ClientSession(cookie_jar=aiohttp.DummyCookieJar(),
+                                                        timeout=aiohttp.ClientTimeout(total=timeout))
+        try:
+            endpoint = {'method': 'POST', 'url': f'http://127.0.0.1:{port}{path}',
+                        'headers': {'content-type': 'application/x-www-form-urlencoded'}, 'post_data': 'a=1'}
+            return await http_renew.replay_renew(endpoint, cookies)
+        finally:
+            await http_renew.close_session()
+            await runner.cleanup()
+
+    return asyncio.run(main()), cookies
+
+
+def test_replay_ok_with_expiry_from_body():
+    result, _ = replay('/ok')
+    assert result['ok'] and result['cause'] == 'ok' and result['status'] == 200
+    assert result['latency_ms'] is not None
+    assert result['body'] == {'ok': True, 'remaining': 900}
+    assert parse_session_expiry(result['body'], now=0) == 900
+    assert not result['cookies_changed']
+
+
+def test_replay_redirect_to_auth_is_session_expired():
+    result, _ = replay('/expired')
+    assert not result['ok']
+    assert result['cause'] == 'session_expired'
+
+
+@pytest.mark.parametrize('path', ['/cf-header', '/cf-body'])
+def test_replay_cloudflare_challenge(path):
+    result, _ = replay(path)
+    assert not result['ok']
+    assert result['cause'] == 'cf_challenge'
+
+
+def test_replay_non_2xx_status():
+    result, _ = replay('/error')
+    assert result['cause'] == 'http_503' and result['status'] == 503
+
+
+def test_replay_timeout():
+    result, _ = replay('/slow', timeout=0.2)
+    assert result['cause'] == 'timeout'
+
+
+def test_replay_set_cookie_rotation():
+    result, cookies = replay('/rotate')
+    assert result['ok'] and result['cookies_changed']
+    assert cookies[0]['value'] == 'rotated'
+    assert cookies[0]['expires'] > 0
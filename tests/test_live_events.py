@@ -0,0 +1,78 @@
+import itertools
+import json
+import os
+import queue
+
+from live_events import EventHub
+
+MTIMES = itertools.count(1_000_000)
+
+
+def make_hub(tmp_path):
+    hub = EventHub(tmp_path, list_tasks=lambda: [])
+    q = queue.Queue()
+    q.task_filter = None
+    hub.subscribers.add(q)
+    return hub, q
+
+
+def drain(q):
+    events = []
+    while not q.empty():
+        event, data = q.get_nowait().strip().split('\n')[:2]
+        events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+def write_status(tmp_path, task_id, data):
+    task_dir = tmp_path / task_id
+    task_dir.mkdir(exist_ok=True)
+    status_file = task_dir / 'status.json'
+    status_file.write_text(json.dumps(data), encoding='utf-8')
+    mtime = next(MTIMES)
+    os.utime(status_file, (mtime, mtime))
+
+
+def test_stopped_tasks_are_checked_once(tmp_path):
+    hub, q = make_hub(tmp_path)
+    write_status(tmp_path, 'a', {'state': 'idle'})
+    hub.set_tasks([{'task_id': 'a', 'running': False}])
+
+    hub.check_once()
+    assert [event for event, _ in drain(q)] == ['status']
+
+    # 已停止的任务不会写入文件，状态条目未变化时不再读取
+    write_status(tmp_path, 'a', {'state': 'changed'})
+    hub.check_once()
+    assert drain(q) == []
+
+
+def test_running_tasks_and_transitions_are_checked(tmp_path):
+    hub, q = make_hub(tmp_path)
+    write_status(tmp_path, 'a', {'state': 'renewing'})
+    hub.set_tasks([{'task_id': 'a', 'running': True}])
+    hub.check_once()
+    drain(q)
+
+    write_status(tmp_path, 'a', {'state': 'waiting', 'extra': 1})
+    hub.check_once()
+    events = drain(q)
+    assert events[0][1]['runtime'] == {'state': 'waiting', 'extra': 1}
+
+    # 停止时再检测一次
+    write_status(tmp_path, 'a', {'state': 'stopped'})
+    hub.set_tasks([{'task_id': 'a', 'running': False}])
+    hub.check_once()
+    events = drain(q)
+    assert events[0][1]['running'] is False
+    assert events[0][1]['runtime'] == {'state': 'stopped'}
+
+
+def test_removed_tasks_are_forgotten(tmp_path):
+    hub, q = make_hub(tmp_path)
+    hub.set_tasks([{'task_id': 'a', 'running': True}])
+    hub.check_once()
+    hub.set_tasks([])
+    hub.check_once()
+    assert hub.checked_tasks == {}
+    assert hub.log_offsets == {}
@@ -0,0 +1,95 @@
+import asyncio
+
+from scheduler import RenewScheduler
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, timeout=5))
+
+
+def test_cancel_while_waiting_in_slot():
+    async def main():
+        scheduler = RenewScheduler(workers=1)
+        holder = scheduler.schedule('a', 0)
+        await holder.future
+
+        # 唯一的槽位被占用，b 在 slot() 中等待时被取消
+        async def wait_slot():
+            async with scheduler.slot('b'):
+                pass
+
+        waiter = asyncio.ensure_future(wait_slot())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        scheduler.release(holder)
+        ticket = scheduler.schedule('c', 0)
+        await asyncio.wait_for(ticket.future, timeout=1)
+        assert not scheduler.dispatcher.done()
+        assert scheduler.task_tickets.keys() == {'c'}
+        scheduler.release(ticket)
+        scheduler.close()
+
+    run(main())
+
+
+def test_dispatch_in_deadline_order():
+    async def main():
+        scheduler = RenewScheduler(workers=1)
+        order = []
+        tickets = [scheduler.schedule('late', 0.05), scheduler.schedule('early', 0.01),
+                   scheduler.schedule('now', 0)]
+
+        async def run(ticket):
+            await ticket.future
+            order.append(ticket.task_id)
+            scheduler.release(ticket)
+
+        await asyncio.gather(*(run(ticket) for ticket in tickets))
+        assert order == ['now', 'early', 'late']
+        assert scheduler.metrics()['dispatched'] == 3
+        scheduler.close()
+
+    run(main())
+
+
+def test_workers_limit_and_release():
+    async def main():
+        scheduler = RenewScheduler(workers=2)
+        tickets = [scheduler.schedule(f't{i}', 0) for i in range(3)]
+        await asyncio.sleep(0.01)
+        assert [ticket.future.done() for ticket in tickets] == [True, True, False]
+        assert scheduler.metrics()['queue_depth'] == 1
+
+        scheduler.release(tickets[0])
+        await asyncio.wait_for(tickets[2].future, timeout=1)
+        assert len(scheduler.busy) == 2
+
+        # 重复释放忽略
+        scheduler.release(tickets[0])
+        assert len(scheduler.busy) == 2
+        scheduler.release(tickets[1])
+        scheduler.release(tickets[2])
+        assert not scheduler.busy and not scheduler.task_tickets
+        scheduler.close()
+
+    run(main())
+
+
+def test_cancel_task_releases_slot_and_drops_waiting():
+    async def main():
+        scheduler = RenewScheduler(workers=1)
+        granted = scheduler.schedule('a', 0)
+        await granted.future
+        waiting = scheduler.schedule('a', 0)
+        other = scheduler.schedule('b', 0)
+
+        scheduler.cancel_task('a')
+        assert waiting.future.cancelled()
+        await asyncio.wait_for(other.future, timeout=1)
+        assert scheduler.busy == {other}
+        scheduler.release(other)
+        scheduler.close()
+
+    run(main())
@@ -0,0 +1,30 @@
+import os
+
+from screenshots import ScreenshotManifest
+
+
+def make_screenshots(directory, names):
+    directory.mkdir(parents=True, exist_ok=True)
+    for i, name in enumerate(names):
+        path = directory / name
+        path.write_bytes(b'x')
+        os.utime(path, (1_000_000 + i, 1_000_000 + i))
+
+
+def test_read_only_lists_without_writing_manifest(tmp_path):
+    make_screenshots(tmp_path, ['renew_1.jpg', 'manual_2.jpg', 'notes.txt'])
+    manifest = ScreenshotManifest(tmp_path, read_only=True)
+    assert [record['name'] for record in manifest.recent(5)] == ['manual_2.jpg', 'renew_1.jpg']
+    assert not (tmp_path / 'manifest.jsonl').exists()
+    assert ScreenshotManifest(tmp_path / 'missing', read_only=True).recent(5) == []
+
+
+def test_writer_rebuilds_and_read_only_uses_manifest(tmp_path):
+    make_screenshots(tmp_path, ['renew_1.jpg'])
+    writer = ScreenshotManifest(tmp_path)
+    assert (tmp_path / 'manifest.jsonl').exists()
+    writer.append('manual_2.jpg', 10, 'manual', 'ok')
+
+    records = ScreenshotManifest(tmp_path, read_only=True).recent(5)
+    assert [record['name'] for record in records] == ['manual_2.jpg', 'renew_1.jpg']
+    assert records[0]['outcome'] == 'ok'
@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+
+from session_expiry import parse_countdown_text, parse_session_expiry
+
+NOW = 1_000_000
+
+
+def test_remaining_seconds():
+    assert parse_session_expiry({'remaining': 900}, now=NOW) == NOW + 900
+    assert parse_session_expiry({'expires_in': 60.5}, now=NOW) == NOW + 60.5
+
+
+def test_absolute_timestamps():
+    assert parse_session_expiry({'expires_at': 1_700_000_000}, now=NOW) == 1_700_000_000
+    # 毫秒时间戳
+    assert parse_session_expiry({'expiresAt': 1_700_000_000_000}, now=NOW) == 1_700_000_000
+    expected = datetime(2030, 1, 1, tzinfo=timezone.utc).timestamp()
+    assert parse_session_expiry({'expiry': '2030-01-01T00:00:00Z'}, now=NOW) == expected
+
+
+def test_nested_and_unparseable():
+    assert parse_session_expiry({'ok': True, 'data': {'ttl': 120}}, now=NOW) == NOW + 120
+    assert parse_session_expiry({'session': {'expires': 'soon'}}, now=NOW) is None
+    assert parse_session_expiry({'remaining': 0}, now=NOW) is None
+    assert parse_session_expiry(None, now=NOW) is None
+    assert parse_session_expiry(['remaining', 60], now=NOW) is None
+
+
+def test_countdown_text():
+    assert parse_countdown_text('14:32') == 14 * 60 + 32
+    assert parse_countdown_text('Session expires in 01:14:32') == 3600 + 14 * 60 + 32
+    assert parse_countdown_text('14 分钟') == 14 * 60
+    assert parse_countdown_text('1h 30m') == 5400
+    assert parse_countdown_text('15 minutes') == 900
+    assert parse_countdown_text('') is None
+    assert parse_countdown_text('expired') is None
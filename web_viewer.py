@@ -4,17 +4,22 @@ MCHost Multi-Task Web Viewer
 多任务管理 Web 界面
 """
 
+import hmac
 import os
 import json
 from pathlib import Path
 from datetime import datetime
-from flask import Flask, render_template_string, request, redirect, url_for, session, jsonify, send_file
+from flask import Flask, Response, render_template_string, request, redirect, url_for, session, jsonify, send_file, stream_with_context
 from werkzeug.utils import secure_filename
 import sys
 
 # 添加当前目录到路径
 sys.path.insert(0, str(Path(__file__).parent))
-from task_manager import TaskManager
+from manager_api import ManagerClient
+from screenshots import SCREENSHOT_MIME_TYPES, ScreenshotManifest
+from fileutil import read_lines_before, read_lines_after, write_json_file
+from live_events import EventHub
+from metrics import render_metrics
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'mchost-secret-key-change-me')
@@ -22,9 +27,20 @@ app.secret_key = os.environ.get('SECRET_KEY', 'mchost-secret-key-change-me')
 # 配置
 BASE_DIR = Path(__file__).parent
 PASSWORD = os.environ.get('VIEWER_PASSWORD', 'mchost123')
+# 监听地址（只在本机使用或放在本机反向代理之后时可设为 127.0.0.1）
+VIEWER_HOST = os.environ.get('VIEWER_HOST', '0.0.0.0')
+VIEWER_PORT = int(os.environ.get('VIEWER_PORT', '5000'))
+# /metrics 访问令牌（设置后需携带 Authorization: Bearer <令牌> 或 ?token=<令牌>）
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+LOCAL_ADDRESSES = ('127.0.0.1', '::1', 'localhost')
+# 反向代理添加的请求头：经代理转发的请求来源地址都是 127.0.0.1，不能据此判断是否本机访问
+PROXY_HEADERS = ('X-Forwarded-For', 'X-Real-IP', 'Forwarded')
 
-# 初始化任务管理器
-task_manager = TaskManager()
+# 任务管理器客户端（运行状态和启动/停止由 task_manager.py --daemon 守护进程负责）
+task_manager = ManagerClient(BASE_DIR)
+
+# 实时事件推送（所有页面共用一个检测线程）
+event_hub = EventHub(task_manager.tasks_dir, task_manager.get_all_tasks_status, task_manager.wait_status)
 
 
 def require_auth(f):
@@ -37,6 +53,18 @@ def require_auth(f):
     return wrapper
 
 
+def read_runtime_status(task_dir: Path) -> dict:
+    """读取续期脚本写入的 status.json"""
+    status_file = task_dir / 'status.json'
+    if not status_file.exists():
+        return {}
+    try:
+        with open(status_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
 # ==================== HTML 模板 ====================
 
 LOGIN_TEMPLATE = '''
@@ -231,6 +259,14 @@ TASK_LIST_TEMPLATE = '''
             color: #999;
             margin-bottom: 20px;
         }
+        .daemon-offline {
+            background: #fff3cd;
+            border-left: 4px solid #ffc107;
+            color: #856404;
+            padding: 15px;
+            border-radius: 5px;
+            margin-bottom: 20px;
+        }
     </style>
 </head>
 <body>
@@ -243,6 +279,10 @@ TASK_LIST_TEMPLATE = '''
             </div>
         </div>
 
+        {% if not daemon_online %}
+        <div class="daemon-offline">⚠️ 任务管理器守护进程未运行，无法启动/停止任务。请运行 <code>task_manager.py --daemon</code>（或 systemd 服务）。</div>
+        {% endif %}
+
         {% if tasks|length == 0 %}
         <div class="empty-state">
             <h2>还没有任务</h2>
@@ -252,7 +292,7 @@ TASK_LIST_TEMPLATE = '''
         {% else %}
         <div class="task-grid">
             {% for task in tasks %}
-            <div class="task-card">
+            <div class="task-card" data-task-id="{{ task.task_id }}">
                 <div class="task-header">
                     <div>
                         <div class="task-title">{{ task.name }}</div>
@@ -265,19 +305,16 @@ TASK_LIST_TEMPLATE = '''
                 <div class="task-info">
                     <div>⏱️ 间隔: {{ task.renew_interval_minutes }} 分钟</div>
                     <div>🔗 URL: {{ task.mchost_url[:30] }}...</div>
-                    {% if task.last_run %}
-                    <div>🕐 最后运行: {{ task.last_run[:19] }}</div>
-                    {% endif %}
+                    <div class="last-run"{% if not task.last_run %} style="display: none;"{% endif %}>🕐 最后运行: <span>{{ (task.last_run or '')[:19] }}</span></div>
+                    <div class="last-renew" style="display: none;"></div>
+                    <div class="needs-credentials" style="display: none; color: #dc3545; font-weight: bold;">🔑 需要更新Cookies（已暂停自动重启）</div>
                 </div>
                 <div class="task-actions">
                     <a href="{{ url_for('task_detail', task_id=task.task_id) }}" class="btn btn-info btn-sm">📊 详情</a>
                     <a href="{{ url_for('edit_task', task_id=task.task_id) }}" class="btn btn-warning btn-sm">✏️ 编辑</a>
-                    {% if task.running %}
-                    <a href="{{ url_for('stop_task', task_id=task.task_id) }}" class="btn btn-danger btn-sm" onclick="return confirm('确定停止任务？')">⏹️ 停止</a>
-                    <a href="{{ url_for('restart_task', task_id=task.task_id) }}" class="btn btn-secondary btn-sm">🔄 重启</a>
-                    {% else %}
-                    <a href="{{ url_for('start_task', task_id=task.task_id) }}" class="btn btn-success btn-sm">▶️ 启动</a>
-                    {% endif %}
+                    <a href="{{ url_for('stop_task', task_id=task.task_id) }}" class="btn btn-danger btn-sm when-running" onclick="return confirm('确定停止任务？')"{% if not task.running %} style="display: none;"{% endif %}>⏹️ 停止</a>
+                    <a href="{{ url_for('restart_task', task_id=task.task_id) }}" class="btn btn-secondary btn-sm when-running"{% if not task.running %} style="display: none;"{% endif %}>🔄 重启</a>
+                    <a href="{{ url_for('start_task', task_id=task.task_id) }}" class="btn btn-success btn-sm when-stopped"{% if task.running %} style="display: none;"{% endif %}>▶️ 启动</a>
                     <a href="{{ url_for('delete_task', task_id=task.task_id) }}" class="btn btn-danger btn-sm" onclick="return confirm('确定删除任务？此操作不可恢复！')">🗑️ 删除</a>
                 </div>
             </div>
@@ -286,8 +323,39 @@ TASK_LIST_TEMPLATE = '''
         {% endif %}
     </div>
     <script>
-        // Auto refresh every 5 seconds (faster refresh for task list)
-        setTimeout(() => location.reload(), 5000);
+        // 通过 SSE 接收状态变化，原地更新任务卡片（不再整页定时刷新）
+        const events = new EventSource("{{ url_for('api_events') }}");
+        events.addEventListener('status', e => {
+            const data = JSON.parse(e.data);
+            const card = document.querySelector('.task-card[data-task-id="' + data.task_id + '"]');
+            if (!card) return;
+
+            const badge = card.querySelector('.status-badge');
+            badge.className = 'status-badge status-' + (data.running ? 'running' : 'stopped');
+            badge.textContent = data.running ? '🟢 运行中' : '🔴 已停止';
+            card.querySelectorAll('.when-running').forEach(el => el.style.display = data.running ? '' : 'none');
+            card.querySelectorAll('.when-stopped').forEach(el => el.style.display = data.running ? 'none' : '');
+
+            if (data.last_run) {
+                const lastRun = card.querySelector('.last-run');
+                lastRun.querySelector('span').textContent = data.last_run.slice(0, 19);
+                lastRun.style.display = '';
+            }
+            if (data.runtime) {
+                card.querySelector('.needs-credentials').style.display = data.runtime.needs_credentials ? '' : 'none';
+            }
+            const renew = data.runtime && data.runtime.last_renew;
+            if (renew) {
+                const el = card.querySelector('.last-renew');
+                const schedule = data.runtime.schedule;
+                el.textContent = (renew.ok ? '✓ 最近Renew成功: ' : '✗ 最近Renew失败（' + renew.cause + '）: ')
+                    + (renew.timestamp || '').slice(0, 19)
+                    + (schedule ? ' · 下次: ' + schedule.next_renew_at.slice(11, 19)
+                        + (schedule.reason === 'session_expiry' ? '（按会话到期）' : '') : '');
+                el.style.color = renew.ok ? 'green' : '#dc3545';
+                el.style.display = '';
+            }
+        });
     </script>
 </body>
 </html>
@@ -424,6 +492,41 @@ TASK_DETAIL_TEMPLATE = '''
             <a href="{{ url_for('index') }}" class="btn btn-primary">← 返回列表</a>
         </div>
 
+        <div class="section" id="needs-credentials" style="border-left: 4px solid #dc3545;{% if not needs_credentials %} display: none;{% endif %}">
+            <div class="section-title">🔑 需要更新凭据</div>
+            <div style="font-size: 14px; color: #666; line-height: 1.8;">
+                会话 Cookie 已过期或失效（<span id="needs-credentials-reason">{{ needs_credentials.reason if needs_credentials else '' }}</span>），
+                任务已停止且不会被自动重启。请在<a href="{{ url_for('edit_task', task_id=task.task_id) }}">编辑页面</a>上传新的 Cookies，
+                任务管理器检测到更新后会自动重新启动任务。
+            </div>
+        </div>
+
+        <div class="section" id="last-renew-section"{% if not last_renew %} style="display: none;"{% endif %}>
+            <div class="section-title">🔁 最近一次 Renew</div>
+            <div style="font-size: 14px; color: #666; line-height: 1.8;" id="last-renew">
+                {% if last_renew %}
+                {% if last_renew.ok %}
+                <span style="color: green; font-weight: bold;">✓ 成功</span>
+                {% else %}
+                <span style="color: #dc3545; font-weight: bold;">✗ 失败（{{ last_renew.cause }}）</span>
+                {% endif %}
+                · 时间: {{ last_renew.timestamp[:19] }}
+                {% if last_renew.status %} · HTTP {{ last_renew.status }}{% endif %}
+                {% if last_renew.latency_ms is not none %} · 延迟 {{ last_renew.latency_ms }} ms{% endif %}
+                {% if last_renew.session_expires_at %} · 会话到期: {{ last_renew.session_expires_at[:19] }}{% endif %}
+                {% if schedule %}
+                <br>📅 下次续期: {{ schedule.next_renew_at[:19] }}（{{ (schedule.delay_seconds / 60)|round(1) }} 分钟后，
+                {{ {'session_expiry': '会话到期前提前续期', 'delayed': '延迟Renew请求'}.get(schedule.reason, '固定间隔') }}）
+                {% endif %}
+                {% if resource_blocking %}
+                <br>🚫 已拦截请求: {{ resource_blocking.blocked_requests }}
+                {% for type, count in resource_blocking.blocked_by_type.items() %} · {{ type }} {{ count }}{% endfor %}
+                · 放行请求: {{ resource_blocking.allowed_requests }}（{{ (resource_blocking.allowed_bytes / 1024)|round(1) }} KB）
+                {% endif %}
+                {% endif %}
+            </div>
+        </div>
+
         <div class="section">
             <div class="section-title" style="display: flex; justify-content: space-between; align-items: center;">
                 <span>📸 最近截图</span>
@@ -431,17 +534,16 @@ TASK_DETAIL_TEMPLATE = '''
                     <a href="{{ url_for('trigger_screenshot', task_id=task.task_id) }}" class="btn btn-primary btn-sm" onclick="return confirm('确定立即截图？')">📷 立即截图</a>
                 </div>
             </div>
-            {% if screenshots|length > 0 %}
-            <div class="screenshot-grid">
+            <div class="screenshot-grid" id="screenshot-grid">
                 {% for screenshot in screenshots %}
-                <div class="screenshot-item" onclick="openLightbox('{{ url_for('serve_screenshot', task_id=task.task_id, filename=screenshot.name) }}')">
+                <div class="screenshot-item" data-name="{{ screenshot.name }}" onclick="openLightbox('{{ url_for('serve_screenshot', task_id=task.task_id, filename=screenshot.name) }}')">
                     <img src="{{ url_for('serve_screenshot', task_id=task.task_id, filename=screenshot.name) }}" alt="{{ screenshot.name }}">
-                    <div class="screenshot-time">{{ screenshot.time }}</div>
+                    <div class="screenshot-time">{{ screenshot.time }}{% if screenshot.outcome == 'failed' %} ❌{% endif %}</div>
                 </div>
                 {% endfor %}
             </div>
-            {% else %}
-            <div class="empty-message">还没有截图</div>
+            {% if screenshots|length == 0 %}
+            <div class="empty-message" id="screenshot-empty">还没有截图</div>
             {% endif %}
         </div>
 
@@ -492,19 +594,22 @@ TASK_DETAIL_TEMPLATE = '''
                 • <strong>启用手动干预模式</strong>后，当遇到CF验证时，脚本会暂停并等待你手动处理<br>
                 • 点击"打开VNC远程桌面"可以在浏览器中看到服务器上的浏览器窗口<br>
                 • 在VNC界面中手动完成CF验证后，脚本会自动继续运行<br>
-                • 注意：启用手动模式后需要重启任务才能生效
+                • 切换手动模式后任务会由任务管理器自动重启生效
             </div>
         </div>
 
         <div class="section">
-            <div class="section-title">📋 运行日志（最近100行）</div>
-            <div class="log-container">
+            <div class="section-title" style="display: flex; justify-content: space-between; align-items: center;">
+                <span>📋 运行日志</span>
+                <button class="btn btn-primary btn-sm" id="log-more" onclick="loadEarlierLogs()" {% if log_start == 0 %}style="display: none;"{% endif %}>⬆️ 加载更早日志</button>
+            </div>
+            <div class="log-container" id="log-container" data-start="{{ log_start }}" data-offset="{{ log_end }}">
                 {% if log_lines %}
                     {% for line in log_lines %}
                     <div class="{% if 'ERROR' in line %}log-error{% elif 'WARNING' in line %}log-warning{% elif 'INFO' in line %}log-info{% elif '✓' in line %}log-success{% endif %}">{{ line }}</div>
                     {% endfor %}
                 {% else %}
-                <div class="empty-message">暂无日志</div>
+                <div class="empty-message" id="log-empty">暂无日志</div>
                 {% endif %}
             </div>
         </div>
@@ -523,8 +628,141 @@ TASK_DETAIL_TEMPLATE = '''
         function closeLightbox() {
             document.getElementById('lightbox').style.display = 'none';
         }
-        // Auto refresh every 5 seconds (faster refresh for quicker updates)
-        setTimeout(() => location.reload(), 5000);
+
+        const logApi = "{{ url_for('api_task_log', task_id=task.task_id) }}";
+        const logContainer = document.getElementById('log-container');
+
+        function logLine(line) {
+            const div = document.createElement('div');
+            if (line.includes('ERROR')) div.className = 'log-error';
+            else if (line.includes('WARNING')) div.className = 'log-warning';
+            else if (line.includes('INFO')) div.className = 'log-info';
+            else if (line.includes('✓')) div.className = 'log-success';
+            div.textContent = line;
+            return div;
+        }
+
+        function appendLogs(lines, reset) {
+            if (!lines.length && !reset) return;
+            const empty = document.getElementById('log-empty');
+            if (empty) empty.remove();
+            if (reset) logContainer.innerHTML = '';
+            const atBottom = logContainer.scrollTop + logContainer.clientHeight >= logContainer.scrollHeight - 5;
+            lines.forEach(line => logContainer.appendChild(logLine(line)));
+            if (atBottom) logContainer.scrollTop = logContainer.scrollHeight;
+        }
+
+        // 只拉取上次偏移之后新增的日志行（推送有缺口或连接重建时补齐）
+        function pollLogs() {
+            fetch(logApi + '?offset=' + logContainer.dataset.offset)
+                .then(r => r.json())
+                .then(data => {
+                    appendLogs(data.lines, data.reset);
+                    logContainer.dataset.offset = data.offset;
+                    if (data.reset) logContainer.dataset.start = data.start;
+                })
+                .catch(() => {});
+        }
+
+        // 向前翻页
+        function loadEarlierLogs() {
+            fetch(logApi + '?before=' + logContainer.dataset.start + '&limit=100')
+                .then(r => r.json())
+                .then(data => {
+                    const first = logContainer.firstChild;
+                    data.lines.forEach(line => logContainer.insertBefore(logLine(line), first));
+                    logContainer.dataset.start = data.start;
+                    if (data.start === 0) document.getElementById('log-more').style.display = 'none';
+                });
+        }
+
+        const screenshotUrl = "{{ url_for('serve_screenshot', task_id=task.task_id, filename='__name__') }}";
+        const screenshotGrid = document.getElementById('screenshot-grid');
+
+        function addScreenshots(screenshots) {
+            // 推送的是最近几张（倒序），只插入页面上还没有的
+            screenshots.slice().reverse().forEach(shot => {
+                if (screenshotGrid.querySelector('[data-name="' + shot.name + '"]')) return;
+                const src = screenshotUrl.replace('__name__', encodeURIComponent(shot.name));
+                const item = document.createElement('div');
+                item.className = 'screenshot-item';
+                item.dataset.name = shot.name;
+                item.onclick = () => openLightbox(src);
+                const img = document.createElement('img');
+                img.src = src;
+                img.alt = shot.name;
+                const time = document.createElement('div');
+                time.className = 'screenshot-time';
+                time.textContent = shot.time + (shot.outcome === 'failed' ? ' ❌' : '');
+                item.appendChild(img);
+                item.appendChild(time);
+                screenshotGrid.insertBefore(item, screenshotGrid.firstChild);
+            });
+            while (screenshotGrid.children.length > 20) screenshotGrid.lastChild.remove();
+            const empty = document.getElementById('screenshot-empty');
+            if (empty && screenshotGrid.children.length) empty.remove();
+        }
+
+        const SCHEDULE_REASONS = {session_expiry: '会话到期前提前续期', delayed: '延迟Renew请求'};
+
+        function showLastRenew(renew, blocking, schedule) {
+            const el = document.getElementById('last-renew');
+            el.innerHTML = '';
+            const result = document.createElement('span');
+            result.style.fontWeight = 'bold';
+            result.style.color = renew.ok ? 'green' : '#dc3545';
+            result.textContent = renew.ok ? '✓ 成功' : '✗ 失败（' + renew.cause + '）';
+            el.appendChild(result);
+            let text = ' · 时间: ' + (renew.timestamp || '').slice(0, 19);
+            if (renew.status) text += ' · HTTP ' + renew.status;
+            if (renew.latency_ms !== null && renew.latency_ms !== undefined) text += ' · 延迟 ' + renew.latency_ms + ' ms';
+            if (renew.session_expires_at) text += ' · 会话到期: ' + renew.session_expires_at.slice(0, 19);
+            el.appendChild(document.createTextNode(text));
+            if (schedule) {
+                el.appendChild(document.createElement('br'));
+                el.appendChild(document.createTextNode(
+                    '📅 下次续期: ' + schedule.next_renew_at.slice(0, 19)
+                    + '（' + (schedule.delay_seconds / 60).toFixed(1) + ' 分钟后，'
+                    + (SCHEDULE_REASONS[schedule.reason] || '固定间隔') + '）'
+                ));
+            }
+            if (blocking) {
+                el.appendChild(document.createElement('br'));
+                let line = '🚫 已拦截请求: ' + blocking.blocked_requests;
+                Object.entries(blocking.blocked_by_type || {}).forEach(([type, count]) => line += ' · ' + type + ' ' + count);
+                line += ' · 放行请求: ' + blocking.allowed_requests + '（' + (blocking.allowed_bytes / 1024).toFixed(1) + ' KB）';
+                el.appendChild(document.createTextNode(line));
+            }
+            document.getElementById('last-renew-section').style.display = '';
+        }
+
+        // 通过 SSE 接收本任务的新日志、新截图和状态变化，原地更新页面
+        const events = new EventSource("{{ url_for('api_events', task_id=task.task_id) }}");
+        events.addEventListener('log', e => {
+            const data = JSON.parse(e.data);
+            const offset = Number(logContainer.dataset.offset);
+            if (data.offset <= offset) return;
+            if (data.start === offset) {
+                appendLogs(data.lines, false);
+                logContainer.dataset.offset = data.offset;
+            } else {
+                pollLogs();
+            }
+        });
+        events.addEventListener('screenshot', e => addScreenshots(JSON.parse(e.data).screenshots));
+        events.addEventListener('status', e => {
+            const runtime = JSON.parse(e.data).runtime;
+            if (runtime) {
+                const credentials = runtime.needs_credentials;
+                document.getElementById('needs-credentials').style.display = credentials ? '' : 'none';
+                if (credentials) document.getElementById('needs-credentials-reason').textContent = credentials.reason;
+            }
+            if (runtime && runtime.last_renew) showLastRenew(runtime.last_renew, runtime.resource_blocking, runtime.schedule);
+        });
+        // 连接建立（含断线重连）后补齐期间错过的日志
+        events.addEventListener('open', pollLogs);
+
+        logContainer.scrollTop = logContainer.scrollHeight;
     </script>
 </body>
 </html>
@@ -730,7 +968,7 @@ def logout():
 def index():
     """任务列表页面"""
     tasks = task_manager.get_all_tasks_status()
-    return render_template_string(TASK_LIST_TEMPLATE, tasks=tasks)
+    return render_template_string(TASK_LIST_TEMPLATE, tasks=tasks, daemon_online=task_manager.online)
 
 
 @app.route('/task/<task_id>')
@@ -741,40 +979,42 @@ def task_detail(task_id):
     if 'error' in task:
         return f"任务不存在: {task_id}", 404
 
-    # 获取截图列表
+    # 获取截图列表（读取截图索引末尾，最近20张）
     task_dir = task_manager.get_task_dir(task_id)
-    screenshots_dir = task_dir / 'screenshots'
     screenshots = []
-    if screenshots_dir.exists():
-        # 获取所有截图文件（包括 renew_*.png 和 manual_*.png）
-        all_screenshots = list(screenshots_dir.glob('*.png'))
-        screenshot_files = sorted(
-            all_screenshots,
-            key=lambda p: p.stat().st_mtime,
-            reverse=True
-        )[:20]  # 最近20张
-        for img in screenshot_files:
-            screenshots.append({
-                'name': img.name,
-                'time': datetime.fromtimestamp(img.stat().st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-            })
-
-    # 读取日志
+    for record in ScreenshotManifest(task_dir / 'screenshots', read_only=True).recent(20):
+        screenshots.append({
+            'name': record['name'],
+            'time': record['ts'][:19].replace('T', ' '),
+            'kind': record.get('kind'),
+            'outcome': record.get('outcome')
+        })
+
+    # 读取任务运行状态（由续期脚本写入）
+    runtime_status = read_runtime_status(task_dir)
+
+    # 读取日志（从文件末尾向前读取最后100行）
     log_file = task_dir / 'task.log'
     log_lines = []
+    log_start = log_end = 0
     if log_file.exists():
         try:
-            with open(log_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                log_lines = [line.rstrip() for line in lines[-100:]]  # 最后100行
-        except:
+            log_end = log_file.stat().st_size
+            log_lines, log_start = read_lines_before(log_file, log_end, 100)
+        except Exception:
             pass
 
     return render_template_string(
         TASK_DETAIL_TEMPLATE,
         task=task,
         screenshots=screenshots,
-        log_lines=log_lines
+        log_lines=log_lines,
+        log_start=log_start,
+        log_end=log_end,
+        last_renew=runtime_status.get('last_renew'),
+        schedule=runtime_status.get('schedule'),
+        needs_credentials=runtime_status.get('needs_credentials'),
+        resource_blocking=runtime_status.get('resource_blocking')
     )
 
 
@@ -784,11 +1024,101 @@ def serve_screenshot(task_id, filename):
     """提供截图文件"""
     task_dir = task_manager.get_task_dir(task_id)
     screenshot_path = task_dir / 'screenshots' / secure_filename(filename)
-    if screenshot_path.exists():
-        return send_file(screenshot_path, mimetype='image/png')
+    mimetype = SCREENSHOT_MIME_TYPES.get(screenshot_path.suffix.lower())
+    if mimetype and screenshot_path.exists():
+        return send_file(screenshot_path, mimetype=mimetype)
     return "Screenshot not found", 404
 
 
+@app.route('/api/task/<task_id>/log')
+@require_auth
+def api_task_log(task_id):
+    """
+    增量日志接口
+
+    - offset=N：返回字节偏移 N 之后新增的行，以及新的 offset
+    - before=N&limit=M：返回字节偏移 N 之前的最多 M 行（向前翻页），以及这些行的起始偏移
+    """
+    # 先确认任务存在（不能用 get_task_dir：它会创建目录）
+    if task_manager.get_task_config(task_id) is None:
+        return jsonify({'error': f'任务不存在: {task_id}'}), 404
+    log_file = task_manager.tasks_dir / task_id / 'task.log'
+    if not log_file.exists():
+        return jsonify({'lines': [], 'offset': 0, 'start': 0})
+
+    size = log_file.stat().st_size
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+
+    if 'before' in request.args:
+        before = min(request.args.get('before', size, type=int), size)
+        lines, start = read_lines_before(log_file, before, limit)
+        return jsonify({'lines': lines, 'start': start})
+
+    offset = request.args.get('offset', type=int)
+    if offset is None or offset > size:
+        # 首次请求，或日志文件被截断/轮转：从末尾重新开始
+        lines, start = read_lines_before(log_file, size, limit)
+        return jsonify({'lines': lines, 'offset': size, 'start': start, 'reset': offset is not None})
+
+    lines, new_offset = read_lines_after(log_file, offset)
+    return jsonify({'lines': lines, 'offset': new_offset})
+
+
+@app.route('/api/events')
+@require_auth
+def api_events():
+    """
+    SSE 事件流
+
+    - status：任务运行状态或 status.json 变化
+    - log：新增日志行（含 start/offset 字节偏移）
+    - screenshot：新截图
+    - task_id=ID：只接收该任务的事件
+    """
+    return Response(
+        stream_with_context(event_hub.stream(request.args.get('task_id'))),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def metrics_local_only(req) -> bool:
+    """
+    未设置 METRICS_TOKEN 时判断请求是否可以视为本机访问
+
+    只监听本机地址时外部主机无法直接连接；但本机反向代理转发的请求来源同样是 127.0.0.1，
+    因此带有代理请求头的请求也不视为本机访问（代理未添加这些请求头时无法区分，应设置令牌）
+    """
+    if VIEWER_HOST not in LOCAL_ADDRESSES:
+        return False
+    if any(header in req.headers for header in PROXY_HEADERS):
+        return False
+    return req.remote_addr in LOCAL_ADDRESSES
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    Prometheus 文本格式的运行指标（不需要登录，便于 Prometheus/curl 抓取）
+
+    指标包含任务ID和续期结果：设置环境变量 METRICS_TOKEN 后需携带 Authorization: Bearer <令牌>
+    或 ?token=<令牌>；未设置时只有监听地址为本机（VIEWER_HOST=127.0.0.1）且请求未经反向代理转发
+    才允许访问，监听所有地址时一律拒绝
+    """
+    if METRICS_TOKEN:
+        auth = request.headers.get('Authorization', '')
+        token = auth[7:] if auth.startswith('Bearer ') else request.args.get('token')
+        if not hmac.compare_digest(token or '', METRICS_TOKEN):
+            return Response('unauthorized\n', status=401, mimetype='text/plain')
+    elif not metrics_local_only(request):
+        return Response('forbidden: set METRICS_TOKEN to enable /metrics\n', status=403, mimetype='text/plain')
+
+    text = render_metrics(
+        task_manager.get_all_tasks_status(), task_manager.tasks_dir, task_manager.get_metrics()
+    )
+    return Response(text, mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
 @app.route('/task/add', methods=['GET', 'POST'])
 @require_auth
 def add_task():
@@ -832,20 +1162,27 @@ def add_task():
                 cookies_content=cookies_json
             )
 
-        # 添加任务
-        if not task_manager.add_task(task_id, name, mchost_url, renew_interval_minutes):
+        if task_manager.get_task_config(task_id):
             return render_template_string(
                 EDIT_TASK_TEMPLATE,
-                error='添加任务失败，任务ID可能已存在',
+                error='添加任务失败，任务ID已存在',
                 task=None,
                 cookies_content=cookies_json
             )
 
-        # 保存 cookies
+        # 先保存 cookies（添加任务后守护进程会立即启动它）
         task_dir = task_manager.get_task_dir(task_id)
         cookies_file = task_dir / 'cookies.json'
-        with open(cookies_file, 'w', encoding='utf-8') as f:
-            json.dump(cookies, f, indent=2)
+        write_json_file(cookies_file, cookies)
+
+        # 添加任务
+        if not task_manager.add_task(task_id, name, mchost_url, renew_interval_minutes):
+            return render_template_string(
+                EDIT_TASK_TEMPLATE,
+                error='添加任务失败，任务ID可能已存在',
+                task=None,
+                cookies_content=cookies_json
+            )
 
         return redirect(url_for('index'))
 
@@ -874,29 +1211,14 @@ def edit_task(task_id):
         renew_interval_minutes = int(request.form.get('renew_interval_minutes', 15))
         cookies_json = request.form.get('cookies', '').strip()
 
-        # 更新配置
-        if not task_manager.update_task(
-            task_id,
-            name=name,
-            mchost_url=mchost_url,
-            renew_interval_minutes=renew_interval_minutes
-        ):
-            return render_template_string(
-                EDIT_TASK_TEMPLATE,
-                error='更新任务配置失败',
-                task=task,
-                cookies_content=cookies_json if cookies_json else cookies_content
-            )
-
-        # 如果提供了新的 cookies，保存它
+        # 如果提供了新的 cookies，先保存它（配置变化时守护进程会立即重启任务）
         if cookies_json:
             try:
                 cookies = json.loads(cookies_json)
                 if not isinstance(cookies, list):
                     raise ValueError('Cookies must be a JSON array')
 
-                with open(cookies_file, 'w', encoding='utf-8') as f:
-                    json.dump(cookies, f, indent=2)
+                write_json_file(cookies_file, cookies)
             except Exception as e:
                 return render_template_string(
                     EDIT_TASK_TEMPLATE,
@@ -905,6 +1227,20 @@ def edit_task(task_id):
                     cookies_content=cookies_json
                 )
 
+        # 更新配置
+        if not task_manager.update_task(
+            task_id,
+            name=name,
+            mchost_url=mchost_url,
+            renew_interval_minutes=renew_interval_minutes
+        ):
+            return render_template_string(
+                EDIT_TASK_TEMPLATE,
+                error='更新任务配置失败',
+                task=task,
+                cookies_content=cookies_json if cookies_json else cookies_content
+            )
+
         return render_template_string(
             EDIT_TASK_TEMPLATE,
             task=task_manager.get_task_status(task_id),
@@ -957,8 +1293,8 @@ def trigger_screenshot(task_id):
     """触发立即截图"""
     import time
     task_manager.trigger_action(task_id, 'screenshot')
-    # 等待3秒让后台处理（最多等待2秒检测到信号 + 1秒截图）
-    time.sleep(3)
+    # 等待2秒让后台完成截图（命令通过控制通道即时送达）
+    time.sleep(2)
     return redirect(url_for('task_detail', task_id=task_id))
 
 
@@ -968,7 +1304,7 @@ def trigger_renew_now(task_id):
     """触发立即Renew"""
     import time
     task_manager.trigger_action(task_id, 'renew_now')
-    # 等待5秒让后台处理（最多等待2秒检测 + 3秒Renew+截图）
+    # 等待5秒让后台完成Renew和截图（命令通过控制通道即时送达）
     time.sleep(5)
     return redirect(url_for('task_detail', task_id=task_id))
 
@@ -980,8 +1316,8 @@ def trigger_renew_delayed(task_id):
     import time
     delay_minutes = int(request.form.get('delay_minutes', 5))
     task_manager.trigger_action(task_id, 'renew_delayed', delay_minutes=delay_minutes)
-    # 等待2秒让后台处理信号
-    time.sleep(2)
+    # 命令通过控制通道即时送达，稍等片刻让日志落盘
+    time.sleep(1)
     return redirect(url_for('task_detail', task_id=task_id))
 
 
@@ -989,39 +1325,26 @@ def trigger_renew_delayed(task_id):
 @require_auth
 def toggle_manual_mode(task_id):
     """切换手动干预模式"""
-    # 读取任务配置
-    tasks_config_path = BASE_DIR / 'tasks_config.json'
-    with open(tasks_config_path, 'r', encoding='utf-8') as f:
-        config = json.load(f)
+    # 在同一事务内读取并切换 manual_mode，不会覆盖其他并发修改
+    def toggle(task_config):
+        task_config['manual_mode'] = not task_config.get('manual_mode', False)
 
-    if task_id not in config['tasks']:
+    if task_manager.modify_task(task_id, toggle) is None:
         return "任务不存在", 404
 
-    # 切换manual_mode
-    current_mode = config['tasks'][task_id].get('manual_mode', False)
-    config['tasks'][task_id]['manual_mode'] = not current_mode
-
-    # 保存配置
-    with open(tasks_config_path, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
-
     return redirect(url_for('task_detail', task_id=task_id))
 
 
 if __name__ == '__main__':
-    # 确保配置文件存在
-    config_path = BASE_DIR / 'tasks_config.json'
-    if not config_path.exists():
-        print("创建默认配置文件...")
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump({"tasks": {}}, f, indent=2)
-
     print("=" * 50)
     print("MCHost Multi-Task Web Viewer")
     print("=" * 50)
-    print(f"访问地址: http://0.0.0.0:5000")
+    print(f"访问地址: http://{VIEWER_HOST}:{VIEWER_PORT}")
     print(f"默认密码: {PASSWORD}")
+    if not METRICS_TOKEN and VIEWER_HOST not in LOCAL_ADDRESSES:
+        print("⚠️ 未设置 METRICS_TOKEN，/metrics 已禁用（设置令牌后可抓取）")
     print("=" * 50)
     print()
 
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    # SSE 连接各占一个线程
+    app.run(host=VIEWER_HOST, port=VIEWER_PORT, debug=False, threaded=True)